@@ -0,0 +1,292 @@
+# aida_bot/async_bot.py
+import asyncio
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+import telebot
+from aida_bot import config
+from aida_bot.bot import DEFERRED_REPLIES, LIMIT_REPLY, ModularBot, escape_markdown
+from aida_bot.features.user_profiles import ProfileOnboarding
+from aida_bot.metrics import ALERTS, ANSWERS, ERRORS, instrumented, start_server as start_metrics_server
+from aida_bot.pipeline import run_cpu
+from aida_bot.services import async_http
+from aida_bot.rate_limit import BUSY_REPLY, RateLimitExceeded
+
+
+class AsyncModularBot(ModularBot):
+    """
+    Variante asyncio de ModularBot sobre AsyncTeleBot.
+    Cada actualización corre como una tarea: las llamadas HTTP no bloquean (Groq y
+    Make por el pool de async_http; Telegram por la sesión propia de AsyncTeleBot).
+    Whisper / sentimiento corren en el executor de CPU (pipeline.run_cpu) y el
+    almacenamiento en otro (asyncio.to_thread), así unos audios no frenan las
+    lecturas de sesión. Un proceso atiende cientos de conversaciones a la vez.
+    """
+
+    def _create_onboarding(self):
+        # El formulario es poco frecuente y usa la API síncrona: se le da un
+        # TeleBot síncrono (solo para enviar) y se lo llama desde el executor.
+        sync_bot = telebot.TeleBot(self.bot.token)
+        return ProfileOnboarding(bot_instance=sync_bot, storage_client=self.storage)
+
+    async def _rate_limited(self, msg, op: str, retry) -> bool:
+        """Versión asíncrona de ModularBot._rate_limited (`retry` devuelve una corrutina)."""
+        uid = msg.chat.id
+        allowed, wait = self.rate_limiter.acquire(uid, op)
+        if allowed:
+            return False
+
+        if self.rate_limiter.reserve_deferred(uid, op):
+            async def _later():
+                await asyncio.sleep(wait)
+                self.rate_limiter.release_deferred(uid, op)
+                try:
+                    await retry()
+                except Exception as e:
+                    print(f"[ERROR LÍMITES] Pedido postergado ({op}) falló: {e}")
+
+            task = asyncio.create_task(_later())
+            self._deferred_tasks.add(task)  # referencia fuerte hasta que termine
+            task.add_done_callback(self._deferred_tasks.discard)
+            reply = DEFERRED_REPLIES[op].format(seconds=max(1, math.ceil(wait)))
+        else:
+            reply = LIMIT_REPLY
+        try:
+            await self.bot.reply_to(msg, reply)
+        except Exception as e:
+            print(f"[ERROR LÍMITES] {e}")
+        return True
+
+    async def _send_response(self, msg, response_text: str):
+        """
+        Envía el texto y, si corresponde, el audio. La síntesis (TTS) arranca
+        al mismo tiempo que el envío del texto.
+        """
+        session = await asyncio.to_thread(self.sessions.ensure, msg.chat.id)
+        safe_response = escape_markdown(response_text)
+
+        if not session.get("responder_con_audio", True):
+            await self.bot.reply_to(msg, safe_response, parse_mode="MarkdownV2")
+            return
+
+        current_voice = self._select_voice(session, response_text)
+        _, audio_path = await asyncio.gather(
+            self.bot.reply_to(msg, safe_response, parse_mode="MarkdownV2"),
+            self.speech.synthesize_async(response_text, current_voice),
+        )
+
+        if audio_path:
+            try:
+                await self.bot.send_chat_action(msg.chat.id, "record_voice")
+                with open(audio_path, 'rb') as audio_file:
+                    await self.bot.send_voice(msg.chat.id, audio_file)
+            finally:
+                if os.path.exists(audio_path):
+                    os.remove(audio_path)
+
+    async def _process_user_message(self, msg, user_text: str):
+        """Versión asíncrona de ModularBot._process_user_message."""
+        session = await asyncio.to_thread(self.sessions.ensure, msg.chat.id)
+
+        # 1. Detectar todas las intenciones
+        intent_data = await self.nlu.detect_intent_async(user_text)
+
+        config_actions = intent_data.get("configuration", {})
+        analysis_actions = intent_data.get("analysis_required", {})
+        has_chat = intent_data.get("has_chat_intent", True)
+        chat_content = intent_data.get("chat_content", user_text if has_chat else "")
+
+        # 2. Ejecutar acciones de configuración (siempre primero)
+        config_responses = await asyncio.to_thread(self._apply_configuration, msg.chat.id, session, config_actions)
+
+        # 3. Enviar respuestas de configuración (si las hubo)
+        for response in config_responses:
+            await self._send_response(msg, response)
+
+        if not chat_content:
+            return
+
+        # 4. Sentimiento y búsqueda en el dataset local corren en paralelo
+        wants_sentiment = analysis_actions.get("sentiment")
+        wants_chat = has_chat
+        if wants_sentiment or wants_chat:
+            await self.bot.send_chat_action(msg.chat.id, "typing")
+
+        async def _no_result():
+            return None
+
+        sentimiento, faq_answer = await asyncio.gather(
+            self.sentiment.analyze_async(chat_content) if wants_sentiment else _no_result(),
+            run_cpu(self._find_similar_question, self._normalize_question(chat_content), 0.75)
+            if wants_chat else _no_result(),
+        )
+
+        prompt_adicional = ""
+        if sentimiento:
+            sentiment_feedback = self.sentiment.format_analysis(sentimiento)
+            if sentiment_feedback:
+                await self.bot.send_message(msg.chat.id, sentiment_feedback)
+            prompt_adicional = self._sentiment_prompt(sentimiento)
+
+        # 5. Ejecutar el chat (si aplica)
+        if wants_chat:
+            response_text = faq_answer
+            if response_text is not None:
+                ANSWERS.inc(source="faq")
+            else:
+                response_text = await self._chat_reply(msg, f"{chat_content}{prompt_adicional}")
+            if response_text is not None:
+                await self._send_response(msg, response_text)
+
+    async def _chat_reply(self, msg, prompt: str) -> str | None:
+        """Versión asíncrona de ModularBot._chat_reply: la ficha se cobra recién antes de ir a Groq."""
+        async def _later():
+            response_text = await self._chat_reply(msg, prompt)
+            if response_text is not None:
+                await self._send_response(msg, response_text)
+
+        async def _admit():
+            return not await self._rate_limited(msg, "chat", _later)
+
+        return await self.nlu.get_response_async(prompt, user_id=msg.chat.id, user_name=self._user_name(msg),
+                                                 admit=_admit)
+
+    async def _check_alerts_async(self, uid: int, text: str, profile: dict):
+        if not (self.sentiment.check_for_alert(text) and self.email_service):
+            return
+        ALERTS.inc(event="detected")
+        should_send_alert = await asyncio.to_thread(
+            self.sentiment.register_and_check_alert_threshold,
+            storage_client=self.storage, user_id=uid, alert_threshold=5, hours_window=12
+        )
+        email_destino = profile.get("contacto_emergencia")
+        if should_send_alert and email_destino:
+            motivo_alerta = "Se detectaron 5 o más mensajes con sentimientos de alerta en las últimas 12 horas."
+            await self.email_service.send_alert_async(email_destino, uid, motivo_alerta, profile)
+            ALERTS.inc(event="email")
+
+    def _setup_handlers(self):
+        self._deferred_tasks = set()
+
+        @self.bot.message_handler(commands=["start"])
+        async def handle_start(msg):
+            try:
+                await asyncio.to_thread(self.onboarding.start_onboarding, msg, True)
+            except Exception as e:
+                print(f"[ERROR START] {e}")
+                try:
+                    await self.bot.reply_to(msg, "⚠️ Ocurrió un error al iniciar el onboarding.")
+                except Exception:
+                    pass
+
+        @self.bot.callback_query_handler(func=lambda query: True)
+        async def handle_callback_query(query):
+            """Maneja todos los clics de botones en el bot."""
+            if query.data.startswith("onboarding_"):
+                await asyncio.to_thread(self.onboarding.handle_callback, query)
+                return
+
+            if query.data == "start_onboarding_retry":
+                await self.bot.answer_callback_query(query.id, "Entendido, empecemos de nuevo.")
+                try:
+                    await self.bot.edit_message_reply_markup(chat_id=query.message.chat.id, message_id=query.message.message_id, reply_markup=None)
+                except Exception:
+                    pass
+                await asyncio.to_thread(self.onboarding.start_onboarding, query.message, True)
+                return
+
+            await self.bot.answer_callback_query(query.id, "Callback desconocido")
+
+        @self.bot.message_handler(content_types=["text"])
+        @instrumented("text")
+        async def handle_text(msg):
+            if msg.text.startswith('/'):
+                return  # ignorar comandos
+
+            uid = msg.chat.id
+            profile = await asyncio.to_thread(self.storage.get_profile, uid) or {}
+
+            # 1. Si el usuario está respondiendo al formulario
+            if profile.get("esperando_nombre") or profile.get("esperando_contacto"):
+                await asyncio.to_thread(self.onboarding.handle_text_response, msg)
+                return
+
+            # 2. Si el usuario no ha completado el formulario inicial
+            if self._profile_incomplete(profile):
+                await asyncio.to_thread(self.onboarding.start_onboarding, msg, False)
+                return
+
+            # 3. Flujo normal y 4. alertas
+            await self._process_user_message(msg, msg.text)
+            await self._check_alerts_async(uid, msg.text, profile)
+
+        @self.bot.message_handler(content_types=["voice"])
+        @instrumented("voice")
+        async def handle_voice(msg):
+            if await self._rate_limited(msg, "transcribe", lambda: handle_voice(msg)):
+                return
+            await self.bot.send_chat_action(msg.chat.id, "typing")
+            try:
+                file_info = await self.bot.get_file(msg.voice.file_id)
+                audio_bytes = await self.bot.download_file(file_info.file_path)
+
+                transcribed_text = await self.speech.transcribe_async(audio_bytes)
+
+                if transcribed_text:
+                    await self.bot.reply_to(msg, f"🎤 Entendido: *\"{transcribed_text}\"*", parse_mode="Markdown")
+                    await self._process_user_message(msg, transcribed_text)
+                else:
+                    await self._send_response(msg, "⚠️ No pude entender lo que dijiste en el audio.")
+            except RateLimitExceeded:
+                await self.bot.reply_to(msg, BUSY_REPLY)
+            except Exception as e:
+                ERRORS.inc(where="voz")
+                print(f"[ERROR VOZ] {e}")
+                await self.bot.reply_to(msg, "⚠️ Ocurrió un error al procesar tu audio.")
+
+        @self.bot.message_handler(content_types=["photo"])
+        @instrumented("photo")
+        async def handle_photo(msg):
+            if await self._rate_limited(msg, "vision", lambda: handle_photo(msg)):
+                return
+            await self.bot.send_chat_action(msg.chat.id, "upload_photo")
+            try:
+                file_info = await self.bot.get_file(self._pick_photo(msg).file_id)
+                image_bytes = await self.bot.download_file(file_info.file_path)
+
+                await self.bot.send_chat_action(msg.chat.id, "typing")
+                description = await self.vision.analyze_image_async(image_bytes, msg.caption)
+                await self._send_response(msg, description)
+            except Exception as e:
+                ERRORS.inc(where="imagen")
+                print(f"[ERROR IMAGEN] {e}")
+                await self.bot.reply_to(msg, "⚠️ Ocurrió un error al analizar la imagen.")
+
+    async def _run_async(self):
+        await _serve([self])
+
+    def run(self):
+        start_metrics_server()
+        print("✅ Bot (asyncio) iniciado. Escuchando mensajes...")
+        asyncio.run(self._run_async())
+
+
+async def _serve(bots: list[AsyncModularBot]):
+    # Executor para Whisper, sentimiento y accesos al almacenamiento
+    loop = asyncio.get_running_loop()
+    # Executor por defecto (asyncio.to_thread): almacenamiento y sesiones. Los modelos usan run_cpu
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=config.ASYNC_IO_WORKERS,
+                                                 thread_name_prefix="aida-io"))
+    try:
+        await asyncio.gather(*(b.bot.infinity_polling(timeout=20, request_timeout=60) for b in bots))
+    finally:
+        await async_http.close_sessions()
+        for b in bots:
+            await b.bot.close_session()
+
+
+def run_many(bots: list[AsyncModularBot]):
+    """Modo multi-tenant: todos los bots en el mismo event loop (comparten el pool HTTP y el executor)."""
+    start_metrics_server()
+    print(f"✅ {len(bots)} bots (asyncio) iniciados. Escuchando mensajes...")
+    asyncio.run(_serve(bots))
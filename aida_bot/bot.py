@@ -8,8 +8,24 @@ import json
 from aida_bot import config
 import re
 import difflib
+import functools
+import math
 from aida_bot.features.user_profiles import ProfileOnboarding
 from aida_bot.memory import ensure_profile, save_turn, build_llm_context
+from aida_bot.services.image_preprocessing import select_photo_size
+from aida_bot.pipeline import StageTimings, create_executor
+from aida_bot.profiling import get_profiler
+from aida_bot.metrics import ALERTS, ANSWERS, ERRORS, instrumented, start_server as start_metrics_server
+from aida_bot.rate_limit import BUSY_REPLY, RateLimiter, RateLimitExceeded
+
+
+# Respuestas cuando un usuario se pasa del límite de una operación cara
+DEFERRED_REPLIES = {
+    "transcribe": "⏳ Recibí tu audio. Como me mandaste varios seguidos, lo escucho en unos {seconds} segundos.",
+    "vision": "⏳ Recibí tu imagen. Como me mandaste varias seguidas, la miro en unos {seconds} segundos.",
+    "chat": "⏳ Recibí tu mensaje. Dame unos {seconds} segundos y te respondo.",
+}
+LIMIT_REPLY = "🙏 Me llegaron muchos pedidos tuyos juntos. Esperá a que te responda los anteriores y volvé a intentar."
 
 
 def escape_markdown(text: str) -> str:
@@ -64,8 +80,11 @@ class SessionManager:
 class ModularBot:
     """Plantilla general del bot orientado a objetos."""
     
-    def __init__(self, bot_instance, nlu, speech, vision, sentiment, sessions, storage_client, translator, email_service):
+    def __init__(self, bot_instance, nlu, speech, vision, sentiment, sessions, storage_client, translator, email_service,
+                 tenant=None):
         self.bot = bot_instance
+        # Identidad del bot en modo multi-tenant (dataset y webhook propios); None = el único bot
+        self.tenant = tenant
         self.nlu = nlu
         self.speech = speech
         self.vision = vision
@@ -74,14 +93,29 @@ class ModularBot:
         self.sessions = sessions
         self.storage = storage_client
         self.translator = translator
+        # Hilos para las etapas independientes de cada mensaje (FAQ, TTS, alertas...)
+        self.executor = create_executor()
+        # Límites por usuario para operaciones caras (transcribir, visión, chat)
+        self.rate_limiter = RateLimiter()
+        # Colas por chat (webhook y workers del modo multiproceso); None en polling
+        self.dispatcher = None
+        # Perfilado por muestreo (opcional, se controla con /perfil)
+        self.profiler = get_profiler()
+        if self.translator is not None:
+            self.translator.rate_limiter = self.rate_limiter
+        # Si Groq no está disponible, el NLU responde desde las FAQ locales
+        self.nlu.fallback_responder = self._fallback_answer
 
         self._load_dataset()
         # Inicializa el manejador del formulario de bienvenida
-        self.onboarding = ProfileOnboarding(bot_instance=self.bot, storage_client=self.storage)
+        self.onboarding = self._create_onboarding()
         
         self._setup_handlers()
         print("✅ Bot modular listo y handlers configurados.")
     
+    def _create_onboarding(self):
+        return ProfileOnboarding(bot_instance=self.bot, storage_client=self.storage)
+
     def _load_dataset(self):
         """Carga el conjunto de datos de respuestas predefinidas desde un archivo JSON."""
         self.dataset = {}
@@ -92,6 +126,8 @@ class ModularBot:
             # os.path.join() une el directorio con el nombre del archivo
             current_dir = os.path.dirname(__file__)
             dataset_path = os.path.join(current_dir, 'storage', 'dataset.json')
+            if self.tenant is not None and self.tenant.dataset_path:
+                dataset_path = self.tenant.dataset_path
 
             with open(dataset_path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
@@ -125,67 +161,26 @@ class ModularBot:
 
         return best_match_answer if best_match_score >= threshold else None
 
-    def _send_response(self, msg, response_text: str):
-        """
-        Método centralizado para enviar respuestas.
-        Primero envía el texto y luego, si está activado, el audio
-        CON LA VOZ SELECCIONADA POR EL USUARIO.
-        """
-        # Escapar caracteres especiales de Markdown para evitar errores de parsing
-        safe_response = escape_markdown(response_text)
-        self.bot.reply_to(msg, safe_response, parse_mode="MarkdownV2")
-        
-        session = self.sessions.ensure(msg.chat.id)
-        
-        if session.get("responder_con_audio", True):
-            # Lógica de voz corregida:
-            # 1. Intentar detectar la voz automáticamente según el idioma de la RESPUESTA.
-            current_voice = self.speech.get_voice_for_text(response_text)
-            
-            # 2. Si no se pudo determinar una voz (porque el idioma no es soportado),
-            #    usar la voz guardada por el usuario como fallback.
-            if not current_voice:
-                current_voice = session.get("tts_voice", SpeechService.DEFAULT_VOICE)
-
-            self.bot.send_chat_action(msg.chat.id, "record_voice")
-            audio_path = self.speech.synthesize(response_text, current_voice)
-            
-            if audio_path:
-                try:
-                    with open(audio_path, 'rb') as audio_file:
-                        self.bot.send_voice(msg.chat.id, audio_file)
-                finally:
-                    if os.path.exists(audio_path):
-                        os.remove(audio_path)
-
-    def _process_user_message(self, msg, user_text: str):
-        """
-        Procesa el texto del usuario, detectando *múltiples* intenciones 
-        y ejecutando un plan de acción.
-        """
-        session = self.sessions.ensure(msg.chat.id)
-        
-        # 1. Detectar todas las intenciones
-        intent_data = self.nlu.detect_intent(user_text)
-        
-        config_actions = intent_data.get("configuration", {})
-        analysis_actions = intent_data.get("analysis_required", {})
-        has_chat = intent_data.get("has_chat_intent", True)
-        chat_content = intent_data.get("chat_content", user_text if has_chat else "")
+    def _fallback_answer(self, text: str) -> str | None:
+        """Respuesta de las FAQ con un umbral más bajo, para cuando el LLM no responde."""
+        question = text.split(" (El usuario parece", 1)[0]  # sin la indicación de sentimiento
+        return self._find_similar_question(self._normalize_question(question),
+                                           threshold=config.FALLBACK_FAQ_THRESHOLD)
 
-        # 2. Ejecutar acciones de configuración (siempre primero)
+    def _apply_configuration(self, chat_id: int, session: dict, config_actions: dict) -> list[str]:
+        """Aplica los cambios de audio/voz pedidos y devuelve los mensajes de confirmación."""
         config_responses = [] 
 
         if config_actions.get("set_audio") == "OFF":
             if session["responder_con_audio"]: 
                 session["responder_con_audio"] = False
-                self.sessions.save(msg.chat.id, session)
+                self.sessions.save(chat_id, session)
                 config_responses.append("Entendido. A partir de ahora, solo te responderé con texto. 👍")
 
         elif config_actions.get("set_audio") == "ON":
             if not session["responder_con_audio"]: 
                 session["responder_con_audio"] = True
-                self.sessions.save(msg.chat.id, session)
+                self.sessions.save(chat_id, session)
                 config_responses.append("¡Hecho! Volveré a enviarte las respuestas en audio además del texto. 🔊")
 
         if config_actions.get("set_voice"):
@@ -193,15 +188,186 @@ class ModularBot:
             if voice_id in self.speech.VOICES.values():
                 if session["tts_voice"] != voice_id: 
                     session["tts_voice"] = voice_id
-                    self.sessions.save(msg.chat.id, session)
+                    self.sessions.save(chat_id, session)
                     friendly_name = next((name for name, id_ in self.speech.VOICES.items() if id_ == voice_id), "desconocida")
                     config_responses.append(f"¡Perfecto! He cambiado mi voz a {friendly_name}. 🎤")
             else:
                 config_responses.append(f"Hmm, no pude reconocer la voz '{voice_id}'.")
+        return config_responses
+
+    def _sentiment_prompt(self, sentimiento: dict) -> str:
+        """Indicación extra para el LLM según el sentimiento detectado."""
+        if sentimiento['label'] == 'NEG' and sentimiento['score'] > 0.6:
+            return " (El usuario parece frustrado o enojado. Responde con extra paciencia y empatía)."
+        elif sentimiento['label'] == 'POS' and sentimiento['score'] > 0.8:
+            return " (El usuario parece feliz o agradecido. Responde con calidez)."
+        return ""
+
+    @staticmethod
+    def _normalize_question(text: str) -> str:
+        """Normaliza el texto del usuario para la búsqueda en el dataset."""
+        return re.sub(r'[^\w\s]', '', text).lower().strip()
+
+    @staticmethod
+    def _user_name(msg) -> str:
+        return getattr(msg.from_user, "first_name", "") or getattr(msg.chat, "first_name", "")
+
+    @staticmethod
+    def _profile_incomplete(profile: dict) -> bool:
+        """True si el usuario no completó el formulario inicial."""
+        required = ("autonomia", "foco", "entorno")
+        return any(k not in profile or not profile[k] for k in required)
+
+    def _select_voice(self, session: dict, response_text: str) -> str:
+        # Lógica de voz corregida:
+        # 1. Intentar detectar la voz automáticamente según el idioma de la RESPUESTA.
+        #    Si el texto es corto o ambiguo, se usa la voz guardada por el usuario.
+        saved_voice = session.get("tts_voice", SpeechService.DEFAULT_VOICE)
+        current_voice = self.speech.get_voice_for_text(response_text, preferred_voice=saved_voice)
+        
+        # 2. Si no se pudo determinar una voz (porque el idioma no es soportado),
+        #    usar la voz guardada por el usuario como fallback.
+        return current_voice or saved_voice
+
+    def _rate_limited(self, msg, op: str, retry) -> bool:
+        """
+        Consume una ficha del usuario para `op`. Si no tiene, posterga el pedido
+        (`retry` se ejecuta cuando haya fichas) y le avisa. True si se postergó.
+        """
+        allowed, wait = self.rate_limiter.acquire(msg.chat.id, op)
+        if allowed:
+            return False
+        if self.rate_limiter.defer(msg.chat.id, op, wait, retry,
+                                   dispatch=functools.partial(self._run_in_chat, msg.chat.id)):
+            reply = DEFERRED_REPLIES[op].format(seconds=max(1, math.ceil(wait)))
+        else:
+            reply = LIMIT_REPLY
+        try:
+            self.bot.reply_to(msg, reply)
+        except Exception as e:
+            print(f"[ERROR LÍMITES] {e}")
+        return True
+
+    def _run_in_chat(self, chat_id: int, fn):
+        """
+        Corre `fn` en la cola del chat (en orden con sus mensajes). En polling no hay
+        colas por chat: corre en el hilo del temporizador, nunca en self.executor,
+        porque el pedido reintentado le encarga trabajo (FAQ, TTS) y espera su resultado.
+        """
+        if self.dispatcher is not None:
+            self.dispatcher.submit_call(chat_id, fn)
+        else:
+            fn()
+
+    def _chat_reply(self, msg, prompt: str) -> str | None:
+        """
+        Respuesta del modelo de chat. La ficha de "chat" se cobra recién antes de ir
+        a Groq (no con respuestas de la caché). None si el usuario se pasó del límite:
+        el pedido quedó postergado y la respuesta se envía más tarde.
+        """
+        def _later():
+            response_text = self._chat_reply(msg, prompt)
+            if response_text is not None:
+                self._send_response(msg, response_text)
+
+        return self.nlu.get_response(prompt, user_id=msg.chat.id, user_name=self._user_name(msg),
+                                     admit=lambda: not self._rate_limited(msg, "chat", _later))
+
+    def _pick_photo(self, msg):
+        """Si alguna variante chica alcanza la resolución del modelo, bajamos esa."""
+        if config.VISION_PICK_SMALLER_PHOTO:
+            return select_photo_size(msg.photo, self.vision.preprocessor.max_side)
+        return msg.photo[-1]
+
+    def _check_alerts(self, uid: int, text: str, profile: dict):
+        """
+        Registra mensajes de alerta y avisa al contacto de emergencia si se supera el umbral.
+        Corre en el executor, así que los errores se informan acá.
+        """
+        try:
+            if self.sentiment.check_for_alert(text) and self.email_service:
+                ALERTS.inc(event="detected")
+                # Registramos el evento y verificamos si se alcanzó el umbral de 5 alertas en 12 horas.
+                should_send_alert = self.sentiment.register_and_check_alert_threshold(
+                    storage_client=self.storage,
+                    user_id=uid,
+                    alert_threshold=5,
+                    hours_window=12
+                )
+
+                if should_send_alert:
+                    email_destino = profile.get("contacto_emergencia")
+                    if email_destino:
+                        motivo_alerta = f"Se detectaron 5 o más mensajes con sentimientos de alerta en las últimas 12 horas."
+                        self.email_service.send_alert(email_destino, uid, motivo_alerta, profile)
+                        ALERTS.inc(event="email")
+        except Exception as e:
+            ERRORS.inc(where="alertas")
+            print(f"[ERROR ALERTAS] {e}")
+
+    def _send_response(self, msg, response_text: str, timings: StageTimings | None = None):
+        """
+        Método centralizado para enviar respuestas.
+        Envía el texto y, si está activado, el audio CON LA VOZ SELECCIONADA
+        POR EL USUARIO. La síntesis arranca antes y corre mientras se envía el texto.
+        """
+        timings = timings or StageTimings()
+        session = self.sessions.ensure(msg.chat.id)
+
+        audio_future = None
+        if session.get("responder_con_audio", True):
+            def _synthesize():
+                current_voice = self._select_voice(session, response_text)
+                return self.speech.synthesize(response_text, current_voice)
+            audio_future = self.executor.submit(timings.wrap("tts", _synthesize))
+
+        # Escapar caracteres especiales de Markdown para evitar errores de parsing
+        safe_response = escape_markdown(response_text)
+        with timings.stage("texto"):
+            self.bot.reply_to(msg, safe_response, parse_mode="MarkdownV2")
+
+        if audio_future is None:
+            return
+
+        self.bot.send_chat_action(msg.chat.id, "record_voice")
+        audio_path = audio_future.result()
+        if audio_path:
+            try:
+                with timings.stage("audio"), open(audio_path, 'rb') as audio_file:
+                    self.bot.send_voice(msg.chat.id, audio_file)
+            finally:
+                if os.path.exists(audio_path):
+                    os.remove(audio_path)
+
+    def _process_user_message(self, msg, user_text: str):
+        """
+        Procesa el texto del usuario, detectando *múltiples* intenciones 
+        y ejecutando un plan de acción.
+        La búsqueda en el dataset local arranca mientras se detecta la intención,
+        y los tiempos de cada etapa quedan en el log.
+        """
+        timings = StageTimings(f"chat={msg.chat.id}")
+        session = self.sessions.ensure(msg.chat.id)
+
+        # 0. Búsqueda especulativa en el dataset (casi siempre chat_content == user_text)
+        faq_key = self._normalize_question(user_text)
+        faq_future = self.executor.submit(timings.wrap("faq", self._find_similar_question, faq_key, 0.75))
+
+        # 1. Detectar todas las intenciones
+        with timings.stage("intencion"):
+            intent_data = self.nlu.detect_intent(user_text)
+        
+        config_actions = intent_data.get("configuration", {})
+        analysis_actions = intent_data.get("analysis_required", {})
+        has_chat = intent_data.get("has_chat_intent", True)
+        chat_content = intent_data.get("chat_content", user_text if has_chat else "")
+
+        # 2. Ejecutar acciones de configuración (siempre primero)
+        config_responses = self._apply_configuration(msg.chat.id, session, config_actions)
 
         # 3. Enviar respuestas de configuración (si las hubo)
         for response in config_responses:
-            self._send_response(msg, response)
+            self._send_response(msg, response, timings)
 
         # 4. Ejecutar análisis y chat (si aplica)
         prompt_adicional = ""
@@ -211,7 +377,8 @@ class ModularBot:
             self.bot.send_chat_action(msg.chat.id, "typing")
             
             # 4.1. Analizar el sentimiento
-            sentimiento = self.sentiment.analyze(chat_content)
+            with timings.stage("sentimiento"):
+                sentimiento = self.sentiment.analyze(chat_content)
             
             # 4.2. Formatear y ENVIAR el mensaje de feedback 
             sentiment_feedback = self.sentiment.format_analysis(sentimiento)
@@ -219,35 +386,66 @@ class ModularBot:
                 self.bot.send_message(msg.chat.id, sentiment_feedback)
             
             # 4.3. Preparar el prompt adicional para el LLM
-            if sentimiento['label'] == 'NEG' and sentimiento['score'] > 0.6:
-                prompt_adicional = " (El usuario parece frustrado o enojado. Responde con extra paciencia y empatía)."
-            elif sentimiento['label'] == 'POS' and sentimiento['score'] > 0.8:
-                prompt_adicional = " (El usuario parece feliz o agradecido. Responde con calidez)."
+            prompt_adicional = self._sentiment_prompt(sentimiento)
 
         # 5. Ejecutar el chat (si aplica)
         if has_chat and chat_content:
             self.bot.send_chat_action(msg.chat.id, "typing")
             
-            # Normalizar el texto del usuario para la búsqueda en el dataset
-            normalized_text = re.sub(r'[^\w\s]', '', chat_content).lower().strip()
-
-            # 5.1. Buscar respuesta exacta o similar en el dataset local primero
-            response_text = self._find_similar_question(normalized_text, threshold=0.75)
+            # 5.1. Respuesta del dataset local (si el NLU reescribió el texto, se busca de nuevo)
+            normalized_text = self._normalize_question(chat_content)
+            if normalized_text == faq_key:
+                response_text = faq_future.result()
+            else:
+                with timings.stage("faq"):
+                    response_text = self._find_similar_question(normalized_text, threshold=0.75)
+            if response_text is not None:
+                ANSWERS.inc(source="faq")
 
             # 5.2. Si no se encuentra, usar el NLU
             if response_text is None:
                 final_prompt = f"{chat_content}{prompt_adicional}"
-                response_text = self.nlu.get_response(
-                    final_prompt,
-                    user_id=msg.chat.id,
-                    user_name=getattr(msg.from_user, "first_name", "") or getattr(msg.chat, "first_name", "")
-                    )
-            
-            self._send_response(msg, response_text)
-
+                with timings.stage("llm"):
+                    response_text = self._chat_reply(msg, final_prompt)
+
+            if response_text is not None:
+                self._send_response(msg, response_text, timings)
+
+        timings.log()
+
+
+    def _profile_command(self, msg) -> str:
+        """/perfil on|off|chat <id>|nochat <id>|top — solo para ADMIN_CHAT_IDS."""
+        parts = msg.text.split()[1:]
+        action = parts[0].lower() if parts else ""
+        profiler = self.profiler
+        if action in ("on", "off"):
+            profiler.set_enabled(action == "on")
+            return f"Perfilado {'activado' if profiler.enabled else 'desactivado'}."
+        if action in ("chat", "nochat") and len(parts) > 1 and parts[1].lstrip("-").isdigit():
+            chat_id = int(parts[1])
+            if action == "chat":
+                profiler.watch_chat(chat_id)
+                profiler.set_enabled(True)
+                return f"Se perfilan todas las actualizaciones del chat {chat_id}."
+            profiler.unwatch_chat(chat_id)
+            return f"Se dejó de vigilar el chat {chat_id}."
+        if action == "top":
+            slowest = profiler.slowest()
+            if not slowest:
+                return "Todavía no hay actualizaciones medidas."
+            return "\n".join(f"{s['ms']:.0f} ms — chat {s['chat_id']} ({s['handler']}) {s['at']}" for s in slowest[:10])
+        watched = ", ".join(str(c) for c in sorted(profiler.watched_chats)) or "ninguno"
+        return (f"Perfilado: {'activado' if profiler.enabled else 'desactivado'} "
+                f"(muestreo {profiler.sample_rate:.0%}, chats vigilados: {watched}).\n"
+                "Uso: /perfil on | off | chat <id> | nochat <id> | top")
 
     def _setup_handlers(self):
-        
+
+        @self.bot.message_handler(commands=["perfil"], func=lambda msg: msg.chat.id in config.ADMIN_CHAT_IDS)
+        def handle_profile(msg):
+            self.bot.reply_to(msg, self._profile_command(msg))
+
         @self.bot.message_handler(commands=["start"])
         def handle_start(msg):
             # Siempre forzar el onboarding para actualizar preferencias
@@ -284,6 +482,8 @@ class ModularBot:
 
         # <--- MODIFICACIÓN 3: Lógica de texto fusionada ---
         @self.bot.message_handler(content_types=["text"])
+        @instrumented("text")
+        @self.profiler.profiled("text")
         def handle_text(msg):
             if msg.text.startswith('/'):
                 return  # ignorar comandos
@@ -299,35 +499,25 @@ class ModularBot:
 
             # --- Lógica de "perfil incompleto" (de rama_memoria) ---
             # 2. Si el usuario no ha completado el formulario inicial
-            required = ("autonomia", "foco", "entorno")
-            missing = any(k not in profile or not profile[k] for k in required)
-            if missing:
+            if self._profile_incomplete(profile):
                 self.onboarding.start_onboarding(msg, force_retry=False)
                 return
 
-            # --- Flujo normal (de rama_memoria) ---
-            # 3. Perfil OK → sigue el flujo normal
-            self._process_user_message(msg, msg.text)
-
             # --- Lógica de Alertas (de botfinal) ---
-            # 4. Verificar si el mensaje contiene palabras de alerta
-            if self.sentiment.check_for_alert(msg.text) and self.email_service:
-                # Registramos el evento y verificamos si se alcanzó el umbral de 5 alertas en 12 horas.
-                should_send_alert = self.sentiment.register_and_check_alert_threshold(
-                    storage_client=self.storage,
-                    user_id=uid,
-                    alert_threshold=5,
-                    hours_window=12
-                )
+            # 3. Verificar palabras de alerta y registrar el evento en segundo plano,
+            #    fuera del camino de la respuesta
+            self.executor.submit(self._check_alerts, uid, msg.text, profile)
 
-                if should_send_alert:
-                    email_destino = profile.get("contacto_emergencia")
-                    if email_destino:
-                        motivo_alerta = f"Se detectaron 5 o más mensajes con sentimientos de alerta en las últimas 12 horas."
-                        self.email_service.send_alert(email_destino, uid, motivo_alerta, profile)
+            # --- Flujo normal (de rama_memoria) ---
+            # 4. Perfil OK → sigue el flujo normal
+            self._process_user_message(msg, msg.text)
 
         @self.bot.message_handler(content_types=["voice"])
+        @instrumented("voice")
+        @self.profiler.profiled("voice")
         def handle_voice(msg):
+            if self._rate_limited(msg, "transcribe", lambda: handle_voice(msg)):
+                return
             self.bot.send_chat_action(msg.chat.id, "typing")
             try:
                 file_info = self.bot.get_file(msg.voice.file_id)
@@ -341,15 +531,22 @@ class ModularBot:
                 else:
                     response_text = "⚠️ No pude entender lo que dijiste en el audio."
                     self._send_response(msg, response_text)
+            except RateLimitExceeded:
+                self.bot.reply_to(msg, BUSY_REPLY)
             except Exception as e:
+                ERRORS.inc(where="voz")
                 print(f"[ERROR VOZ] {e}")
                 self.bot.reply_to(msg, "⚠️ Ocurrió un error al procesar tu audio.")
 
         @self.bot.message_handler(content_types=["photo"])
+        @instrumented("photo")
+        @self.profiler.profiled("photo")
         def handle_photo(msg):
+            if self._rate_limited(msg, "vision", lambda: handle_photo(msg)):
+                return
             self.bot.send_chat_action(msg.chat.id, "upload_photo")
             try:
-                file_id = msg.photo[-1].file_id
+                file_id = self._pick_photo(msg).file_id
                 file_info = self.bot.get_file(file_id)
                 image_bytes = self.bot.download_file(file_info.file_path)
                 
@@ -360,10 +557,34 @@ class ModularBot:
                 self._send_response(msg, description)
                 
             except Exception as e:
+                ERRORS.inc(where="imagen")
                 print(f"[ERROR IMAGEN] {e}")
                 self.bot.reply_to(msg, "⚠️ Ocurrió un error al analizar la imagen.")
 
+    def run_webhook(self):
+        """Recibe actualizaciones por webhook: un servidor HTTP local las encola y responde al instante."""
+        from aida_bot.webhook import WebhookServer
+        if self.tenant is not None:
+            server = WebhookServer(self.bot, path=self.tenant.webhook_path,
+                                   secret_token=self.tenant.webhook_secret, name=self.tenant.bot_id)
+        else:
+            server = WebhookServer(self.bot)
+        self.dispatcher = server.dispatcher
+        server.start()
+        server.register()
+        print("✅ Bot iniciado (webhook). Esperando actualizaciones...")
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            server.stop()
+
     def run(self):
+        start_metrics_server()
+        if config.BOT_MODE == "webhook":
+            self.run_webhook()
+            return
+
         print("✅ Bot iniciado. Escuchando mensajes...")
         while True:
             try:
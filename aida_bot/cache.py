@@ -0,0 +1,174 @@
+# aida_bot/cache.py
+import atexit
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from aida_bot import config
+
+
+def make_key(*parts) -> str:
+    """Arma una clave de texto estable a partir de varias partes."""
+    return json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+
+
+# Cachés con archivo: se guardan en segundo plano cada CACHE_FLUSH_SECONDS y al salir
+_persistent: "weakref.WeakSet[LRUCache]" = weakref.WeakSet()
+_flusher_lock = threading.Lock()
+_flusher: threading.Thread | None = None
+
+
+def flush_all():
+    """Guarda en disco todas las cachés con cambios pendientes."""
+    for cache in list(_persistent):
+        cache.flush()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(config.CACHE_FLUSH_SECONDS)
+        flush_all()
+
+
+def _register_persistent(cache: "LRUCache"):
+    global _flusher
+    with _flusher_lock:
+        _persistent.add(cache)
+        if _flusher is None:
+            atexit.register(flush_all)
+            _flusher = threading.Thread(target=_flush_loop, daemon=True, name="aida-cache-flush")
+            _flusher.start()
+
+
+class LRUCache:
+    """
+    Caché en memoria con desalojo LRU, vencimiento opcional (TTL)
+    y persistencia opcional en un archivo JSON.
+    Las claves deben ser strings (ver `make_key`).
+    Con archivo, `put` solo marca la caché como modificada: se escribe en segundo
+    plano cada CACHE_FLUSH_SECONDS y al terminar el proceso, no en cada pedido.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float | None = None, persist_path: str | None = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = persist_path
+        self.entries = OrderedDict()  # key -> (value, ts)
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        if self.persist_path:
+            self.load()
+            _register_persistent(self)
+
+    def _expired(self, ts: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - ts > self.ttl_seconds
+
+    def get(self, key: str, default=None):
+        now = time.time()
+        with self._lock:
+            item = self.entries.get(key)
+            if item is None or self._expired(item[1], now):
+                if item is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            item = self.entries.get(key)
+            return item is not None and not self._expired(item[1], time.time())
+
+    def put(self, key: str, value):
+        with self._lock:
+            self.entries[key] = (value, time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            self._dirty = bool(self.persist_path)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self._dirty = bool(self.persist_path)
+
+    def flush(self):
+        """Guarda en disco si hubo cambios desde la última vez."""
+        if self._dirty:
+            self.save()
+
+    def load(self):
+        """Carga las entradas guardadas en disco (si el archivo existe)."""
+        if not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ No se pudo leer la caché '{self.persist_path}': {e}")
+            return
+        now = time.time()
+        with self._lock:
+            for key, value, ts in data.get("entries", []):
+                if not self._expired(ts, now):
+                    self.entries[key] = (value, ts)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def save(self):
+        """Guarda la caché en disco escribiendo primero a un temporal (evita archivos a medias)."""
+        with self._lock:
+            data = {"entries": [[key, value, ts] for key, (value, ts) in self.entries.items()]}
+            self._dirty = False
+        tmp_path = f"{self.persist_path}.tmp"
+        with self._save_lock:
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.persist_path)
+            except OSError as e:
+                self._dirty = True  # se reintenta en la próxima pasada
+                print(f"⚠️ No se pudo guardar la caché '{self.persist_path}': {e}")
+
+    def stats(self) -> dict:
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+class TieredCache:
+    """
+    Caché de dos niveles: memoria (rápida y chica) y disco (más grande, opcional).
+    Lo que se encuentra en disco se promueve a memoria.
+    """
+
+    def __init__(self, memory: LRUCache, disk: LRUCache | None = None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str, default=None):
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.put(key, value)
+                return value
+        return default
+
+    def put(self, key: str, value):
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    def stats(self) -> dict:
+        stats = {"memory": self.memory.stats()}
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
@@ -10,6 +10,7 @@ load_dotenv()
 ENV = os.getenv("ENV", "dev")
 BOT_ID = os.getenv("BOT_ID", "aida_local")
 NAMESPACE = f"{ENV}:{BOT_ID}"
+BOT_TENANTS_FILE = os.getenv("BOT_TENANTS_FILE", "")  # JSON con varios bots en un proceso (ver tenants.py)
 
 # --- Tokens y APIs ---
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
@@ -22,6 +23,140 @@ NLU_MODEL = os.getenv("NLU_MODEL", "llama-3.3-70b-versatile")
 INTENT_MODEL = os.getenv("INTENT_MODEL", "llama-3.1-8b-instant")
 VISION_MODEL = os.getenv("VISION_MODEL", "meta-llama/llama-4-scout-17b-16e-instruct")
 
+# --- Visión: preprocesado de imágenes ---
+VISION_MAX_SIDE = int(os.getenv("VISION_MAX_SIDE", "1120"))  # lado máximo en píxeles
+VISION_IMAGE_QUALITY = int(os.getenv("VISION_IMAGE_QUALITY", "80"))
+VISION_IMAGE_FORMAT = os.getenv("VISION_IMAGE_FORMAT", "JPEG")  # JPEG o WEBP
+VISION_PICK_SMALLER_PHOTO = os.getenv("VISION_PICK_SMALLER_PHOTO", "true").lower() == "true"
+
+# --- Visión: caché de imágenes repetidas (hash perceptual) ---
+VISION_CACHE_SIZE = int(os.getenv("VISION_CACHE_SIZE", "256"))
+VISION_CACHE_TTL = int(os.getenv("VISION_CACHE_TTL", str(24 * 60 * 60)))  # segundos
+VISION_CACHE_MAX_DISTANCE = int(os.getenv("VISION_CACHE_MAX_DISTANCE", "6"))  # bits de diferencia
+VISION_PHISHING_MAX_DISTANCE = int(os.getenv("VISION_PHISHING_MAX_DISTANCE", "2"))  # más estricto para phishing
+VISION_PHISHING_TTL = int(os.getenv("VISION_PHISHING_TTL", str(30 * 24 * 60 * 60)))  # vencimiento (aprendidas)
+VISION_PHISHING_PATH = os.getenv("VISION_PHISHING_PATH", "phishing_learned.json")  # vacío = solo memoria
+
+# --- Visión: pre-filtro local con OCR + heurísticas de phishing ---
+OCR_PRESCREEN = os.getenv("OCR_PRESCREEN", "true").lower() == "true"
+OCR_LANG = os.getenv("OCR_LANG", "spa+eng")
+OCR_MIN_CHARS = int(os.getenv("OCR_MIN_CHARS", "40"))  # menos texto que esto -> modelo de visión
+OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "70"))  # confianza media (0-100)
+OCR_TEXT_MODEL = os.getenv("OCR_TEXT_MODEL", INTENT_MODEL)
+PHISHING_DIRECT_THRESHOLD = float(os.getenv("PHISHING_DIRECT_THRESHOLD", "0.8"))
+
+# --- Historial de conversación ---
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1200"))  # tokens para perfil + historial
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "200"))  # turnos por usuario en memoria
+HISTORY_SUMMARY_MAX_CHARS = int(os.getenv("HISTORY_SUMMARY_MAX_CHARS", "800"))
+HISTORY_ACTIVE_USERS = int(os.getenv("HISTORY_ACTIVE_USERS", "10000"))  # historiales en memoria
+HISTORY_IDLE_SECONDS = float(os.getenv("HISTORY_IDLE_SECONDS", "1800"))  # sin uso -> se desaloja
+LLM_CHAT_FORMAT = os.getenv("LLM_CHAT_FORMAT", "messages")  # messages o flat (formato anterior)
+
+# --- Caché de respuestas del LLM ---
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))  # entradas en memoria
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", str(6 * 60 * 60)))  # segundos
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "")  # vacío = sin nivel en disco
+RESPONSE_CACHE_DISK_SIZE = int(os.getenv("RESPONSE_CACHE_DISK_SIZE", "5000"))
+CACHE_FLUSH_SECONDS = float(os.getenv("CACHE_FLUSH_SECONDS", "5"))  # cada cuánto se guardan las cachés con archivo
+
+# --- Traducción ---
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "2048"))
+TRANSLATION_CACHE_PATH = os.getenv("TRANSLATION_CACHE_PATH", "translations_cache.json")  # vacío = solo memoria
+
+# --- Identificación de idioma ---
+LANGID_BACKEND = os.getenv("LANGID_BACKEND", "ngram")  # ngram o langdetect
+LANGID_MIN_CHARS = int(os.getenv("LANGID_MIN_CHARS", "8"))  # menos letras -> idioma del usuario
+LANGID_MIN_CONFIDENCE = float(os.getenv("LANGID_MIN_CONFIDENCE", "0.6"))
+
+# --- Modo de ejecución ---
+BOT_MODE = os.getenv("BOT_MODE", "polling")  # polling (hilos), webhook o async (asyncio)
+ASYNC_HTTP_POOL_SIZE = int(os.getenv("ASYNC_HTTP_POOL_SIZE", "100"))  # conexiones HTTP simultáneas
+ASYNC_CPU_WORKERS = int(os.getenv("ASYNC_CPU_WORKERS", "4"))  # hilos para Whisper, sentimiento, pydub y OCR
+ASYNC_IO_WORKERS = int(os.getenv("ASYNC_IO_WORKERS", "16"))  # hilos para almacenamiento y sesiones
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "8"))  # hilos para etapas en paralelo (FAQ, TTS, alertas)
+PIPELINE_LOG_TIMINGS = os.getenv("PIPELINE_LOG_TIMINGS", "true").lower() == "true"
+
+# --- Webhook (BOT_MODE=webhook) ---
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # URL pública (https); vacío = no se registra en Telegram
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # vacío = se genera uno al iniciar
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))  # hilos que procesan actualizaciones
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))  # actualizaciones en espera
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))  # conexiones simultáneas de Telegram
+
+# --- Modo multiproceso (reparto por chat) ---
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "0"))  # 0 = un solo proceso
+SHARD_THREADS = int(os.getenv("SHARD_THREADS", "4"))  # hilos por worker
+SHARD_QUEUE_SIZE = int(os.getenv("SHARD_QUEUE_SIZE", "1000"))  # actualizaciones en espera por worker
+
+# --- Servidor de modelos (Whisper y sentimiento compartidos) ---
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "")  # vacío = cada proceso carga sus modelos
+MODEL_SERVER_BATCH_SIZE = int(os.getenv("MODEL_SERVER_BATCH_SIZE", "8"))
+MODEL_SERVER_BATCH_WAIT_MS = float(os.getenv("MODEL_SERVER_BATCH_WAIT_MS", "20"))  # espera para armar un lote
+MODEL_SERVER_QUEUE_SIZE = int(os.getenv("MODEL_SERVER_QUEUE_SIZE", "64"))  # pedidos en espera por modelo
+MODEL_SERVER_TIMEOUT = float(os.getenv("MODEL_SERVER_TIMEOUT", "120"))  # segundos
+
+# --- Límites de uso ---
+RATE_LIMITS_ENABLED = os.getenv("RATE_LIMITS_ENABLED", "true").lower() == "true"
+RATE_LIMIT_TRANSCRIBE = float(os.getenv("RATE_LIMIT_TRANSCRIBE", "6"))  # audios por minuto y usuario
+RATE_LIMIT_VISION = float(os.getenv("RATE_LIMIT_VISION", "4"))  # imágenes por minuto y usuario
+RATE_LIMIT_CHAT = float(os.getenv("RATE_LIMIT_CHAT", "20"))  # respuestas de Groq por minuto y usuario (no cuenta FAQ ni caché)
+RATE_LIMIT_TRANSLATE = float(os.getenv("RATE_LIMIT_TRANSLATE", "20"))  # traducciones por minuto y usuario
+RATE_LIMIT_MAX_DEFERRED = int(os.getenv("RATE_LIMIT_MAX_DEFERRED", "2"))  # pedidos postergados por operación
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "8"))  # llamadas simultáneas a Groq
+WHISPER_MAX_CONCURRENCY = int(os.getenv("WHISPER_MAX_CONCURRENCY", "2"))  # transcripciones simultáneas
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "4"))  # síntesis de voz simultáneas
+ENDPOINT_WAIT_TIMEOUT = float(os.getenv("ENDPOINT_WAIT_TIMEOUT", "30"))  # espera máxima por un lugar (s)
+
+# --- Circuitos y respuestas de respaldo ---
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))  # fallas seguidas para abrir
+BREAKER_SLOW_THRESHOLD = int(os.getenv("BREAKER_SLOW_THRESHOLD", "3"))  # respuestas lentas seguidas para abrir
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))  # segundos entre pruebas
+BREAKER_SLO_INTENT = float(os.getenv("BREAKER_SLO_INTENT", "5"))  # latencia máxima aceptable (s)
+BREAKER_SLO_CHAT = float(os.getenv("BREAKER_SLO_CHAT", "10"))
+BREAKER_SLO_VISION = float(os.getenv("BREAKER_SLO_VISION", "20"))
+FALLBACK_FAQ_THRESHOLD = float(os.getenv("FALLBACK_FAQ_THRESHOLD", "0.5"))  # similitud mínima sin LLM
+
+# --- Perfilado por muestreo ---
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))  # fracción de actualizaciones perfiladas
+PROFILE_CHATS = [int(c) for c in os.getenv("PROFILE_CHATS", "").split(",") if c.strip()]  # siempre perfilados
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "20"))  # actualizaciones más lentas en slowest.json
+ADMIN_CHAT_IDS = [int(c) for c in os.getenv("ADMIN_CHAT_IDS", "").split(",") if c.strip()]  # pueden usar /perfil
+
+# --- Formato del almacenamiento local (JSONStorage) ---
+STORAGE_FORMAT = os.getenv("STORAGE_FORMAT", "json")  # json, json-pretty, msgpack o cbor
+STORAGE_EPOCH_TIMESTAMPS = os.getenv("STORAGE_EPOCH_TIMESTAMPS", "false").lower() == "true"  # ts como enteros
+STORAGE_COMPRESS_HISTORY = os.getenv("STORAGE_COMPRESS_HISTORY", "false").lower() == "true"  # zstd (binarios)
+STORAGE_ZSTD_LEVEL = int(os.getenv("STORAGE_ZSTD_LEVEL", "3"))
+STORAGE_LAYOUT = os.getenv("STORAGE_LAYOUT", "single")  # single (un archivo) o per_user (uno por usuario)
+STORAGE_ACTIVE_USERS = int(os.getenv("STORAGE_ACTIVE_USERS", "10000"))  # usuarios en memoria (per_user)
+STORAGE_IDLE_SECONDS = float(os.getenv("STORAGE_IDLE_SECONDS", "1800"))  # sin uso -> se desaloja (per_user)
+STORAGE_USER_INDEX = os.getenv("STORAGE_USER_INDEX", "true").lower() == "true"  # índice binario de ids
+STORAGE_FSYNC = os.getenv("STORAGE_FSYNC", "true").lower() == "true"  # fsync antes de renombrar (durable)
+STORAGE_GROUP_COMMIT_MS = float(os.getenv("STORAGE_GROUP_COMMIT_MS", "0"))  # espera extra para juntar escrituras
+
+# --- Replicación JSON ↔ Firestore (sync_to_firestore.py) ---
+SYNC_JSON_PATH = os.getenv("SYNC_JSON_PATH", "aida_data.json")  # también sus shards e historiales
+SYNC_MODE = os.getenv("SYNC_MODE", "both")  # both (en los dos sentidos) o push (solo subir)
+SYNC_PULL_MODE = os.getenv("SYNC_PULL_MODE", "poll")  # poll (consulta por _updatedAt) o listen (snapshots)
+SYNC_PULL_OVERLAP = float(os.getenv("SYNC_PULL_OVERLAP", "30"))  # segundos de margen por relojes desparejos
+SYNC_ORIGIN = os.getenv("SYNC_ORIGIN", "")  # nombre de esta instancia; vacío = host + ruta del JSON
+SYNC_INTERVAL = float(os.getenv("SYNC_INTERVAL", "5"))  # segundos entre chequeos
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", "400"))  # escrituras por lote (máximo 500)
+SYNC_MAX_PARALLEL = int(os.getenv("SYNC_MAX_PARALLEL", "4"))  # lotes enviados a la vez
+SYNC_STATE_PATH = os.getenv("SYNC_STATE_PATH", "")  # vacío = <json>.sync_state.json
+
+# --- Métricas ---
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # solo local por defecto
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))  # 0 = sin servidor de métricas propio
+
 # Resolver ruta ABSOLUTA para la credencial de Firebase
 PROJECT_ROOT = Path(__file__).resolve().parents[1]  # carpeta .../ProyectoFinalSIC
 _raw_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "service-account.json")
@@ -31,7 +166,7 @@ else:
     GOOGLE_CREDENTIALS_PATH = str((PROJECT_ROOT / _raw_path).resolve())
 
 # --- Validaciones mínimas ---
-if not TELEGRAM_TOKEN:
+if not TELEGRAM_TOKEN and not BOT_TENANTS_FILE:
     raise ValueError("❌ Falta TELEGRAM_TOKEN en el archivo .env")
 if not GROQ_API_KEY:
     raise ValueError("❌ Falta GROQ_API_KEY en el archivo .env")
@@ -1,16 +1,169 @@
 # aida_bot/memory.py
+import threading
+import weakref
+from collections import deque
 from datetime import datetime
-from typing import Literal, List, Dict, Any
+from typing import Callable, Literal, List, Dict, Any
+from aida_bot import config
+from aida_bot.cache import LRUCache
+from aida_bot.metrics import watch_cache
 from aida_bot.storage.database import get_storage_client
 
 Role = Literal["user", "assistant", "system"]
 
+# Datos del perfil que entran en el prompt (y por lo tanto en la clave de caché de respuestas)
+PROFILE_PROMPT_FIELDS = ("displayName", "idioma", "preferencias", "autonomia", "foco", "entorno")
+
 def _now_iso() -> str:
     return datetime.utcnow().isoformat(timespec="seconds") + "Z"
 
 def _db(storage=None):
     return storage or get_storage_client()
 
+def estimate_tokens(text: str) -> int:
+    """Estimación rápida de tokens (~4 caracteres por token)."""
+    return len(text) // 4 + 1
+
+def summarize_turns(previous_summary: str, turns: List[Dict[str, Any]], max_chars: int | None = None) -> str:
+    """
+    Resumen local (sin LLM) de los turnos viejos: agrega una línea corta por turno
+    al resumen anterior y se queda con lo más reciente si se pasa del límite.
+    """
+    max_chars = max_chars or config.HISTORY_SUMMARY_MAX_CHARS
+    lines = [previous_summary] if previous_summary else []
+    for m in turns:
+        who = "El usuario dijo" if m["role"] == "user" else "AIDA respondió"
+        text = " ".join(m["text"].split())
+        lines.append(f"- {who}: {text[:120]}{'…' if len(text) > 120 else ''}")
+    summary = "\n".join(lines)
+    if len(summary) > max_chars:
+        summary = "…" + summary[-max_chars:]
+    return summary
+
+
+class _UserTurns:
+    __slots__ = ("turns", "seq", "summary")
+
+    def __init__(self, turns: deque, seq: int):
+        self.turns = turns
+        self.seq = seq  # cantidad total de turnos del usuario
+        self.summary: tuple[int, str] | None = None  # (seq hasta donde resume, texto)
+
+
+class TurnStore:
+    """
+    Historial por usuario en memoria (deque) sobre escrituras append-only del storage.
+    Se carga una vez por usuario y mantiene un resumen de los turnos viejos
+    que se recalcula solo cuando hace falta.
+    En memoria quedan solo los usuarios activos (HISTORY_ACTIVE_USERS, HISTORY_IDLE_SECONDS):
+    el storage tiene todo, así que un usuario desalojado se vuelve a cargar sin perder nada.
+    """
+
+    def __init__(self, storage, max_turns: int | None = None,
+                 summarizer: Callable[[str, List[Dict[str, Any]]], str] | None = None,
+                 max_users: int | None = None, idle_seconds: float | None = None):
+        self.storage = storage
+        self.max_turns = max_turns or config.HISTORY_MAX_TURNS
+        self.summarizer = summarizer or summarize_turns
+        self._users = LRUCache(max_size=max_users or config.HISTORY_ACTIVE_USERS,
+                               ttl_seconds=idle_seconds or config.HISTORY_IDLE_SECONDS)
+        watch_cache(f"{getattr(storage, 'metrics_prefix', '')}history_users", self._users)
+        self._lock = threading.Lock()
+        self._loading: dict[str, threading.Lock] = {}  # un lock por usuario mientras se carga
+
+    def _state(self, user_id: int) -> _UserTurns:
+        """
+        Estado del usuario; si no está en memoria se carga del storage fuera de `self._lock`
+        (la consulta y la migración de historiales viejos no frenan a los demás usuarios).
+        """
+        key = str(user_id)
+        with self._lock:
+            state = self._users.get(key)
+            if state is not None:
+                self._users.put(key, state)  # renueva el tiempo sin uso
+                return state
+            loading = self._loading.setdefault(key, threading.Lock())
+        with loading:  # una sola carga por usuario
+            with self._lock:
+                state = self._users.get(key)
+            if state is None:
+                state = self._load(user_id)
+            with self._lock:
+                state = self._users.get(key) or state  # clear() pudo ganarle a la carga
+                self._users.put(key, state)
+                self._loading.pop(key, None)
+        return state
+
+    def _load(self, user_id: int) -> _UserTurns:
+        turns = self.storage.get_turns(user_id, limit=self.max_turns)
+        # Historiales viejos (dentro de la sesión) no tienen número de turno:
+        # se los numera y se copian al registro append-only
+        legacy = bool(turns) and all("seq" not in turn for turn in turns)
+        for i, turn in enumerate(turns):
+            turn.setdefault("seq", i)
+        if legacy:
+            for turn in turns:
+                self.storage.append_turn(user_id, turn)
+        return _UserTurns(deque(turns, maxlen=self.max_turns), turns[-1]["seq"] + 1 if turns else 0)
+
+    def append(self, user_id: int, role: Role, text: str) -> Dict[str, Any]:
+        state = self._state(user_id)
+        with self._lock:
+            turn = {"role": role, "text": text, "ts": _now_iso(), "seq": state.seq}
+            state.seq += 1
+            state.turns.append(turn)
+        self.storage.append_turn(user_id, turn)
+        return turn
+
+    def recent(self, user_id: int, limit: int | None = None) -> List[Dict[str, Any]]:
+        state = self._state(user_id)
+        with self._lock:
+            turns = list(state.turns)
+        return turns[-limit:] if limit else turns
+
+    def clear(self, user_id: int):
+        with self._lock:
+            self._users.put(str(user_id), _UserTurns(deque(maxlen=self.max_turns), 0))
+        self.storage.clear_turns(user_id)
+
+    def summary(self, user_id: int, older_turns: List[Dict[str, Any]]) -> str:
+        """
+        Resumen de `older_turns` (los que no entran en el presupuesto).
+        Si ya había un resumen hasta cierto turno, solo se le agregan los nuevos.
+        """
+        if not older_turns:
+            return ""
+        upto = older_turns[-1]["seq"]
+        state = self._state(user_id)
+        with self._lock:
+            cached = state.summary
+        if cached and cached[0] == upto:
+            return cached[1]
+
+        if cached and cached[0] < upto:
+            new_turns = [m for m in older_turns if m["seq"] > cached[0]]
+            text = self.summarizer(cached[1], new_turns)
+        else:
+            text = self.summarizer("", older_turns)
+
+        with self._lock:
+            state.summary = (upto, text)
+        return text
+
+
+_stores: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_stores_lock = threading.Lock()
+
+def get_turn_store(storage=None) -> TurnStore:
+    """Un TurnStore por cliente de almacenamiento."""
+    db = _db(storage)
+    with _stores_lock:
+        store = _stores.get(db)
+        if store is None:
+            store = TurnStore(db)
+            _stores[db] = store
+        return store
+
 def ensure_profile(user_id: int, display_name: str | None = None, extra: dict | None = None, storage=None) -> dict:
     db = _db(storage)
     profile = db.get_profile(user_id) or {}
@@ -22,42 +175,108 @@ def ensure_profile(user_id: int, display_name: str | None = None, extra: dict |
     return profile
 
 def get_history(user_id: int, storage=None) -> List[Dict[str, Any]]:
-    db = _db(storage)
-    session = db.get_session(user_id)
-    return session.get("history", [])
+    return get_turn_store(storage).recent(user_id)
 
 def save_turn(user_id: int, role: Role, text: str, cap: int = 12, storage=None) -> List[Dict[str, Any]]:
-    db = _db(storage)
-    session = db.get_session(user_id)
-    history: List[Dict[str, Any]] = session.get("history", [])
-    history.append({"role": role, "text": text, "ts": _now_iso()})
-    if len(history) > cap:
-        history = history[-cap:]
-    db.save_session(user_id, {"history": history, "updatedAt": _now_iso()})
-    return history
+    """Agrega un turno (append-only) y devuelve los últimos `cap` turnos."""
+    store = get_turn_store(storage)
+    store.append(user_id, role, text)
+    return store.recent(user_id, limit=cap)
 
 def clear_history(user_id: int, storage=None):
-    db = _db(storage)
-    db.save_session(user_id, {"history": [], "updatedAt": _now_iso()})
+    get_turn_store(storage).clear(user_id)
 
-def build_llm_context(user_id: int, extra_facts: dict | None = None, storage=None) -> str:
-    db = _db(storage)
-    profile = db.get_profile(user_id) or {}
-    history = get_history(user_id, storage=db)
+def _fit_recent(history: List[Dict[str, Any]], budget: int) -> tuple[int, List[str]]:
+    """
+    Llena el presupuesto desde el turno más nuevo hacia atrás (siempre entra el último).
+    Devuelve (índice del primer turno incluido, líneas de texto).
+    """
+    lines = []
+    split = len(history)
+    for i in range(len(history) - 1, -1, -1):
+        line = f'{history[i]["role"].upper()}: {history[i]["text"]}'
+        cost = estimate_tokens(line)
+        if cost > budget and lines:
+            break
+        budget -= cost
+        lines.append(line)
+        split = i
+    lines.reverse()
+    return split, lines
 
+def _profile_facts(profile: dict, extra_facts: dict | None = None) -> List[str]:
     facts_lines = []
     for k, v in profile.items():
-        if k in ("displayName", "idioma", "preferencias", "autonomia", "foco", "entorno"):
+        if k in PROFILE_PROMPT_FIELDS:
             facts_lines.append(f"- {k}: {v}")
     if extra_facts:
         for k, v in extra_facts.items():
             facts_lines.append(f"- {k}: {v}")
+    return facts_lines
+
+def _select_history(store: TurnStore, user_id: int, history: List[Dict[str, Any]], budget: int) -> tuple[int, List[str], str]:
+    """Elige los turnos que entran en el presupuesto y resume el resto."""
+    split, hist_lines = _fit_recent(history, budget)
+    if split > 0:
+        # No entra todo: reservamos lugar para el resumen de lo anterior
+        split, hist_lines = _fit_recent(history, budget - config.HISTORY_SUMMARY_MAX_CHARS // 4)
+    return split, hist_lines, store.summary(user_id, history[:split])
+
+def build_llm_context(user_id: int, extra_facts: dict | None = None, storage=None, token_budget: int | None = None) -> str:
+    """
+    Arma el contexto (hechos del perfil + historial) sin pasarse de `token_budget`.
+    Los turnos más recientes van completos; los que no entran se resumen.
+    """
+    db = _db(storage)
+    store = get_turn_store(db)
+    token_budget = token_budget or config.HISTORY_TOKEN_BUDGET
+    profile = db.get_profile(user_id) or {}
+    history = store.recent(user_id)
 
-    hist_lines = [f'{m["role"].upper()}: {m["text"]}' for m in history]
+    facts_lines = _profile_facts(profile, extra_facts)
+    budget = token_budget - sum(estimate_tokens(line) for line in facts_lines)
+    split, hist_lines, summary = _select_history(store, user_id, history, budget)
 
     return (
         "Hechos persistentes del usuario:\n" +
         ("\n".join(facts_lines) if facts_lines else "- (sin datos)") +
+        ("\n\nResumen de la conversación anterior:\n" + summary if summary else "") +
         "\n\nHistoria reciente:\n" +
         ("\n".join(hist_lines) if hist_lines else "(sin historial)")
     )
+
+def build_llm_messages(user_id: int, system_prompt: str, new_text: str, extra_facts: dict | None = None,
+                       storage=None, token_budget: int | None = None) -> List[Dict[str, str]]:
+    """
+    Arma la conversación en formato chat nativo, ordenada para reutilizar prefijos:
+    1. el system prompt (igual para todos los usuarios),
+    2. los hechos del perfil y el resumen (cambian poco por usuario),
+    3. los turnos recientes como mensajes user/assistant (solo crecen al final),
+    4. el mensaje nuevo.
+    Llamar antes de guardar `new_text` en el historial.
+    """
+    db = _db(storage)
+    store = get_turn_store(db)
+    token_budget = token_budget or config.HISTORY_TOKEN_BUDGET
+    profile = db.get_profile(user_id) or {}
+    history = store.recent(user_id)
+
+    facts_lines = _profile_facts(profile, extra_facts)
+    budget = token_budget - sum(estimate_tokens(line) for line in facts_lines) - estimate_tokens(new_text)
+    split, _, summary = _select_history(store, user_id, history, budget)
+
+    user_block = (
+        "Hechos persistentes del usuario:\n" +
+        ("\n".join(facts_lines) if facts_lines else "- (sin datos)") +
+        ("\n\nResumen de la conversación anterior:\n" + summary if summary else "")
+    )
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "system", "content": user_block},
+    ]
+    for m in history[split:]:
+        role = "assistant" if m["role"] == "assistant" else "user"
+        messages.append({"role": role, "content": m["text"]})
+    messages.append({"role": "user", "content": new_text})
+    return messages
@@ -0,0 +1,341 @@
+# aida_bot/metrics.py
+"""
+Métricas del bot en formato de texto de Prometheus, servidas en /metrics
+(y el estado de las colas en /healthz) en METRICS_HOST:METRICS_PORT.
+
+Contadores, medidores e histogramas en memoria del proceso, con un lock por
+métrica: registrar un valor cuesta un par de microsegundos, así que pueden
+quedar activas en producción. Los valores que ya existen en otros objetos
+(cachés, colas, circuitos) no se copian en cada operación: se leen recién
+cuando alguien consulta /metrics.
+"""
+import bisect
+import functools
+import inspect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from aida_bot import config
+
+# Segundos: cubre desde una búsqueda en la FAQ hasta una transcripción larga
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n, "") for n in self.labels)
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in items]
+
+
+class Counter(_Metric):
+    """Valor que solo crece (mensajes, aciertos de FAQ, errores...)."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if not config.METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    Valor que sube y baja (pedidos en curso). Con `function`, el valor se calcula
+    al consultar /metrics: la función devuelve un número o {etiquetas: valor}.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = (), function=None):
+        super().__init__(name, help_text, labels)
+        self.function = function
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        if not config.METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """`with INFLIGHT.track(handler="text"): ...` suma 1 mientras dura el bloque."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def render(self) -> list[str]:
+        if self.function is None:
+            return super().render()
+        try:
+            values = self.function()
+        except Exception as e:
+            print(f"[ERROR MÉTRICAS] {self.name}: {e}")
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labels, k if isinstance(k, tuple) else (k,))} {_format_value(v)}"
+            for k, v in sorted(values.items())
+        ]
+
+
+class Histogram(_Metric):
+    """Distribución de latencias con cubetas fijas (p50/p95/p99 se calculan en Prometheus)."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        if not config.METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        lines = self._header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help_text: str, labels: tuple[str, ...] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help_text, labels))
+
+
+def gauge(name: str, help_text: str, labels: tuple[str, ...] = (), function=None) -> Gauge:
+    return REGISTRY.register(Gauge(name, help_text, labels, function))
+
+
+def histogram(name: str, help_text: str, labels: tuple[str, ...] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help_text, labels, buckets))
+
+
+# --- Métricas del camino caliente ---
+
+STAGE_SECONDS = histogram("aida_stage_seconds", "Duración de cada etapa de un mensaje.", ("stage",))
+HANDLER_SECONDS = histogram("aida_handler_seconds", "Duración total por tipo de mensaje.", ("handler",))
+EXTERNAL_SECONDS = histogram("aida_external_seconds",
+                             "Latencia de servicios externos y de E/S (Groq, Whisper, edge-tts, pydub, almacenamiento).",
+                             ("service",))
+INFLIGHT = gauge("aida_inflight_requests", "Mensajes en proceso ahora.", ("handler",))
+ANSWERS = counter("aida_answers_total", "Respuestas de chat por origen (faq, llm, fallback).", ("source",))
+ALERTS = counter("aida_alerts_total", "Mensajes de alerta detectados y avisos enviados.", ("event",))
+ERRORS = counter("aida_errors_total", "Errores capturados por lugar.", ("where",))
+STORAGE_COMMITS = counter("aida_storage_commits_total",
+                          "Escrituras del archivo local (commit) y cambios que entraron en ellas (record).",
+                          ("event",))
+
+def instrumented(handler: str):
+    """Decorador para handlers de Telegram: mensajes en curso y duración total."""
+    def _decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def _async_wrapper(*args, **kwargs):
+                with INFLIGHT.track(handler=handler), HANDLER_SECONDS.time(handler=handler):
+                    return await fn(*args, **kwargs)
+            return _async_wrapper
+
+        @functools.wraps(fn)
+        def _wrapper(*args, **kwargs):
+            with INFLIGHT.track(handler=handler), HANDLER_SECONDS.time(handler=handler):
+                return fn(*args, **kwargs)
+        return _wrapper
+    return _decorator
+
+
+# Cachés observadas: nombre -> objeto con stats() {"entries", "hits", "misses"}
+_caches: dict[str, object] = {}
+
+
+def watch_cache(name: str, cache):
+    """Expone los aciertos y fallos de una LRUCache (se leen al consultar /metrics)."""
+    if cache is not None:
+        _caches[name] = cache
+
+
+def _cache_stat(field: str):
+    def _collect():
+        return {(name,): cache.stats().get(field, 0) for name, cache in list(_caches.items())}
+    return _collect
+
+
+# Colas observadas: nombre -> función que devuelve cuántos elementos esperan
+_queues: dict[str, object] = {}
+
+
+def watch_queue(name: str, depth):
+    """Expone la profundidad de una cola (`depth()` se llama al consultar /metrics)."""
+    _queues[name] = depth
+
+
+gauge("aida_queue_depth", "Actualizaciones esperando en cada cola.", ("queue",),
+      lambda: {(name,): depth() for name, depth in list(_queues.items())})
+gauge("aida_cache_hits", "Aciertos acumulados por caché.", ("cache",), _cache_stat("hits"))
+gauge("aida_cache_misses", "Fallos acumulados por caché.", ("cache",), _cache_stat("misses"))
+gauge("aida_cache_entries", "Entradas actuales por caché.", ("cache",), _cache_stat("entries"))
+
+
+_health: dict = {}  # nombre -> función que devuelve un dict (ej: colas del webhook)
+
+
+def watch_health(name: str, stats):
+    """Publica `stats()` en /healthz del servidor de métricas."""
+    _health[name] = stats
+
+
+def unwatch_health(name: str):
+    _health.pop(name, None)
+
+
+def health() -> dict:
+    sources = list(_health.items())
+    if len(sources) == 1:
+        return sources[0][1]()
+    return {name: stats() for name, stats in sources}
+
+
+# --- Servidor HTTP ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    server_version = "AIDAMetrics/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = REGISTRY.render().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/healthz":
+            body = json.dumps(health()).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_servers: dict[tuple[str, int], ThreadingHTTPServer] = {}
+_servers_lock = threading.Lock()
+
+
+def start_server(port: int | None = None, host: str | None = None) -> ThreadingHTTPServer | None:
+    """
+    Sirve /metrics en segundo plano. Con METRICS_PORT=0 (o métricas desactivadas) no hace nada.
+    Si ya está levantado (varios bots en un proceso), devuelve el mismo servidor.
+    """
+    port = config.METRICS_PORT if port is None else port
+    if not config.METRICS_ENABLED or not port:
+        return None
+    host = host or config.METRICS_HOST
+    with _servers_lock:
+        if (host, port) in _servers:
+            return _servers[(host, port)]
+        try:
+            httpd = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            print(f"⚠️ No se pudo abrir el puerto de métricas {host}:{port}: {e}")
+            return None
+        _servers[(host, port)] = httpd
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True, name="aida-metrics").start()
+    print(f"✅ Métricas en http://{host}:{port}/metrics")
+    return httpd
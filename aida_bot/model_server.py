@@ -0,0 +1,264 @@
+# aida_bot/model_server.py
+"""
+Servidor local de modelos: carga Whisper y el modelo de sentimiento una sola vez
+y atiende a todos los procesos del bot por un socket Unix.
+
+Los pedidos se agrupan en lotes (hasta MODEL_SERVER_BATCH_SIZE, esperando como
+máximo MODEL_SERVER_BATCH_WAIT_MS) y cada modelo tiene una cola acotada: si está
+llena, el pedido se rechaza enseguida en lugar de acumular espera.
+
+Uso:
+    python -m aida_bot.model_server [--socket /tmp/aida_models.sock] [--whisper-size base]
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+from aida_bot import config
+
+_HEADER = struct.Struct(">I")  # largo del encabezado JSON
+
+
+BUSY = "ocupado"  # respuesta del servidor cuando la cola del modelo está llena
+
+
+class ModelServerError(Exception):
+    """
+    El servidor de modelos no respondió o devolvió un error.
+    `unavailable` es True si está caído o saturado (reintentar más tarde tiene sentido)
+    y False si falló el pedido en sí (ej: un audio que no se pudo decodificar).
+    """
+
+    def __init__(self, message: str, unavailable: bool = False):
+        super().__init__(message)
+        self.unavailable = unavailable
+
+
+# --- Protocolo: [largo][encabezado JSON][payload binario de `size` bytes] ---
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("conexión cerrada")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def send_frame(sock: socket.socket, header: dict, payload: bytes = b""):
+    header = dict(header, size=len(payload))
+    raw = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(raw)) + raw + payload)
+
+
+def recv_frame(sock: socket.socket) -> tuple[dict, bytes]:
+    (length,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    header = json.loads(_recv_exact(sock, length).decode("utf-8"))
+    payload = _recv_exact(sock, header.get("size", 0)) if header.get("size") else b""
+    return header, payload
+
+
+# --- Servidor ---
+
+class _Pending:
+    __slots__ = ("item", "result", "error", "done")
+
+    def __init__(self, item):
+        self.item = item
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class _Batcher:
+    """Junta pedidos de un mismo modelo y los ejecuta en lote en un hilo propio."""
+
+    def __init__(self, name: str, run_batch, batch_size: int, max_wait: float, queue_size: int):
+        self.name = name
+        self.run_batch = run_batch  # lista de entradas -> lista de resultados
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batches = 0
+        self.items = 0
+        threading.Thread(target=self._loop, daemon=True, name=f"aida-batch-{name}").start()
+
+    def submit(self, item) -> _Pending:
+        pending = _Pending(item)
+        self.queue.put_nowait(pending)  # queue.Full si el modelo está saturado
+        return pending
+
+    def _loop(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                results = self.run_batch([p.item for p in batch])
+                for pending, result in zip(batch, results):
+                    pending.result = result
+            except Exception as e:
+                print(f"[ERROR MODELOS] Lote de {self.name} falló: {e}")
+                for pending in batch:
+                    pending.error = str(e)
+            self.batches += 1
+            self.items += len(batch)
+            for pending in batch:
+                pending.done.set()
+
+
+class ModelServer:
+    """Carga los modelos una vez y atiende pedidos `transcribe` y `sentiment`."""
+
+    def __init__(self, socket_path: str | None = None, whisper_size: str = "base", sentiment_model: str | None = None,
+                 batch_size: int | None = None, batch_wait_ms: float | None = None, queue_size: int | None = None):
+        from aida_bot.services.sentiment_service import SentimentAnalyzer, load_sentiment_pipeline
+        from aida_bot.services.speech_service import load_whisper_model, transcribe_many
+
+        self.socket_path = socket_path or config.MODEL_SERVER_SOCKET or "/tmp/aida_models.sock"
+        batch_size = batch_size or config.MODEL_SERVER_BATCH_SIZE
+        max_wait = (config.MODEL_SERVER_BATCH_WAIT_MS if batch_wait_ms is None else batch_wait_ms) / 1000
+        queue_size = queue_size or config.MODEL_SERVER_QUEUE_SIZE
+
+        whisper_model = load_whisper_model(whisper_size)
+        sentiment = load_sentiment_pipeline(sentiment_model or SentimentAnalyzer.DEFAULT_MODEL)
+
+        def _transcribe(items):
+            by_language = {}
+            for i, (audio, language) in enumerate(items):
+                by_language.setdefault(language, []).append(i)
+            results = [""] * len(items)
+            for language, indexes in by_language.items():
+                texts = transcribe_many(whisper_model, [items[i][0] for i in indexes], language)
+                for i, text in zip(indexes, texts):
+                    results[i] = text
+            return results
+
+        def _sentiment(texts):
+            return [{"label": r.get("label"), "score": r.get("score")} for r in sentiment(texts, batch_size=len(texts))]
+
+        self.batchers = {
+            "transcribe": _Batcher("transcribe", _transcribe, batch_size, max_wait, queue_size),
+            "sentiment": _Batcher("sentiment", _sentiment, batch_size, max_wait, queue_size),
+        }
+
+    def _handle(self, header: dict, payload: bytes) -> dict:
+        op = header.get("op")
+        if op == "ping":
+            return {"ok": True, "result": {n: {"batches": b.batches, "items": b.items, "queued": b.queue.qsize()}
+                                           for n, b in self.batchers.items()}}
+        if op == "transcribe":
+            item = (payload, header.get("language", "es"))
+        elif op == "sentiment":
+            item = header.get("text", "")
+        else:
+            return {"ok": False, "error": f"operación desconocida: {op}"}
+
+        try:
+            pending = self.batchers[op].submit(item)
+        except queue.Full:
+            return {"ok": False, "error": BUSY}
+        pending.done.wait()
+        if pending.error:
+            return {"ok": False, "error": pending.error}
+        return {"ok": True, "result": pending.result}
+
+    def _serve_connection(self, conn: socket.socket):
+        # Cada proceso del bot mantiene conexiones abiertas: se atienden en orden
+        with conn:
+            while True:
+                try:
+                    header, payload = recv_frame(conn)
+                    send_frame(conn, self._handle(header, payload))
+                except (ConnectionError, OSError, ValueError):
+                    return
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        server.listen(128)
+        print(f"✅ Servidor de modelos escuchando en {self.socket_path}")
+        try:
+            while True:
+                conn, _ = server.accept()
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            server.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+# --- Cliente ---
+
+class ModelClient:
+    """
+    Cliente liviano para SpeechService y SentimentAnalyzer en modo remoto.
+    Reutiliza conexiones (una por pedido en curso) y no carga ningún modelo.
+    """
+
+    def __init__(self, socket_path: str | None = None, timeout: float | None = None):
+        self.socket_path = socket_path or config.MODEL_SERVER_SOCKET
+        self.timeout = timeout or config.MODEL_SERVER_TIMEOUT
+        self._idle: list[socket.socket] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> socket.socket:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def request(self, header: dict, payload: bytes = b""):
+        try:
+            sock = self._connect()
+        except OSError as e:
+            raise ModelServerError(f"No se pudo conectar a {self.socket_path}: {e}", unavailable=True) from e
+        try:
+            send_frame(sock, header, payload)
+            response, _ = recv_frame(sock)
+        except (OSError, ConnectionError, ValueError) as e:
+            sock.close()
+            raise ModelServerError(str(e), unavailable=True) from e
+        with self._lock:
+            self._idle.append(sock)
+        if not response.get("ok"):
+            error = response.get("error", "error desconocido")
+            raise ModelServerError(error, unavailable=error == BUSY)
+        return response.get("result")
+
+    def transcribe(self, audio_bytes: bytes, language: str = "es") -> str:
+        return self.request({"op": "transcribe", "language": language}, audio_bytes)
+
+    def sentiment(self, text: str) -> dict:
+        return self.request({"op": "sentiment", "text": text})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local de Whisper y sentimiento para AIDA.")
+    parser.add_argument("--socket", default=None, help="ruta del socket Unix (por defecto MODEL_SERVER_SOCKET)")
+    parser.add_argument("--whisper-size", default="base")
+    args = parser.parse_args()
+    ModelServer(socket_path=args.socket, whisper_size=args.whisper_size).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
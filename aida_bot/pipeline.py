@@ -0,0 +1,185 @@
+# aida_bot/pipeline.py
+import asyncio
+import functools
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from aida_bot import config
+from aida_bot.metrics import ERRORS, STAGE_SECONDS, watch_queue
+
+
+class StageTimings:
+    """
+    Tiempos por etapa de un mensaje (intención, FAQ, LLM, TTS, ...).
+    Guarda inicio y fin relativos al comienzo del mensaje, así las etapas que
+    corren en paralelo se ven solapadas y se distingue el camino crítico.
+    """
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.t0 = time.perf_counter()
+        self.stages: list[tuple[str, float, float]] = []  # (nombre, inicio, fin) en segundos
+        self._lock = threading.Lock()
+
+    def record(self, name: str, start: float, end: float):
+        with self._lock:
+            self.stages.append((name, start - self.t0, end - self.t0))
+        STAGE_SECONDS.observe(end - start, stage=name)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def wrap(self, name: str, fn, *args, **kwargs):
+        """Devuelve una función sin argumentos que ejecuta `fn` midiendo su tiempo (para el executor)."""
+        def _run():
+            with self.stage(name):
+                return fn(*args, **kwargs)
+        return _run
+
+    def summary(self) -> str:
+        with self._lock:
+            stages = sorted(self.stages, key=lambda s: s[1])
+        total = max((end for _, _, end in stages), default=0.0)
+        parts = [f"{name}={1000 * (end - start):.0f}ms@{1000 * start:.0f}" for name, start, end in stages]
+        return f"total={1000 * total:.0f}ms " + " ".join(parts)
+
+    def log(self):
+        if config.PIPELINE_LOG_TIMINGS and self.stages:
+            print(f"[TIEMPOS] {self.label} {self.summary()}")
+
+
+def create_executor(max_workers: int | None = None) -> ThreadPoolExecutor:
+    """Executor compartido para las etapas independientes de cada mensaje."""
+    return ThreadPoolExecutor(max_workers=max_workers or config.PIPELINE_WORKERS,
+                              thread_name_prefix="aida-pipeline")
+
+
+_cpu_executor: ThreadPoolExecutor | None = None
+_cpu_executor_lock = threading.Lock()
+
+
+def cpu_executor() -> ThreadPoolExecutor:
+    """
+    Hilos para el trabajo de CPU de los modelos en modo async (Whisper, sentimiento,
+    pydub, OCR). El almacenamiento usa el executor por defecto del event loop
+    (asyncio.to_thread, ASYNC_IO_WORKERS): unos audios no frenan la lectura de sesiones.
+    """
+    global _cpu_executor
+    with _cpu_executor_lock:
+        if _cpu_executor is None:
+            _cpu_executor = ThreadPoolExecutor(max_workers=config.ASYNC_CPU_WORKERS, thread_name_prefix="aida-cpu")
+        return _cpu_executor
+
+
+async def run_cpu(fn, *args):
+    """Corre `fn(*args)` en el executor de CPU sin bloquear el event loop."""
+    return await asyncio.get_running_loop().run_in_executor(cpu_executor(), functools.partial(fn, *args))
+
+
+def update_chat_id(update) -> int:
+    """Chat al que pertenece una actualización de Telegram (o su update_id si no tiene chat)."""
+    for attr in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        message = getattr(update, attr, None)
+        if message is not None:
+            return message.chat.id
+    query = getattr(update, "callback_query", None)
+    if query is not None and query.message is not None:
+        return query.message.chat.id
+    return update.update_id
+
+
+def shard_for(chat_id: int, count: int, salt: str = "") -> int:
+    """Reparte chats de forma estable (igual en todos los procesos y reinicios)."""
+    return zlib.crc32(f"{salt}{chat_id}".encode("utf-8")) % count
+
+
+class _ChatCall:
+    """Tarea encolada detrás de los mensajes de un chat (ej: un pedido postergado)."""
+    __slots__ = ("chat_id", "fn")
+
+    def __init__(self, chat_id: int, fn):
+        self.chat_id = chat_id
+        self.fn = fn
+
+
+class ChatDispatcher:
+    """
+    Reparte actualizaciones entre hilos de trabajo con una cola acotada por hilo.
+    Cada chat va siempre al mismo hilo, así sus mensajes se atienden en orden.
+    """
+
+    def __init__(self, process, workers: int, queue_size: int, name: str = "aida-worker"):
+        self.process = process  # función que recibe una lista de actualizaciones
+        self.workers = max(1, workers)
+        self.name = name
+        self.queues = [queue.Queue(maxsize=max(1, queue_size // self.workers)) for _ in range(self.workers)]
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._threads: list[threading.Thread] = []
+        watch_queue(name, lambda: sum(q.qsize() for q in self.queues))
+
+    def submit(self, update, block: bool = False) -> bool:
+        """Encola la actualización; sin `block`, devuelve False si la cola del chat está llena."""
+        chat_id = update.chat_id if isinstance(update, _ChatCall) else update_chat_id(update)
+        target = self.queues[shard_for(chat_id, self.workers, salt=self.name)]
+        try:
+            target.put(update, block=block)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.received += 1
+        return True
+
+    def submit_call(self, chat_id: int, fn) -> bool:
+        """Corre `fn()` en el hilo del chat, después de los mensajes que ya tiene en cola."""
+        return self.submit(_ChatCall(chat_id, fn), block=True)
+
+    def _worker(self, updates: queue.Queue):
+        while True:
+            update = updates.get()
+            if update is None:
+                break
+            try:
+                if isinstance(update, _ChatCall):
+                    update.fn()
+                else:
+                    self.process([update])
+            except Exception as e:
+                ERRORS.inc(where=self.name)
+                print(f"[ERROR {self.name.upper()}] {e}")
+            finally:
+                with self._lock:
+                    self.processed += 1
+
+    def start(self):
+        for i, updates in enumerate(self.queues):
+            thread = threading.Thread(target=self._worker, args=(updates,), daemon=True, name=f"{self.name}-{i}")
+            thread.start()
+            self._threads.append(thread)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "received": self.received,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "queued": sum(q.qsize() for q in self.queues),
+            }
+
+    def stop(self, timeout: float = 5):
+        for updates in self.queues:
+            updates.put(None)
+        for thread in self._threads:
+            thread.join(timeout=timeout)
@@ -0,0 +1,196 @@
+# aida_bot/profiling.py
+"""
+Perfilado por muestreo de actualizaciones individuales.
+
+Mientras un handler atiende una actualización elegida (por chat o al azar),
+un único hilo toma cada PROFILE_INTERVAL_MS la pila del hilo que la atiende.
+Al terminar se escribe un archivo de pilas "plegadas" (una línea
+`func;func;func cantidad`), que entienden flamegraph.pl, speedscope e inferno:
+
+    profiles/20250101-120000_chat123_text_842ms.folded
+
+Además se lleva un ranking de las actualizaciones más lentas (perfiladas o no)
+en profiles/slowest.json.
+"""
+import functools
+import heapq
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from aida_bot import config
+
+
+class _Session:
+    __slots__ = ("chat_id", "handler", "thread_id", "stacks", "samples")
+
+    def __init__(self, chat_id: int, handler: str, thread_id: int):
+        self.chat_id = chat_id
+        self.handler = handler
+        self.thread_id = thread_id
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+
+def _fold(frame) -> str:
+    """Pila de un frame en formato plegado, de la raíz a la hoja."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+
+class SamplingProfiler:
+    """
+    Se activa con PROFILING_ENABLED o en caliente con /perfil (admins).
+    Perfila todas las actualizaciones de los chats vigilados y una fracción
+    PROFILE_SAMPLE_RATE del resto. Sin sesiones activas, el hilo de muestreo duerme.
+    """
+
+    def __init__(self):
+        self.enabled = config.PROFILING_ENABLED
+        self.sample_rate = config.PROFILE_SAMPLE_RATE
+        self.interval = config.PROFILE_INTERVAL_MS / 1000
+        self.output_dir = config.PROFILE_DIR
+        self.top_n = config.PROFILE_TOP_N
+        self.watched_chats: set[int] = set(config.PROFILE_CHATS)
+        self._sessions: dict[int, _Session] = {}  # id de hilo -> sesión
+        self._slowest: list[tuple[float, int, dict]] = []  # heap de (duración, orden, info)
+        self._order = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._file_lock = threading.Lock()
+        self._thread = None
+
+    # --- Control ---
+
+    def set_enabled(self, enabled: bool):
+        self.enabled = enabled
+
+    def watch_chat(self, chat_id: int):
+        self.watched_chats.add(chat_id)
+
+    def unwatch_chat(self, chat_id: int):
+        self.watched_chats.discard(chat_id)
+
+    def should_profile(self, chat_id: int) -> bool:
+        if not self.enabled:
+            return False
+        return chat_id in self.watched_chats or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    # --- Muestreo ---
+
+    def _ensure_sampler(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._sample_loop, daemon=True, name="aida-profiler")
+            self._thread.start()
+
+    def _sample_loop(self):
+        while True:
+            with self._wakeup:
+                while not self._sessions:
+                    self._wakeup.wait()
+                sessions = list(self._sessions.values())
+            frames = sys._current_frames()
+            for session in sessions:
+                frame = frames.get(session.thread_id)
+                if frame is not None:
+                    session.stacks[_fold(frame)] += 1
+                    session.samples += 1
+            del frames
+            time.sleep(self.interval)
+
+    @contextmanager
+    def profile(self, chat_id: int, handler: str):
+        """Perfila el bloque si corresponde; siempre mide la duración para el ranking."""
+        session = None
+        if self.should_profile(chat_id):
+            session = _Session(chat_id, handler, threading.get_ident())
+            with self._wakeup:
+                self._ensure_sampler()
+                self._sessions[session.thread_id] = session
+                self._wakeup.notify()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            path = None
+            if session is not None:
+                with self._lock:
+                    self._sessions.pop(session.thread_id, None)
+                path = self._write(session, duration)
+            if self.enabled:
+                self._rank(chat_id, handler, duration, path)
+
+    def _write(self, session: _Session, duration: float) -> str | None:
+        if not session.stacks:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = (f"{time.strftime('%Y%m%d-%H%M%S')}_chat{session.chat_id}_{session.handler}"
+                f"_{duration * 1000:.0f}ms.folded")
+        path = os.path.join(self.output_dir, name)
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in session.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        except OSError as e:
+            print(f"[ERROR PERFIL] No se pudo guardar {path}: {e}")
+            return None
+        return path
+
+    def _rank(self, chat_id: int, handler: str, duration: float, path: str | None):
+        info = {"chat_id": chat_id, "handler": handler, "ms": round(duration * 1000, 1),
+                "at": time.strftime("%Y-%m-%dT%H:%M:%S"), "profile": path}
+        with self._lock:
+            self._order += 1
+            entry = (duration, self._order, info)
+            if len(self._slowest) < self.top_n:
+                heapq.heappush(self._slowest, entry)
+            elif duration > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+            else:
+                return
+            ranking = [e[2] for e in sorted(self._slowest, reverse=True)]
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with self._file_lock, open(os.path.join(self.output_dir, "slowest.json"), "w", encoding="utf-8") as f:
+                json.dump(ranking, f, indent=2, ensure_ascii=False)
+        except OSError as e:
+            print(f"[ERROR PERFIL] No se pudo guardar el ranking: {e}")
+
+    def slowest(self) -> list[dict]:
+        with self._lock:
+            return [e[2] for e in sorted(self._slowest, reverse=True)]
+
+    def profiled(self, handler: str):
+        """Decorador para handlers síncronos que reciben el mensaje como primer argumento."""
+        def _decorator(fn):
+            @functools.wraps(fn)
+            def _wrapper(msg, *args, **kwargs):
+                if not self.enabled:
+                    return fn(msg, *args, **kwargs)
+                with self.profile(msg.chat.id, handler):
+                    return fn(msg, *args, **kwargs)
+            return _wrapper
+        return _decorator
+
+
+_profiler: SamplingProfiler | None = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler() -> SamplingProfiler:
+    """Perfilador único del proceso."""
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = SamplingProfiler()
+        return _profiler
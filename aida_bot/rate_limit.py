@@ -0,0 +1,273 @@
+# aida_bot/rate_limit.py
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from aida_bot import config
+from aida_bot.cache import LRUCache
+from aida_bot import metrics
+
+# Prioridades para las colas de los endpoints (menor = se atiende antes)
+PRIORITY_HIGH = 0    # detección de intención (cambios de configuración)
+PRIORITY_NORMAL = 1  # chat, traducción, TTS
+PRIORITY_LOW = 2     # visión y transcripción (lo más caro)
+
+# Respuesta cuando un endpoint está saturado
+BUSY_REPLY = "⏳ Estoy atendiendo muchas consultas en este momento. Probá de nuevo en un ratito, por favor."
+
+
+class RateLimitExceeded(Exception):
+    """No hubo lugar en el endpoint dentro del tiempo de espera."""
+
+
+class TokenBucket:
+    """Cubeta de fichas: `capacity` pedidos de golpe y se recarga a `rate_per_min` por minuto."""
+
+    def __init__(self, rate_per_min: float, capacity: float | None = None):
+        self.rate = rate_per_min / 60.0
+        self.capacity = capacity or max(1.0, rate_per_min)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def try_acquire(self, cost: float = 1.0) -> tuple[bool, float]:
+        """Devuelve (permitido, segundos hasta que haya fichas)."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True, 0.0
+        return False, (cost - self.tokens) / self.rate if self.rate else float("inf")
+
+
+class RateLimiter:
+    """
+    Límites por usuario y por tipo de operación (transcribe, vision, chat, translate).
+    Cuando un usuario se pasa, su pedido se posterga hasta que haya fichas
+    (como máximo RATE_LIMIT_MAX_DEFERRED pedidos en espera por operación).
+    """
+
+    def __init__(self, limits: dict[str, float] | None = None, max_deferred: int | None = None,
+                 max_users: int = 50000):
+        self.enabled = config.RATE_LIMITS_ENABLED
+        self.limits = limits or {
+            "transcribe": config.RATE_LIMIT_TRANSCRIBE,
+            "vision": config.RATE_LIMIT_VISION,
+            "chat": config.RATE_LIMIT_CHAT,
+            "translate": config.RATE_LIMIT_TRANSLATE,
+        }
+        self.max_deferred = config.RATE_LIMIT_MAX_DEFERRED if max_deferred is None else max_deferred
+        self.buckets = LRUCache(max_size=max_users)
+        self._deferred: dict[tuple[int, str], int] = {}
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def acquire(self, user_id: int, op: str) -> tuple[bool, float]:
+        rate = self.limits.get(op)
+        if not self.enabled or not rate:
+            return True, 0.0
+        key = (user_id, op)
+        with self._lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(rate)
+                self.buckets.put(key, bucket)
+            allowed, wait = bucket.try_acquire()
+            if not allowed:
+                self.limited += 1
+            return allowed, wait
+
+    def reserve_deferred(self, user_id: int, op: str) -> bool:
+        """Reserva un lugar para postergar el pedido; False si ya hay demasiados esperando."""
+        key = (user_id, op)
+        with self._lock:
+            if self._deferred.get(key, 0) >= self.max_deferred:
+                return False
+            self._deferred[key] = self._deferred.get(key, 0) + 1
+            return True
+
+    def release_deferred(self, user_id: int, op: str):
+        key = (user_id, op)
+        with self._lock:
+            remaining = self._deferred.get(key, 0) - 1
+            if remaining > 0:
+                self._deferred[key] = remaining
+            else:
+                self._deferred.pop(key, None)
+
+    def defer(self, user_id: int, op: str, delay: float, retry, dispatch=None) -> bool:
+        """
+        Ejecuta `retry` dentro de `delay` segundos (si hay lugar). El temporizador solo
+        lo encola con `dispatch(fn)` (ej: en la cola del chat, detrás de sus mensajes);
+        sin `dispatch` corre en el hilo del temporizador.
+        """
+        if not self.reserve_deferred(user_id, op):
+            return False
+
+        def _run():
+            self.release_deferred(user_id, op)
+            try:
+                retry()
+            except Exception as e:
+                print(f"[ERROR LÍMITES] Pedido postergado ({op}) falló: {e}")
+
+        timer = threading.Timer(delay, dispatch or _run, args=(_run,) if dispatch else ())
+        timer.daemon = True
+        timer.start()
+        return True
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(True)
+
+
+class PriorityGate:
+    """
+    Semáforo con prioridad: como mucho `capacity` llamadas a la vez al endpoint;
+    cuando está lleno, los que esperan pasan por prioridad y luego por orden de llegada.
+    Hilos y corrutinas (modo async) comparten la misma fila: una corrutina espera
+    sin ocupar un hilo y, cuando le toca, el lugar se le entrega al liberarse.
+    """
+
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.in_use = 0
+        self.waited = 0
+        self.timeouts = 0
+        self._waiting: list[tuple[int, int]] = []
+        self._async: dict[tuple[int, int], tuple] = {}  # lugar en la fila -> (event loop, future)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _hand_over(self):
+        """Con el lock tomado: si el primero de la fila es una corrutina y hay lugar, se lo da."""
+        while self._waiting and self.in_use < self.capacity and self._waiting[0] in self._async:
+            loop, future = self._async.pop(heapq.heappop(self._waiting))
+            self.in_use += 1
+            loop.call_soon_threadsafe(_resolve, future)
+        self._cond.notify_all()
+
+    def acquire(self, priority: int = PRIORITY_NORMAL, timeout: float | None = None) -> bool:
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+            deadline = None if timeout is None else time.monotonic() + timeout
+            if self.in_use >= self.capacity:
+                self.waited += 1
+            while self.in_use >= self.capacity or self._waiting[0] != ticket:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self.timeouts += 1
+                    self._hand_over()
+                    return False
+                self._cond.wait(remaining)
+            heapq.heappop(self._waiting)
+            self.in_use += 1
+            self._hand_over()  # el siguiente de la fila puede tener lugar
+            return True
+
+    async def acquire_async(self, priority: int = PRIORITY_NORMAL, timeout: float | None = None) -> bool:
+        """Como `acquire`, pero espera en el event loop en lugar de bloquear un hilo."""
+        future = asyncio.get_running_loop().create_future()
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+            if self.in_use >= self.capacity:
+                self.waited += 1
+            self._async[ticket] = (asyncio.get_running_loop(), future)
+            self._hand_over()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+            return True
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._cond:
+                granted = ticket not in self._async
+                if not granted:
+                    del self._async[ticket]
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self.timeouts += isinstance(e, asyncio.TimeoutError)
+                    self._hand_over()
+            if granted:
+                self.release()  # el lugar llegó justo al vencer la espera
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return False
+
+    def release(self):
+        with self._cond:
+            self.in_use -= 1
+            self._hand_over()
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_NORMAL, timeout: float | None = None):
+        timeout = config.ENDPOINT_WAIT_TIMEOUT if timeout is None else timeout
+        if not self.acquire(priority, timeout):
+            raise RateLimitExceeded(f"'{self.name}' saturado (esperó {timeout:.0f} s)")
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def slot_async(self, priority: int = PRIORITY_NORMAL, timeout: float | None = None):
+        timeout = config.ENDPOINT_WAIT_TIMEOUT if timeout is None else timeout
+        if not await self.acquire_async(priority, timeout):
+            raise RateLimitExceeded(f"'{self.name}' saturado (esperó {timeout:.0f} s)")
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"in_use": self.in_use, "waiting": len(self._waiting),
+                    "waited": self.waited, "timeouts": self.timeouts}
+
+
+_gates: dict[str, PriorityGate] = {}
+_gates_lock = threading.Lock()
+
+
+def get_gate(name: str) -> PriorityGate:
+    """Límite global de concurrencia por endpoint externo ('groq', 'whisper', 'tts')."""
+    with _gates_lock:
+        gate = _gates.get(name)
+        if gate is None:
+            capacity = {
+                "groq": config.GROQ_MAX_CONCURRENCY,
+                "whisper": config.WHISPER_MAX_CONCURRENCY,
+                "tts": config.TTS_MAX_CONCURRENCY,
+            }.get(name, 4)
+            gate = PriorityGate(name, capacity)
+            _gates[name] = gate
+        return gate
+
+
+def _gate_stat(field: str):
+    def _collect():
+        with _gates_lock:
+            gates = list(_gates.values())
+        return {(gate.name,): gate.stats()[field] for gate in gates}
+    return _collect
+
+
+metrics.gauge("aida_endpoint_in_use", "Llamadas en curso por servicio externo.", ("endpoint",), _gate_stat("in_use"))
+metrics.gauge("aida_endpoint_waiting", "Llamadas esperando lugar por servicio externo.", ("endpoint",),
+              _gate_stat("waiting"))
+
+
+def endpoint_slot(name: str, priority: int = PRIORITY_NORMAL, timeout: float | None = None):
+    """`with endpoint_slot("groq", PRIORITY_HIGH): requests.post(...)`"""
+    return get_gate(name).slot(priority, timeout)
+
+
+def async_endpoint_slot(name: str, priority: int = PRIORITY_NORMAL, timeout: float | None = None):
+    """`async with async_endpoint_slot("groq", PRIORITY_HIGH): await async_http.post(...)`"""
+    return get_gate(name).slot_async(priority, timeout)
@@ -0,0 +1,212 @@
+# aida_bot/resilience.py
+import threading
+import time
+import requests
+from aida_bot import config
+from aida_bot import metrics
+
+# Respuestas locales cuando el servicio de IA no está disponible
+CANNED_REPLIES = {
+    "chat": (
+        "😔 En este momento no puedo conectarme con mi servicio de inteligencia artificial. "
+        "Probá de nuevo en unos minutos. Si es algo urgente, pedile ayuda a alguien de confianza."
+    ),
+    "vision": (
+        "😔 Ahora no puedo analizar imágenes porque mi servicio de inteligencia artificial no responde. "
+        "Si la imagen es un mensaje que te pide datos, claves o pagos, no respondas ni toques los enlaces: "
+        "consultá primero con alguien de confianza o con la empresa por sus canales oficiales."
+    ),
+}
+
+
+class CircuitOpenError(Exception):
+    """El circuito del endpoint está abierto: se falla rápido sin llamar."""
+
+
+def is_server_error(resp) -> bool:
+    """Respuestas que cuentan como falla del endpoint (no del pedido)."""
+    return resp.status_code >= 500 or resp.status_code == 429
+
+
+class CircuitBreaker:
+    """
+    Corta las llamadas a un endpoint que está fallando o respondiendo muy lento.
+
+    * cerrado: las llamadas pasan; se cuentan fallas y respuestas lentas seguidas.
+    * abierto: tras `failure_threshold` fallas (o `slow_threshold` respuestas por encima
+      de `latency_slo`) se falla al instante con CircuitOpenError.
+    * semiabierto: pasado `reset_timeout`, un hilo en segundo plano prueba el endpoint
+      con `probe`; si responde bien y a tiempo, se cierra. Sin `probe`, se deja pasar
+      una sola llamada real como prueba.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, latency_slo: float | None = None, probe=None,
+                 failure_threshold: int | None = None, slow_threshold: int | None = None,
+                 reset_timeout: float | None = None):
+        self.name = name
+        self.latency_slo = latency_slo or config.BREAKER_SLO_CHAT
+        self.probe = probe
+        self.failure_threshold = failure_threshold or config.BREAKER_FAILURE_THRESHOLD
+        self.slow_threshold = slow_threshold or config.BREAKER_SLOW_THRESHOLD
+        self.reset_timeout = reset_timeout or config.BREAKER_RESET_TIMEOUT
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.consecutive_slow = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self.fast_fails = 0
+        self.calls = 0
+        self.failures = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if (self.state == self.OPEN and self.probe is None
+                    and time.monotonic() - self.opened_at >= self.reset_timeout):
+                self.state = self.HALF_OPEN  # esta llamada es la prueba
+                return True
+            self.fast_fails += 1
+            return False
+
+    def record(self, ok: bool, latency: float):
+        metrics.EXTERNAL_SECONDS.observe(latency, service=self.name)
+        with self._lock:
+            self.calls += 1
+            slow = latency > self.latency_slo
+            if ok and not slow:
+                self.consecutive_failures = 0
+                self.consecutive_slow = 0
+                if self.state != self.CLOSED:
+                    self._close()
+                return
+            if not ok:
+                self.failures += 1
+                self.consecutive_failures += 1
+            else:
+                self.consecutive_slow += 1
+            if (self.state == self.HALF_OPEN
+                    or self.consecutive_failures >= self.failure_threshold
+                    or self.consecutive_slow >= self.slow_threshold):
+                self._trip("falló la prueba" if self.state == self.HALF_OPEN else
+                           f"{self.consecutive_failures} fallas / {self.consecutive_slow} lentas seguidas")
+
+    def _close(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.consecutive_slow = 0
+        print(f"✅ [CIRCUITO] '{self.name}' cerrado: el servicio respondió bien.")
+
+    def _trip(self, reason: str):
+        if self.state != self.OPEN:
+            self.trips += 1
+            print(f"⚠️ [CIRCUITO] '{self.name}' abierto ({reason}). Se usan respuestas locales.")
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        if self.probe is not None and not self._probing:
+            self._probing = True
+            threading.Thread(target=self._probe_loop, daemon=True, name=f"aida-probe-{self.name}").start()
+
+    def _probe_loop(self):
+        """Prueba el endpoint en segundo plano hasta que vuelva a responder bien."""
+        while True:
+            time.sleep(self.reset_timeout)
+            with self._lock:
+                if self.state == self.CLOSED:  # una llamada real ya lo cerró
+                    self._probing = False
+                    return
+                self.state = self.HALF_OPEN
+            start = time.perf_counter()
+            try:
+                ok = bool(self.probe())
+            except Exception:
+                ok = False
+            latency = time.perf_counter() - start
+            with self._lock:
+                if self.state == self.CLOSED:  # se cerró mientras corría la prueba: no se reabre
+                    self._probing = False
+                    return
+                if ok and latency <= self.latency_slo:
+                    self._probing = False
+                    self._close()
+                    return
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def call(self, fn, *args, is_failure=None, **kwargs):
+        """Ejecuta `fn` si el circuito lo permite y registra el resultado y la latencia."""
+        if not self.allow():
+            raise CircuitOpenError(f"'{self.name}' no disponible")
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record(False, time.perf_counter() - start)
+            raise
+        self.record(not (is_failure and is_failure(result)), time.perf_counter() - start)
+        return result
+
+    async def call_async(self, fn, *args, is_failure=None, **kwargs):
+        """Como `call`, para funciones asíncronas."""
+        if not self.allow():
+            raise CircuitOpenError(f"'{self.name}' no disponible")
+        start = time.perf_counter()
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception:
+            self.record(False, time.perf_counter() - start)
+            raise
+        self.record(not (is_failure and is_failure(result)), time.perf_counter() - start)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "trips": self.trips,
+                "fast_fails": self.fast_fails,
+                "calls": self.calls,
+                "failures": self.failures,
+            }
+
+
+def groq_probe(api_url: str, api_key: str, model: str):
+    """Prueba liviana (sin gastar tokens): consulta el modelo en /models."""
+    models_url = api_url.rsplit("/chat/completions", 1)[0] + f"/models/{model}"
+
+    def _probe() -> bool:
+        resp = requests.get(models_url, headers={"Authorization": f"Bearer {api_key}"}, timeout=5)
+        return resp.status_code == 200
+    return _probe
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, latency_slo: float | None = None, probe=None) -> CircuitBreaker:
+    """Un circuito por endpoint (ej: 'groq:llama-3.1-8b-instant'), compartido por todos los servicios."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, latency_slo=latency_slo, probe=probe)
+            _breakers[name] = breaker
+        return breaker
+
+
+def breaker_stats() -> dict:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
+
+
+_STATE_VALUES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+metrics.gauge("aida_breaker_state", "Estado del circuito (0 cerrado, 1 semiabierto, 2 abierto).", ("breaker",),
+              lambda: {(name,): _STATE_VALUES[s["state"]] for name, s in breaker_stats().items()})
+metrics.gauge("aida_breaker_fast_fails", "Llamadas cortadas por circuito abierto (acumulado).", ("breaker",),
+              lambda: {(name,): s["fast_fails"] for name, s in breaker_stats().items()})
@@ -0,0 +1,58 @@
+# aida_bot/services/async_http.py
+import asyncio
+import json as jsonlib
+import aiohttp
+import requests
+from .. import config
+
+
+class AsyncResponse:
+    """Respuesta mínima con la misma forma que `requests.Response` (status_code, text, json())."""
+
+    def __init__(self, status_code: int, text: str):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return jsonlib.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code}: {self.text}")
+
+
+_sessions: dict = {}  # event loop -> ClientSession
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """Sesión HTTP compartida (un pool de conexiones por event loop)."""
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(limit=config.ASYNC_HTTP_POOL_SIZE)
+        session = aiohttp.ClientSession(connector=connector)
+        _sessions[loop] = session
+    return session
+
+
+async def post(url: str, headers: dict | None = None, json: dict | None = None, timeout: float = 20) -> AsyncResponse:
+    """
+    POST asíncrono. Los errores de red se convierten en excepciones de `requests`
+    para que los servicios puedan manejarlos igual que en modo síncrono.
+    """
+    session = await get_session()
+    try:
+        async with session.post(url, headers=headers, json=json,
+                                timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+            return AsyncResponse(resp.status, await resp.text())
+    except asyncio.TimeoutError as e:
+        raise requests.exceptions.Timeout(f"Timeout después de {timeout}s") from e
+    except aiohttp.ClientError as e:
+        raise requests.exceptions.ConnectionError(str(e)) from e
+
+
+async def close_sessions():
+    for session in list(_sessions.values()):
+        if not session.closed:
+            await session.close()
+    _sessions.clear()
@@ -2,6 +2,7 @@
 import requests
 from datetime import datetime
 from .. import config
+from . import async_http
 
 
 class EmailService:
@@ -16,16 +17,8 @@ class EmailService:
         if not self.webhook_url:
             print("⚠️ ADVERTENCIA: No se ha configurado MAKE_WEBHOOK_URL en el archivo .env.")
 
-    def send_alert(self, email_destino: str, user_id: int, motivo: str, profile_data: dict | None = None):
-        """
-        Envía una alerta a través de un webhook de Make.com.
-        """
-        if not self.webhook_url:
-            print("⚠️ No se puede enviar la alerta: falta MAKE_WEBHOOK_URL.")
-            return
-        
-
-        payload = {
+    def _build_payload(self, email_destino: str, user_id: int, motivo: str, profile_data: dict | None = None) -> dict:
+        return {
             "email_destino": email_destino,
             "user_id": str(user_id),
             "motivo": motivo,
@@ -34,7 +27,15 @@ class EmailService:
             "nombre_apellido": (profile_data.get("nombre_apellido") if profile_data else "No proporcionado")
         }
 
-    
+    def send_alert(self, email_destino: str, user_id: int, motivo: str, profile_data: dict | None = None):
+        """
+        Envía una alerta a través de un webhook de Make.com.
+        """
+        if not self.webhook_url:
+            print("⚠️ No se puede enviar la alerta: falta MAKE_WEBHOOK_URL.")
+            return
+
+        payload = self._build_payload(email_destino, user_id, motivo, profile_data)
 
         try:
             response = requests.post(self.webhook_url, json=payload, timeout=10)
@@ -42,3 +43,18 @@ class EmailService:
             print(f"✅ Alerta enviada correctamente a {email_destino}. Payload: {payload}")
         except requests.exceptions.RequestException as e:
             print(f"❌ Error enviando alerta a Make: {e}")
+
+    async def send_alert_async(self, email_destino: str, user_id: int, motivo: str, profile_data: dict | None = None):
+        """Versión asíncrona de `send_alert`."""
+        if not self.webhook_url:
+            print("⚠️ No se puede enviar la alerta: falta MAKE_WEBHOOK_URL.")
+            return
+
+        payload = self._build_payload(email_destino, user_id, motivo, profile_data)
+
+        try:
+            response = await async_http.post(self.webhook_url, json=payload, timeout=10)
+            response.raise_for_status()
+            print(f"✅ Alerta enviada correctamente a {email_destino}. Payload: {payload}")
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Error enviando alerta a Make: {e}")
@@ -0,0 +1,178 @@
+# aida_bot/services/image_cache.py
+import io
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from PIL import Image
+from .. import config
+
+PHISHING_WARNING = (
+    "⚠️ Esta imagen ya la vimos antes y corresponde a un intento de fraude o phishing. "
+    "No hagas clic en los enlaces ni ingreses tus datos personales. Si tenés dudas, "
+    "contactá directamente al banco o empresa desde su página oficial."
+)
+
+
+def perceptual_hash(image_bytes: bytes, hash_size: int = 8) -> int | None:
+    """
+    Calcula un dHash (hash de diferencias) de la imagen.
+    Imágenes casi iguales (re-comprimidas, recortadas levemente) dan hashes cercanos.
+    """
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            small = img.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+            pixels = list(small.getdata())
+    except Exception as e:
+        print(f"[ERROR Hash Imagen] {e}")
+        return None
+
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def normalize_caption(caption: str | None) -> str:
+    if not caption:
+        return ""
+    return " ".join(re.sub(r'[^\w\s]', '', caption).lower().split())
+
+
+class ImageAnalysisCache:
+    """
+    Caché de descripciones de imágenes indexada por hash perceptual + pie de foto.
+    Devuelve la descripción previa si llega una imagen casi idéntica
+    (distancia de Hamming <= max_distance), con límite LRU y vencimiento (TTL).
+
+    Las imágenes de phishing conocidas se responden al instante con una distancia
+    mucho más estricta (VISION_PHISHING_MAX_DISTANCE): dos capturas de SMS distintas
+    suelen tener hashes parecidos. Hay dos listas:
+      * la curada, incluida en el paquete (features/phishing_images.json), solo lectura;
+      * la aprendida en ejecución (VISION_PHISHING_PATH, fuera del código), que vence
+        a los VISION_PHISHING_TTL segundos y solo vale para el mismo pie de foto.
+    """
+
+    def __init__(self, max_size: int = None, ttl_seconds: int = None, max_distance: int = None,
+                 phishing_path: str | None = None, learned_path: str | None = None,
+                 phishing_distance: int | None = None, phishing_ttl: int | None = None):
+        self.max_size = max_size or config.VISION_CACHE_SIZE
+        self.ttl_seconds = ttl_seconds or config.VISION_CACHE_TTL
+        self.max_distance = config.VISION_CACHE_MAX_DISTANCE if max_distance is None else max_distance
+        self.phishing_distance = (config.VISION_PHISHING_MAX_DISTANCE if phishing_distance is None
+                                  else phishing_distance)
+        self.phishing_ttl = phishing_ttl or config.VISION_PHISHING_TTL
+        self.entries = OrderedDict()  # (hash, caption) -> {"description": str, "ts": float}
+        self.saved_calls = 0
+        self._lock = threading.Lock()
+
+        if phishing_path is None:
+            current_dir = os.path.dirname(__file__)
+            phishing_path = os.path.join(current_dir, '..', 'features', 'phishing_images.json')
+        self.phishing_path = phishing_path
+        self.learned_path = config.VISION_PHISHING_PATH if learned_path is None else learned_path
+        self.known_phishing = {h: item["description"] for h, item in self._load_phishing(self.phishing_path).items()}
+        # (hash, pie de foto) -> {"description": str, "ts": float}
+        self.learned_phishing = {(h, item.get("caption", "")): item
+                                 for h, item in self._load_phishing(self.learned_path).items()}
+
+    def _load_phishing(self, path: str) -> dict[int, dict]:
+        """Carga una lista de hashes de imágenes de phishing."""
+        if not path:
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {int(item["hash"], 16): {**item, "description": item.get("description") or PHISHING_WARNING}
+                    for item in data.get("imagenes_phishing", [])}
+        except FileNotFoundError:
+            return {}
+        except (json.JSONDecodeError, KeyError, ValueError) as e:
+            print(f"⚠️ Error: El archivo '{path}' no es válido ({e}).")
+            return {}
+
+    def _save_learned(self):
+        if not self.learned_path:
+            return
+        data = {"imagenes_phishing": [
+            {"hash": f"{h:016x}", "caption": caption, "description": item["description"], "ts": item["ts"]}
+            for (h, caption), item in self.learned_phishing.items()
+        ]}
+        directory = os.path.dirname(os.path.abspath(self.learned_path))
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.learned_path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.learned_path)
+
+    def _match_phishing(self, image_hash: int, caption_key: str, now: float) -> str | None:
+        for known_hash, description in self.known_phishing.items():
+            if hamming_distance(image_hash, known_hash) <= self.phishing_distance:
+                return description
+        for (known_hash, caption), item in list(self.learned_phishing.items()):
+            if now - item["ts"] > self.phishing_ttl:
+                del self.learned_phishing[(known_hash, caption)]
+            elif caption == caption_key and hamming_distance(image_hash, known_hash) <= self.phishing_distance:
+                return item["description"]
+        return None
+
+    def get(self, image_hash: int, caption: str | None = None) -> str | None:
+        """Busca una descripción previa para una imagen casi idéntica."""
+        caption_key = normalize_caption(caption)
+        now = time.time()
+        with self._lock:
+            phishing = self._match_phishing(image_hash, caption_key, now)
+            if phishing:
+                self.saved_calls += 1
+                return phishing
+
+            # Limpieza de entradas vencidas (las más viejas están al principio)
+            for key in list(self.entries):
+                if now - self.entries[key]["ts"] > self.ttl_seconds:
+                    del self.entries[key]
+
+            key = (image_hash, caption_key)
+            if key not in self.entries:
+                key = next((k for k in reversed(self.entries)
+                            if k[1] == caption_key and hamming_distance(k[0], image_hash) <= self.max_distance),
+                           None)
+            if key is None:
+                return None
+
+            self.entries.move_to_end(key)
+            self.saved_calls += 1
+            return self.entries[key]["description"]
+
+    def put(self, image_hash: int, caption: str | None, description: str):
+        key = (image_hash, normalize_caption(caption))
+        with self._lock:
+            self.entries[key] = {"description": description, "ts": time.time()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def mark_phishing(self, image_hash: int, caption: str | None = None, description: str | None = None):
+        """Registra una imagen (con ese pie de foto) como phishing para responderla al instante."""
+        key = (image_hash, normalize_caption(caption))
+        with self._lock:
+            self.learned_phishing[key] = {"description": description or PHISHING_WARNING, "ts": time.time()}
+            try:
+                self._save_learned()
+            except OSError as e:
+                print(f"⚠️ No se pudo guardar la lista de phishing: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "known_phishing": len(self.known_phishing) + len(self.learned_phishing),
+            "saved_calls": self.saved_calls,
+        }
@@ -0,0 +1,89 @@
+# aida_bot/services/image_preprocessing.py
+import io
+from PIL import Image, ImageOps
+from .. import config
+
+# Firmas ("magic numbers") de los formatos más comunes que llegan por Telegram
+_MAGIC_NUMBERS = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+
+def detect_mime_type(image_bytes: bytes, default: str = "image/jpeg") -> str:
+    """Detecta el tipo MIME real de la imagen mirando sus primeros bytes."""
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mime in _MAGIC_NUMBERS:
+        if image_bytes.startswith(signature):
+            return mime
+    return default
+
+
+def select_photo_size(photo_sizes, max_side: int):
+    """
+    Elige la variante más chica de `msg.photo` que alcance la resolución
+    que usa el modelo de visión. Si ninguna llega, devuelve la más grande.
+    """
+    if not photo_sizes:
+        return None
+    ordered = sorted(photo_sizes, key=lambda p: max(p.width, p.height))
+    for photo in ordered:
+        if max(photo.width, photo.height) >= max_side:
+            return photo
+    return ordered[-1]
+
+
+class ImagePreprocessor:
+    """
+    Reduce las imágenes a la resolución que realmente aprovecha el modelo
+    de visión y las re-codifica (JPEG o WebP) para achicar el payload.
+    """
+
+    _FORMATS = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+    def __init__(self, max_side: int = None, quality: int = None, output_format: str = None):
+        self.max_side = max_side or config.VISION_MAX_SIDE
+        self.quality = quality or config.VISION_IMAGE_QUALITY
+        self.output_format = (output_format or config.VISION_IMAGE_FORMAT).upper()
+        if self.output_format not in self._FORMATS:
+            print(f"⚠️ Formato de imagen '{self.output_format}' no soportado, se usará JPEG.")
+            self.output_format = "JPEG"
+
+    def process(self, image_bytes: bytes) -> tuple[bytes, str]:
+        """
+        Devuelve (bytes, mime_type) listos para enviar al modelo.
+        Si algo falla, devuelve la imagen original con su tipo MIME real.
+        """
+        original_mime = detect_mime_type(image_bytes)
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as img:
+                img = ImageOps.exif_transpose(img)
+                resized = max(img.size) > self.max_side
+                if resized:
+                    img.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+
+                # JPEG no soporta transparencia: se aplana sobre fondo blanco
+                if img.mode in ("RGBA", "LA", "P"):
+                    img = img.convert("RGBA")
+                    background = Image.new("RGB", img.size, (255, 255, 255))
+                    background.paste(img, mask=img.split()[-1])
+                    img = background
+                elif img.mode != "RGB":
+                    img = img.convert("RGB")
+
+                buffer = io.BytesIO()
+                img.save(buffer, format=self.output_format, quality=self.quality, optimize=True)
+                processed = buffer.getvalue()
+        except Exception as e:
+            print(f"[ERROR Preprocesado] No se pudo procesar la imagen: {e}")
+            return image_bytes, original_mime
+
+        # Si no hubo que achicarla y la re-codificación no ayudó, mandamos la original
+        if not resized and len(processed) >= len(image_bytes):
+            return image_bytes, original_mime
+
+        return processed, self._FORMATS[self.output_format]
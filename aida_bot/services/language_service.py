@@ -0,0 +1,153 @@
+# aida_bot/services/language_service.py
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from .. import config
+from ..cache import LRUCache
+
+
+class NgramLanguageModel:
+    """
+    Modelo compacto de n-gramas de caracteres (1 a 3) para identificar idioma.
+    Se entrena una sola vez con `storage/lang_corpus.json` y es determinista.
+    Japonés y chino se reconocen directamente por el alfabeto.
+    """
+
+    def __init__(self, corpus_path: str | None = None, max_order: int = 3, top_k: int = 1500):
+        if corpus_path is None:
+            current_dir = os.path.dirname(__file__)
+            corpus_path = os.path.join(current_dir, '..', 'storage', 'lang_corpus.json')
+        self.max_order = max_order
+        self.top_k = top_k
+        self.log_probs = {}    # idioma -> {ngrama: log P}
+        self.unseen_log_prob = {}  # idioma -> log P de un n-grama no visto
+        self._train(corpus_path)
+
+    @staticmethod
+    def _clean(text: str) -> str:
+        text = re.sub(r"[\W\d_]+", " ", text.lower())
+        return f" {' '.join(text.split())} "
+
+    def _ngrams(self, text: str) -> list[str]:
+        cleaned = self._clean(text)
+        grams = []
+        for n in range(1, self.max_order + 1):
+            grams.extend(cleaned[i:i + n] for i in range(len(cleaned) - n + 1))
+        return [g for g in grams if g.strip()]
+
+    def _train(self, corpus_path: str):
+        with open(corpus_path, 'r', encoding='utf-8') as f:
+            corpus = json.load(f)
+        for lang, sentences in corpus.items():
+            counts = Counter()
+            for sentence in sentences:
+                counts.update(self._ngrams(sentence))
+            # Nos quedamos solo con los n-gramas más frecuentes (modelo compacto)
+            top = dict(counts.most_common(self.top_k))
+            total = sum(top.values()) + len(top)
+            self.log_probs[lang] = {g: math.log((c + 1) / total) for g, c in top.items()}
+            self.unseen_log_prob[lang] = math.log(1 / total)
+
+    def predict(self, text: str) -> tuple[str | None, float]:
+        """Devuelve (idioma, confianza entre 0 y 1)."""
+        if re.search(r'[\u3040-\u30ff]', text):
+            return "ja", 0.99  # hiragana / katakana
+        if re.search(r'[\u4e00-\u9fff]', text):
+            return "zh", 0.95  # ideogramas sin kana
+
+        grams = self._ngrams(text)
+        if not grams or not self.log_probs:
+            return None, 0.0
+
+        scores = {}
+        for lang, table in self.log_probs.items():
+            unseen = self.unseen_log_prob[lang]
+            scores[lang] = sum(table.get(g, unseen) for g in grams)
+
+        # Softmax sobre el promedio por n-grama: la confianza no se dispara con textos largos
+        averaged = {lang: 40 * score / len(grams) for lang, score in scores.items()}
+        best = max(averaged.values())
+        exp_scores = {lang: math.exp(s - best) for lang, s in averaged.items()}
+        total = sum(exp_scores.values())
+        lang = max(exp_scores, key=exp_scores.get)
+        return lang, exp_scores[lang] / total
+
+
+class LangdetectBackend:
+    """Motor original basado en langdetect (más lento y menos estable en textos cortos)."""
+
+    def __init__(self):
+        from langdetect import DetectorFactory, detect_langs
+        # langdetect es aleatorio por defecto: fijamos la semilla
+        DetectorFactory.seed = 0
+        self._detect_langs = detect_langs
+
+    def predict(self, text: str) -> tuple[str | None, float]:
+        try:
+            best = self._detect_langs(text)[0]
+            return best.lang, best.prob
+        except Exception:
+            return None, 0.0
+
+
+def build_backend(name: str):
+    """Crea el motor de identificación de idioma ('ngram' o 'langdetect')."""
+    if name == "langdetect":
+        return LangdetectBackend()
+    if name != "ngram":
+        print(f"⚠️ Motor de idioma '{name}' desconocido, se usará 'ngram'.")
+    return NgramLanguageModel()
+
+
+class LanguageDetector:
+    """
+    Detector de idioma compartido por Translator y SpeechService.
+    Memoiza los resultados y, si el texto es muy corto o la confianza es baja,
+    devuelve el idioma por defecto que indique quien llama (ej: el del usuario).
+    """
+
+    def __init__(self, backend=None, cache_size: int = 2048, min_chars: int = None, min_confidence: float = None):
+        self.backend = backend or build_backend(config.LANGID_BACKEND)
+        self.min_chars = config.LANGID_MIN_CHARS if min_chars is None else min_chars
+        self.min_confidence = config.LANGID_MIN_CONFIDENCE if min_confidence is None else min_confidence
+        self.cache = LRUCache(max_size=cache_size)
+
+    def detect_with_confidence(self, text: str) -> tuple[str | None, float]:
+        collapsed = " ".join(text.split()) if text else ""
+        if not collapsed:
+            return None, 0.0
+
+        key = collapsed.lower()
+        cached = self.cache.get(key)
+        if cached:
+            return tuple(cached)
+
+        result = self.backend.predict(collapsed)
+        self.cache.put(key, result)
+        return result
+
+    def detect(self, text: str, default: str | None = "es") -> str | None:
+        letters = len(re.sub(r"[\W\d_]", "", text or ""))
+        if letters < self.min_chars and not re.search(r'[\u3040-\u30ff\u4e00-\u9fff]', text or ""):
+            return default  # texto demasiado corto para decidir
+
+        lang, confidence = self.detect_with_confidence(text)
+        if lang is None or confidence < self.min_confidence:
+            return default
+        return lang
+
+
+_shared_detector = None
+_shared_lock = threading.Lock()
+
+
+def get_language_detector() -> LanguageDetector:
+    """Devuelve la instancia única del detector (el modelo se carga una sola vez)."""
+    global _shared_detector
+    with _shared_lock:
+        if _shared_detector is None:
+            _shared_detector = LanguageDetector()
+        return _shared_detector
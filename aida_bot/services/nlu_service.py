@@ -1,25 +1,80 @@
 # aida_bot/services/nlu_service.py
 import requests
 import json
+import asyncio
+import hashlib
+import re
+import unicodedata
 from .. import config
+from ..cache import LRUCache, TieredCache, make_key
 from .speech_service import SpeechService
+from . import async_http
+from ..rate_limit import (BUSY_REPLY, PRIORITY_HIGH, PRIORITY_NORMAL, RateLimitExceeded, async_endpoint_slot,
+                          endpoint_slot)
+from ..metrics import ANSWERS, watch_cache
+from ..resilience import CANNED_REPLIES, CircuitOpenError, get_breaker, groq_probe, is_server_error
 from pathlib import Path
-from aida_bot.memory import ensure_profile, save_turn, build_llm_context
+from aida_bot.memory import PROFILE_PROMPT_FIELDS, ensure_profile, save_turn, build_llm_context, build_llm_messages
+
+# Mensajes que solo tienen sentido mirando la conversación anterior:
+# no se responden desde la caché.
+_HISTORY_DEPENDENT = re.compile(
+    r"^(y|pero|entonces|o sea|osea)\b|\b(eso|esto|esa|ese|aquello|lo anterior|lo que (me )?dijiste|"
+    r"otra vez|de nuevo|repet\w*|no entend\w*|segu[ií]|sigamos|continu[aá]|continuemos|"
+    r"y (despu[eé]s|luego)|(el|lo) siguiente|el (primero|segundo|tercero)|el paso \d+|m[aá]s despacio)\b"
+)
+
+
+def _normalize_message(text: str) -> str:
+    """Minúsculas, sin signos ni tildes: "¿Cómo mando un audio?" == "como mando un audio"."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r'[^\w\s]', '', text).lower().split())
 
 
 class NLUService:
     """Procesamiento del lenguaje natural (respuestas inteligentes)."""
     
-    def __init__(self, api_key, api_url, model=None, storage=None):
+    def __init__(self, api_key, api_url, model=None, storage=None, dataset_path=None, response_cache_path=None,
+                 metrics_prefix: str = ""):
         self.api_key = api_key
         self.api_url = api_url
         self.model = model or config.NLU_MODEL
         self.storage = storage
         self.classifier_model = config.INTENT_MODEL
+        # "messages": system fijo + historial como mensajes user/assistant (reutiliza prefijos)
+        # "flat": formato anterior, todo el contexto en un solo mensaje de usuario
+        self.chat_format = config.LLM_CHAT_FORMAT
+
+        # --- CIRCUITOS (fallar rápido si Groq no responde) ---
+        self.intent_breaker = get_breaker(f"groq:{self.classifier_model}", config.BREAKER_SLO_INTENT,
+                                          groq_probe(api_url, api_key, self.classifier_model))
+        self.chat_breaker = get_breaker(f"groq:{self.model}", config.BREAKER_SLO_CHAT,
+                                        groq_probe(api_url, api_key, self.model))
+        # Función texto -> respuesta local (ej: búsqueda en las FAQ); la asigna el bot
+        self.fallback_responder = None
+
+        # --- CACHÉS DE RESPUESTAS E INTENCIONES ---
+        # `response_cache_path`: archivo propio de cada bot en modo multi-tenant
+        response_cache_path = config.RESPONSE_CACHE_PATH if response_cache_path is None else response_cache_path
+        disk_tier = None
+        if response_cache_path:
+            disk_tier = LRUCache(max_size=config.RESPONSE_CACHE_DISK_SIZE,
+                                 ttl_seconds=config.RESPONSE_CACHE_TTL,
+                                 persist_path=response_cache_path)
+        self.response_cache = TieredCache(
+            LRUCache(max_size=config.RESPONSE_CACHE_SIZE, ttl_seconds=config.RESPONSE_CACHE_TTL),
+            disk_tier
+        )
+        self.intent_cache = LRUCache(max_size=config.RESPONSE_CACHE_SIZE, ttl_seconds=config.RESPONSE_CACHE_TTL)
+        # `metrics_prefix`: nombre del bot en modo multi-tenant, para no pisar las cachés de los otros
+        watch_cache(f"{metrics_prefix}response_memory", self.response_cache.memory)
+        watch_cache(f"{metrics_prefix}response_disk", self.response_cache.disk)
+        watch_cache(f"{metrics_prefix}intent", self.intent_cache)
 
         # --- PROMPT DE CONVERSACIÓN ---
         current_dir = Path(__file__).parent.parent
-        ruta_dataset = current_dir / "storage" / "dataset.json"
+        ruta_dataset = dataset_path or current_dir / "storage" / "dataset.json"
 
         with open(ruta_dataset, 'r', encoding='utf-8') as f:
             dataset = json.load(f)
@@ -155,14 +210,30 @@ Usuario: "¡¡No puedo hacer esto!! ¡¡Qué bronca!!"
 }}
 """
 
-    def detect_intent(self, user_text: str) -> dict:
-        """
-        Usa un modelo para clasificar las intenciones del usuario.
-        """
-        headers = {
+        # Si cambia el prompt o el modelo, las respuestas guardadas dejan de valer
+        self.prompt_hash = hashlib.sha256(f"{self.model}\n{self.system_prompt}".encode("utf-8")).hexdigest()[:16]
+        self.intent_prompt_hash = hashlib.sha256(
+            f"{self.classifier_model}\n{self.intent_system_prompt}".encode("utf-8")
+        ).hexdigest()[:16]
+
+    def _response_cache_key(self, user_text: str, profile: dict) -> str | None:
+        """Clave de caché para una respuesta, o None si el mensaje depende del historial."""
+        normalized = _normalize_message(user_text)
+        if not normalized or _HISTORY_DEPENDENT.search(normalized):
+            return None
+        # Todo lo del perfil que va al prompt, incluido el nombre: una respuesta
+        # con "¡Hola María!" no se le puede servir a otro usuario
+        facts = [profile.get(k) for k in PROFILE_PROMPT_FIELDS]
+        return make_key(normalized, *facts, self.prompt_hash)
+
+    def _headers(self) -> dict:
+        return {
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
         }
+
+    def _intent_request(self, user_text: str) -> tuple[str, dict, dict]:
+        """Devuelve (clave de caché, payload, respuesta por defecto) para clasificar un mensaje."""
         data = {
             "model": self.classifier_model,
             "messages": [
@@ -182,66 +253,196 @@ Usuario: "¡¡No puedo hacer esto!! ¡¡Qué bronca!!"
             "analysis_required": {"sentiment": False}
         }
 
-        try:
-            resp = requests.post(self.api_url, headers=headers, json=data, timeout=15)
-            if resp.status_code == 200:
-                intent_data = json.loads(resp.json()['choices'][0]['message']['content'])
-                # Validamos que la estructura básica exista
-                if "has_chat_intent" not in intent_data or "configuration" not in intent_data:
-                    return default_response
-                return intent_data
-            else:
-                print(f"[ERROR Intención] Código {resp.status_code}: {resp.text}")
+        cache_key = make_key(user_text.strip(), self.intent_prompt_hash)
+        return cache_key, data, default_response
+
+    def _parse_intent(self, resp, cache_key: str, default_response: dict) -> dict:
+        if resp.status_code == 200:
+            intent_data = json.loads(resp.json()['choices'][0]['message']['content'])
+            # Validamos que la estructura básica exista
+            if "has_chat_intent" not in intent_data or "configuration" not in intent_data:
                 return default_response
+            self.intent_cache.put(cache_key, json.dumps(intent_data, ensure_ascii=False))
+            return intent_data
+        else:
+            print(f"[ERROR Intención] Código {resp.status_code}: {resp.text}")
+            return default_response
+
+    def detect_intent(self, user_text: str) -> dict:
+        """
+        Usa un modelo para clasificar las intenciones del usuario.
+        """
+        cache_key, data, default_response = self._intent_request(user_text)
+        cached = self.intent_cache.get(cache_key)
+        if cached:
+            return json.loads(cached)  # copia nueva: quien llama puede modificarla
+
+        try:
+            # La intención va primero en la fila de Groq: de ella dependen los cambios de configuración
+            with endpoint_slot("groq", PRIORITY_HIGH):
+                resp = self.intent_breaker.call(requests.post, self.api_url, headers=self._headers(), json=data,
+                                                timeout=15, is_failure=is_server_error)
+            return self._parse_intent(resp, cache_key, default_response)
+        except CircuitOpenError:
+            return default_response
+        except Exception as e:
+            print(f"[ERROR Intención] {e}")
+            return default_response
+
+    async def detect_intent_async(self, user_text: str) -> dict:
+        """Versión asíncrona de `detect_intent`."""
+        cache_key, data, default_response = self._intent_request(user_text)
+        cached = self.intent_cache.get(cache_key)
+        if cached:
+            return json.loads(cached)
+
+        try:
+            async with async_endpoint_slot("groq", PRIORITY_HIGH):
+                resp = await self.intent_breaker.call_async(async_http.post, self.api_url, headers=self._headers(),
+                                                            json=data, timeout=15, is_failure=is_server_error)
+            return self._parse_intent(resp, cache_key, default_response)
+        except CircuitOpenError:
+            return default_response
         except Exception as e:
             print(f"[ERROR Intención] {e}")
             return default_response
 
-    def get_response(self, user_text: str, user_id: int = None, user_name: str = None) -> str:
+    def build_messages(self, user_text: str, user_id: int = None) -> list[dict]:
         """
-        Genera una respuesta de chat normal con memoria (Firebase).
-        Guarda el historial del usuario y usa su contexto.
+        Arma los mensajes para el modelo de chat según `self.chat_format`.
+        Se llama antes de guardar `user_text` en el historial.
         """
-        try:
-            # 1️⃣ Asegurar que el perfil del usuario esté en Firebase
-            if user_id and user_name:
-                ensure_profile(user_id, display_name=user_name)
+        if not user_id:
+            return [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": user_text}
+            ]
 
-            # 2️⃣ Guardar el mensaje del usuario en el historial
+        if self.chat_format == "flat":
+            # Formato anterior: contexto + mensaje nuevo aplanados en un solo texto
+            contexto = build_llm_context(user_id, storage=self.storage)
+            prompt = f"{contexto}\n\nNueva entrada del usuario:\n{user_text}"
+            return [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": prompt}
+            ]
+
+        return build_llm_messages(user_id, self.system_prompt, user_text, storage=self.storage)
+
+    def _cached_response(self, user_text: str, user_id: int = None, user_name: str = None) -> tuple[str | None, str | None]:
+        """
+        Perfil y caché antes de llamar al modelo.
+        Devuelve (respuesta_cacheada, clave_de_caché).
+        """
+        # 1️⃣ Asegurar que el perfil del usuario esté en Firebase
+        profile = {}
+        if user_id and user_name:
+            profile = ensure_profile(user_id, display_name=user_name, storage=self.storage)
+        elif user_id and self.storage:
+            profile = self.storage.get_profile(user_id) or {}
+
+        # Preguntas repetidas con el mismo perfil: respuesta desde caché
+        cache_key = self._response_cache_key(user_text, profile)
+        cached = self.response_cache.get(cache_key) if cache_key else None
+        if cached:
+            ANSWERS.inc(source="cache")
             if user_id:
-                save_turn(user_id, role="user", text=user_text, cap=12)
+                save_turn(user_id, role="user", text=user_text, cap=12, storage=self.storage)
+                save_turn(user_id, role="assistant", text=cached, cap=12, storage=self.storage)
+        return cached, cache_key
+
+    def _request_payload(self, user_text: str, user_id: int = None) -> dict:
+        """Conversación para el modelo; guarda el mensaje del usuario en el historial."""
+        # 2️⃣ Crear la conversación (perfil + últimos mensajes + mensaje nuevo)
+        messages = self.build_messages(user_text, user_id)
+
+        # 3️⃣ Guardar el mensaje del usuario en el historial
+        if user_id:
+            save_turn(user_id, role="user", text=user_text, cap=12, storage=self.storage)
+
+        return {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": 150
+        }
 
-            # 3️⃣ Crear el contexto (perfil + últimos mensajes)
-            contexto = ""
+    def _fallback_response(self, user_text: str, user_id: int = None) -> str:
+        """Respuesta local cuando Groq no está disponible: FAQ parecida o mensaje fijo."""
+        respuesta = None
+        if self.fallback_responder:
+            try:
+                respuesta = self.fallback_responder(user_text)
+            except Exception as e:
+                print(f"[ERROR Respaldo] {e}")
+        respuesta = respuesta or CANNED_REPLIES["chat"]
+        ANSWERS.inc(source="fallback")
+        if user_id:
+            save_turn(user_id, role="assistant", text=respuesta, cap=12, storage=self.storage)
+        return respuesta
+
+    def _finish_response(self, resp, user_id: int = None, cache_key: str | None = None, user_text: str = "") -> str:
+        if is_server_error(resp):
+            print(f"[ERROR IA {resp.status_code}] Se usa la respuesta local.")
+            return self._fallback_response(user_text, user_id)
+        if resp.status_code == 200:
+            respuesta = resp.json()['choices'][0]['message']['content'].strip()
+            ANSWERS.inc(source="llm")
+
+            # 4️⃣ Guardar la respuesta del asistente
             if user_id:
-                contexto = build_llm_context(user_id)
+                save_turn(user_id, role="assistant", text=respuesta, cap=12, storage=self.storage)
+            if cache_key:
+                self.response_cache.put(cache_key, respuesta)
 
-            # 4️⃣ Combinar el contexto con el mensaje nuevo
-            prompt = f"{contexto}\n\nNueva entrada del usuario:\n{user_text}"
+            return respuesta
+        else:
+            return f"[Error IA {resp.status_code}] No pude generar una respuesta."
+
+    def get_response(self, user_text: str, user_id: int = None, user_name: str = None, admit=None) -> str | None:
+        """
+        Genera una respuesta de chat normal con memoria (Firebase).
+        Guarda el historial del usuario y usa su contexto.
+        `admit()` se llama solo si hay que ir a Groq (no con respuestas de la caché):
+        si devuelve False no se llama al modelo y se devuelve None (ej: límite de chat).
+        """
+        try:
+            cached, cache_key = self._cached_response(user_text, user_id, user_name)
+            if cached:
+                return cached
+            if admit and not admit():
+                return None
+            data = self._request_payload(user_text, user_id)
+
+            with endpoint_slot("groq", PRIORITY_NORMAL):
+                resp = self.chat_breaker.call(requests.post, self.api_url, headers=self._headers(), json=data,
+                                              timeout=20, is_failure=is_server_error)
+            return self._finish_response(resp, user_id, cache_key, user_text)
+        except RateLimitExceeded:
+            return BUSY_REPLY
+        except (CircuitOpenError, requests.exceptions.RequestException) as e:
+            print(f"[ERROR Conexión Groq] {e}. Se usa la respuesta local.")
+            return self._fallback_response(user_text, user_id)
+
+    async def get_response_async(self, user_text: str, user_id: int = None, user_name: str = None,
+                                 admit=None) -> str | None:
+        """
+        Versión asíncrona de `get_response` (`admit` devuelve una corrutina). El acceso
+        al almacenamiento (bloqueante) corre en un hilo aparte.
+        """
+        try:
+            cached, cache_key = await asyncio.to_thread(self._cached_response, user_text, user_id, user_name)
+            if cached:
+                return cached
+            if admit and not await admit():
+                return None
+            data = await asyncio.to_thread(self._request_payload, user_text, user_id)
 
-            headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
-            }
-            data = {
-                "model": self.model,
-                "messages": [
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": 150
-            }
-
-            resp = requests.post(self.api_url, headers=headers, json=data, timeout=20)
-            if resp.status_code == 200:
-                respuesta = resp.json()['choices'][0]['message']['content'].strip()
-
-                # 5️⃣ Guardar la respuesta del asistente
-                if user_id:
-                    save_turn(user_id, role="assistant", text=respuesta, cap=12)
-
-                return respuesta
-            else:
-                return f"[Error IA {resp.status_code}] No pude generar una respuesta."
-        except requests.exceptions.RequestException as e:
-            return f"[Error Conexión Groq] No pude contactar al servicio de IA ({e})"
+            async with async_endpoint_slot("groq", PRIORITY_NORMAL):
+                resp = await self.chat_breaker.call_async(async_http.post, self.api_url, headers=self._headers(),
+                                                          json=data, timeout=20, is_failure=is_server_error)
+            return await asyncio.to_thread(self._finish_response, resp, user_id, cache_key, user_text)
+        except RateLimitExceeded:
+            return BUSY_REPLY
+        except (CircuitOpenError, requests.exceptions.RequestException) as e:
+            print(f"[ERROR Conexión Groq] {e}. Se usa la respuesta local.")
+            return await asyncio.to_thread(self._fallback_response, user_text, user_id)
@@ -0,0 +1,137 @@
+# aida_bot/services/ocr_service.py
+import io
+import json
+import os
+import re
+from PIL import Image
+from .. import config
+
+# OCR local opcional: requiere el paquete pytesseract y el binario de Tesseract
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+_URL_PATTERN = re.compile(r'\b(?:https?://|www\.)?[a-z0-9][a-z0-9\-.]*\.[a-z]{2,}(?:/\S*)?', re.IGNORECASE)
+_IP_PATTERN = re.compile(r'^(?:https?://)?\d{1,3}(?:\.\d{1,3}){3}')
+
+
+class OCRService:
+    """Extrae texto de imágenes localmente (CPU) usando Tesseract."""
+
+    def __init__(self, lang: str = None, min_word_confidence: int = 60):
+        self.lang = lang or config.OCR_LANG
+        self.min_word_confidence = min_word_confidence
+        self.available = False
+        if pytesseract is None:
+            print("⚠️ pytesseract no está instalado: se omite el OCR local.")
+            return
+        try:
+            pytesseract.get_tesseract_version()
+            self.available = True
+            print("✅ OCR local (Tesseract) disponible.")
+        except Exception as e:
+            print(f"⚠️ No se encontró el binario de Tesseract, se omite el OCR local: {e}")
+
+    def extract_text(self, image_bytes: bytes) -> tuple[str, float]:
+        """
+        Devuelve (texto, confianza_media) de las palabras reconocidas.
+        La confianza va de 0 a 100; si no hay OCR disponible devuelve ("", 0.0).
+        """
+        if not self.available:
+            return "", 0.0
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as img:
+                data = pytesseract.image_to_data(img.convert("L"), lang=self.lang,
+                                                 output_type=pytesseract.Output.DICT)
+        except Exception as e:
+            print(f"[ERROR OCR] {e}")
+            return "", 0.0
+
+        words, confidences = [], []
+        for word, conf in zip(data.get("text", []), data.get("conf", [])):
+            conf = float(conf)
+            if word.strip() and conf >= self.min_word_confidence:
+                words.append(word.strip())
+                confidences.append(conf)
+
+        if not words:
+            return "", 0.0
+        return " ".join(words), sum(confidences) / len(confidences)
+
+
+class PhishingScreener:
+    """
+    Puntúa un texto (0 a 1) según heurísticas de phishing:
+    enlaces sospechosos, palabras de urgencia, pedidos de datos y premios.
+    """
+
+    def __init__(self, rules_path: str | None = None):
+        if rules_path is None:
+            current_dir = os.path.dirname(__file__)
+            rules_path = os.path.join(current_dir, '..', 'features', 'phishing_rules.json')
+        self.rules = self._load_rules(rules_path)
+
+    def _load_rules(self, file_path) -> dict:
+        """Carga las listas de palabras y dominios desde el archivo JSON."""
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                return {key: [w.lower() for w in words] for key, words in data.items()}
+        except FileNotFoundError:
+            print(f"⚠️ Error: El archivo '{file_path}' no se encontró.")
+            return {}
+        except json.JSONDecodeError:
+            print(f"⚠️ Error: El archivo '{file_path}' no es un JSON válido.")
+            return {}
+
+    def _find(self, text_lower: str, key: str) -> list[str]:
+        found = []
+        for word in self.rules.get(key, []):
+            if re.search(rf'(?<!\w){re.escape(word)}(?!\w)', text_lower):
+                found.append(word)
+        return found
+
+    def _suspicious_urls(self, text_lower: str) -> list[str]:
+        suspicious = []
+        for url in _URL_PATTERN.findall(text_lower):
+            host = re.sub(r'^https?://', '', url).split('/')[0]
+            if (
+                _IP_PATTERN.match(url)
+                or "xn--" in host
+                or host in self.rules.get("acortadores", [])
+                or any(host.endswith(tld) for tld in self.rules.get("dominios_sospechosos", []))
+                or url.startswith("http://")
+                # Marca conocida mezclada con guiones: "banco-nacion-seguro.com"
+                or ("-" in host and any(brand in host for brand in self.rules.get("marcas", [])))
+            ):
+                suspicious.append(url)
+        return suspicious
+
+    def score(self, text: str) -> tuple[float, list[str]]:
+        """Devuelve (puntaje, motivos) para el texto dado."""
+        text_lower = text.lower()
+        reasons = []
+        score = 0.0
+
+        urls = self._suspicious_urls(text_lower)
+        if urls:
+            score += 0.4
+            reasons.append(f"enlaces sospechosos ({', '.join(urls[:3])})")
+
+        data_requests = self._find(text_lower, "pedidos_de_datos")
+        if data_requests:
+            score += 0.35
+            reasons.append(f"pide datos privados ({', '.join(data_requests[:3])})")
+
+        urgency = self._find(text_lower, "palabras_urgencia")
+        if urgency:
+            score += 0.25
+            reasons.append(f"mete presión o apuro ({', '.join(urgency[:3])})")
+
+        bait = self._find(text_lower, "premios_y_cebos")
+        if bait:
+            score += 0.2
+            reasons.append(f"promete premios o reintegros ({', '.join(bait[:3])})")
+
+        return min(score, 1.0), reasons
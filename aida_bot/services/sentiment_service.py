@@ -1,16 +1,36 @@
 # aida_bot/services/sentiment_service.py
-from transformers import pipeline
 import json
 import os
 import time
+from .. import config
+from ..pipeline import run_cpu
+
+
+def load_sentiment_pipeline(model_name: str):
+    """Carga el pipeline de transformers (se importa recién acá: el modo cliente no lo necesita)."""
+    from transformers import pipeline
+    print("🔄 Cargando modelo de análisis de sentimiento...")
+    analyzer = pipeline("sentiment-analysis", model=model_name)
+    print("✅ Modelo de sentimiento cargado.")
+    return analyzer
+
 
 class SentimentAnalyzer:
     """Analiza el sentimiento de un texto usando transformers."""
+
+    DEFAULT_MODEL = "pysentimiento/robertuito-sentiment-analysis"
     
-    def __init__(self, model_name="pysentimiento/robertuito-sentiment-analysis"):
-        print("🔄 Cargando modelo de análisis de sentimiento...")
-        self.analyzer = pipeline("sentiment-analysis", model=model_name)
-        print("✅ Modelo de sentimiento cargado.")
+    def __init__(self, model_name=DEFAULT_MODEL, client=None):
+        # Con MODEL_SERVER_SOCKET el modelo vive en el servidor de modelos (compartido)
+        self.client = client
+        if self.client is None and config.MODEL_SERVER_SOCKET:
+            from ..model_server import ModelClient
+            self.client = ModelClient()
+        if self.client is not None:
+            self.analyzer = None
+            print(f"✅ Sentimiento remoto (servidor de modelos en {self.client.socket_path}).")
+        else:
+            self.analyzer = load_sentiment_pipeline(model_name)
 
         # Construye una ruta absoluta al archivo feel_list.json
         current_dir = os.path.dirname(__file__) # Directorio 'services'
@@ -79,6 +99,8 @@ class SentimentAnalyzer:
         Labels son: 'POS', 'NEG', 'NEU'.
         """
         try:
+            if self.client is not None:
+                return self.client.sentiment(text)
             result = self.analyzer(text)[0]
             return {
                 "label": result.get('label'),
@@ -88,6 +110,10 @@ class SentimentAnalyzer:
             print(f"[ERROR Sentimiento] {e}")
             return {"label": "NEU", "score": 0.0}
 
+    async def analyze_async(self, text: str) -> dict:
+        """Versión asíncrona de `analyze`: el modelo (CPU) corre en el executor."""
+        return await run_cpu(self.analyze, text)
+
     def format_analysis(self, analysis_result: dict) -> str | None:
         """
         Formatea el resultado del análisis en un mensaje amigable para el usuario.
@@ -1,18 +1,65 @@
 # aida_bot/services/speech_service.py
 import requests
-import whisper
-import torch
 import os
-from tempfile import NamedTemporaryFile
+from tempfile import NamedTemporaryFile, gettempdir
+from uuid import uuid4
+import threading
 import re
 import json
-from langdetect import detect
+from .. import config
+from .language_service import get_language_detector
+from ..rate_limit import PRIORITY_LOW, PRIORITY_NORMAL, RateLimitExceeded, async_endpoint_slot, endpoint_slot
+from ..metrics import EXTERNAL_SECONDS
+from ..model_server import ModelServerError
+from ..pipeline import run_cpu
 
 # texto-a-voz
 import asyncio
 import edge_tts
 from pydub import AudioSegment
 
+def load_whisper_model(model_size: str = "base"):
+    """Carga Whisper (torch se importa recién acá: los procesos en modo cliente no lo cargan)."""
+    import whisper
+    print(f"Cargando el modelo Whisper '{model_size}'...")
+    model = whisper.load_model(model_size)
+    print("✅ Modelo Whisper cargado.")
+    return model
+
+
+def transcribe_many(model, audio_items: list[bytes], language: str = "es") -> list[str]:
+    """
+    Transcribe varios audios en una sola pasada del modelo (lote).
+    Un audio que no se puede leer devuelve "" sin afectar al resto.
+    """
+    import torch
+    import whisper
+
+    mels, indexes = [], []
+    for i, audio_bytes in enumerate(audio_items):
+        temp_file_path = None
+        try:
+            with NamedTemporaryFile(suffix=".ogg", delete=False) as temp_file:
+                temp_file.write(audio_bytes)
+                temp_file_path = temp_file.name
+            audio = whisper.pad_or_trim(whisper.load_audio(temp_file_path))
+            mels.append(whisper.log_mel_spectrogram(audio))
+            indexes.append(i)
+        except Exception as e:
+            print(f"[ERROR Whisper] No se pudo leer el audio: {e}")
+        finally:
+            if temp_file_path and os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+
+    texts = [""] * len(audio_items)
+    if mels:
+        options = whisper.DecodingOptions(language=language, fp16=torch.cuda.is_available())
+        results = whisper.decode(model, torch.stack(mels).to(model.device), options)
+        for i, result in zip(indexes, results):
+            texts[i] = result.text.strip()
+    return texts
+
+
 class SpeechService:
     """Maneja audio (voz a texto, texto a voz) usando Whisper y Edge-TTS."""
     
@@ -35,50 +82,83 @@ class SpeechService:
     # Voz por defecto para nuevos usuarios
     DEFAULT_VOICE = VOICES["Elena (Argentina)"] # "es-AR-ElenaNeural"
 
-    def __init__(self, model_size="base"):
+    def __init__(self, model_size="base", client=None):
         """
-        Carga el modelo Whisper al iniciar.
+        Carga el modelo Whisper al iniciar, o solo se conecta al servidor de
+        modelos si MODEL_SERVER_SOCKET está configurado (sin Whisper en memoria).
         """
-        print(f"Cargando el modelo Whisper '{model_size}'...")
-        self.model = whisper.load_model(model_size)
         self.language = "es" # Idioma para transcripción
-        print("✅ Modelo Whisper cargado.")
+        self.detector = get_language_detector()  # Compartido con Translator
+        self._model_lock = threading.Lock()  # Una decodificación de Whisper a la vez
+        self.client = client
+        if self.client is None and config.MODEL_SERVER_SOCKET:
+            from ..model_server import ModelClient
+            self.client = ModelClient()
+        if self.client is not None:
+            self.model = None
+            print(f"✅ Whisper remoto (servidor de modelos en {self.client.socket_path}).")
+        else:
+            self.model = load_whisper_model(model_size)
     
     def transcribe(self, audio_bytes: bytes) -> str:
         """
         Transcribe los bytes de un archivo de audio a texto, forzando el idioma español.
         """
-        temp_file_path = None
         try:
-            with NamedTemporaryFile(suffix=".ogg", delete=False) as temp_file:
-                temp_file.write(audio_bytes)
-                temp_file_path = temp_file.name
+            with endpoint_slot("whisper", PRIORITY_LOW):
+                return self._run_whisper(audio_bytes)
+        except RateLimitExceeded:
+            raise  # quien llama avisa al usuario que estamos saturados
+        except Exception as e:
+            self._raise_if_unavailable(e)
+            print(f"[ERROR Whisper] No se pudo transcribir el audio: {e}")
+            return ""
 
-            audio = whisper.load_audio(temp_file_path)
-            audio = whisper.pad_or_trim(audio)
-            mel = whisper.log_mel_spectrogram(audio).to(self.model.device)
+    @staticmethod
+    def _raise_if_unavailable(error: Exception):
+        """Servidor de modelos caído o con la cola llena: se responde como endpoint saturado."""
+        if isinstance(error, ModelServerError) and error.unavailable:
+            raise RateLimitExceeded(f"servidor de modelos no disponible: {error}") from error
 
-            options = whisper.DecodingOptions(language=self.language, fp16=torch.cuda.is_available())
-            result = whisper.decode(self.model, mel, options)
-            
-            return result.text.strip()
+    def _run_whisper(self, audio_bytes: bytes) -> str:
+        """Llamada al modelo (local o en el servidor de modelos), sin control de concurrencia."""
+        with EXTERNAL_SECONDS.time(service="whisper"):
+            if self.client is not None:
+                return self.client.transcribe(audio_bytes, self.language)
+            with self._model_lock:
+                return transcribe_many(self.model, [audio_bytes], self.language)[0]
+
+    async def transcribe_async(self, audio_bytes: bytes) -> str:
+        """
+        Versión asíncrona de `transcribe`: el turno en "whisper" se espera en el event loop
+        y solo la inferencia ocupa el executor de CPU (con servidor de modelos es
+        E/S por socket y va al executor por defecto).
+        """
+        try:
+            async with async_endpoint_slot("whisper", PRIORITY_LOW):
+                if self.client is not None:
+                    return await asyncio.to_thread(self._run_whisper, audio_bytes)
+                return await run_cpu(self._run_whisper, audio_bytes)
+        except RateLimitExceeded:
+            raise
         except Exception as e:
+            self._raise_if_unavailable(e)
             print(f"[ERROR Whisper] No se pudo transcribir el audio: {e}")
             return ""
-        finally:
-            if temp_file_path and os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
-    
-    def get_voice_for_text(self, text: str) -> str:
+
+    def get_voice_for_text(self, text: str, preferred_voice: str | None = None) -> str:
         """
         Detecta el idioma del texto y devuelve la voz adecuada.
-        Si no puede detectar, usa español (Argentina) por defecto.
+        Si el texto es muy corto o la detección no es confiable, usa la voz
+        guardada del usuario (`preferred_voice`) o español (Argentina) por defecto.
         """
-        try:
-            lang = detect(text)
-        except Exception:
-            lang = "es"
-        
+        preferred_lang = preferred_voice.split("-")[0] if preferred_voice else None
+        lang = self.detector.detect(text, default=preferred_lang or "es")
+
+        # Si el idioma coincide con la voz elegida por el usuario, respetamos su elección
+        if preferred_voice and lang == preferred_lang:
+            return preferred_voice
+
         # Asignar voz según idioma detectado
         if lang.startswith("es"):
             return self.VOICES["Elena (Argentina)"]
@@ -101,40 +181,62 @@ class SpeechService:
 
 
     
-    def synthesize(self, text: str, voice_id: str, output_filename: str = "response_audio") -> str | None:
+    async def synthesize_async(self, text: str, voice_id: str, output_filename: str | None = None) -> str | None:
         """
-        Sintetiza texto a un archivo de audio .ogg usando edge-tts.
-        Usa el 'voice_id' proporcionado.
-        Retorna el audio que fue almacenado de manera temporal.
+        Sintetiza texto a un archivo de audio .ogg usando edge-tts (asíncrono).
+        Espera lugar en el endpoint "tts" sin ocupar un hilo.
         """
-        
+        try:
+            async with async_endpoint_slot("tts", PRIORITY_NORMAL):
+                return await self._synthesize(text, voice_id, output_filename)
+        except RateLimitExceeded as e:
+            print(f"[ERROR TTS] {e}")
+            return None  # se responde solo con texto
+
+    async def _synthesize(self, text: str, voice_id: str, output_filename: str | None = None) -> str | None:
+        """Síntesis sin control de concurrencia. La conversión mp3 -> ogg (pydub/ffmpeg) corre en un hilo aparte."""
         text = re.sub(r'\*+', '', text) # Elimina asteriscos (para que no los lea)
-        
-        async def _async_synthesize():
-            """Función interna asíncrona para manejar la generación de audio."""
-            mp3_path = f"{output_filename}.mp3"
-            ogg_path = f"{output_filename}.ogg"
-            
-            try:
-                communicate = edge_tts.Communicate(text, voice_id) 
-                await communicate.save(mp3_path)
 
+        # Nombre único: varias respuestas pueden sintetizarse a la vez
+        if output_filename is None:
+            output_filename = os.path.join(gettempdir(), f"aida_tts_{uuid4().hex}")
+        mp3_path = f"{output_filename}.mp3"
+        ogg_path = f"{output_filename}.ogg"
+
+        def _convert():
+            with EXTERNAL_SECONDS.time(service="pydub"):
                 audio = AudioSegment.from_mp3(mp3_path)
                 audio.export(ogg_path, format="ogg", codec="libopus")
-                
-                return ogg_path
-            except Exception as e:
-                print(f"[ERROR TTS] No se pudo sintetizar el audio ({voice_id}): {e}")
-                return None
-            finally:
-                if os.path.exists(mp3_path):
-                    os.remove(mp3_path)
 
         try:
-            audio_path = asyncio.run(_async_synthesize())
-            return audio_path
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            audio_path = loop.run_until_complete(_async_synthesize())
-            return audio_path
\ No newline at end of file
+            communicate = edge_tts.Communicate(text, voice_id) 
+            with EXTERNAL_SECONDS.time(service="edge_tts"):
+                await communicate.save(mp3_path)
+            await run_cpu(_convert)
+            return ogg_path
+        except Exception as e:
+            print(f"[ERROR TTS] No se pudo sintetizar el audio ({voice_id}): {e}")
+            return None
+        finally:
+            if os.path.exists(mp3_path):
+                os.remove(mp3_path)
+
+    def synthesize(self, text: str, voice_id: str, output_filename: str | None = None) -> str | None:
+        """
+        Sintetiza texto a un archivo de audio .ogg usando edge-tts.
+        Usa el 'voice_id' proporcionado.
+        Retorna el audio que fue almacenado de manera temporal.
+        """
+        try:
+            with endpoint_slot("tts", PRIORITY_NORMAL):
+                try:
+                    audio_path = asyncio.run(self._synthesize(text, voice_id, output_filename))
+                    return audio_path
+                except RuntimeError:
+                    loop = asyncio.new_event_loop()
+                    asyncio.set_event_loop(loop)
+                    audio_path = loop.run_until_complete(self._synthesize(text, voice_id, output_filename))
+                    return audio_path
+        except RateLimitExceeded as e:
+            print(f"[ERROR TTS] {e}")
+            return None  # se responde solo con texto
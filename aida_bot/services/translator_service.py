@@ -1,12 +1,31 @@
 import requests
-from langdetect import detect
+from .. import config
+from ..cache import LRUCache, make_key
+from .language_service import get_language_detector
+from ..rate_limit import PRIORITY_NORMAL, endpoint_slot
+from ..metrics import watch_cache
+from ..resilience import CircuitOpenError, get_breaker, groq_probe, is_server_error
 
 class Translator:
 
-    def __init__(self, api_key: str, api_url="https://api.groq.com/openai/v1/chat/completions", model="llama-3.1-8b-instant"):
+    def __init__(self, api_key: str, api_url="https://api.groq.com/openai/v1/chat/completions", model="llama-3.1-8b-instant",
+                 cache: LRUCache | None = None, rate_limiter=None, cache_path: str | None = None,
+                 metrics_prefix: str = ""):
         self.api_key = api_key
         self.api_url = api_url
         self.model = model
+        self.detector = get_language_detector()
+        self.rate_limiter = rate_limiter  # límite de traducciones por usuario (opcional)
+        # Si Groq no responde, se devuelve el texto original sin esperar
+        self.breaker = get_breaker(f"groq:{model}", config.BREAKER_SLO_CHAT, groq_probe(api_url, api_key, model))
+        # Caché de traducciones: (texto normalizado, idioma destino) -> traducción
+        # `cache_path`: archivo propio (de cada bot y cada worker); None = TRANSLATION_CACHE_PATH
+        cache_path = config.TRANSLATION_CACHE_PATH if cache_path is None else cache_path
+        self.cache = cache or LRUCache(
+            max_size=config.TRANSLATION_CACHE_SIZE,
+            persist_path=cache_path or None
+        )
+        watch_cache(f"{metrics_prefix}translation", self.cache)
         self.system_prompt = (
             """1. Eres un traductor profesional.
                 2. Estás especializado en educación digital y comunicación inclusiva.
@@ -20,16 +39,19 @@ class Translator:
         )
 
     def detect_language(self, text: str) -> str:
-        """Detecta el idioma del texto de forma local."""
-        try:
-            lang = detect(text)
-            return lang  
-        except:
-            return "es"
-        
+        """Detecta el idioma del texto de forma local (memoizado y determinista)."""
+        return self.detector.detect(text, default="es")
+
+    def _cache_key(self, text: str, target_lang: str) -> str:
+        return make_key(" ".join(text.split()), target_lang.lower())
 
     def translate_text(self, text: str, target_lang: str) -> str:
         #Traduce el texto al idioma indicado.
+        key = self._cache_key(text, target_lang)
+        cached = self.cache.get(key)
+        if cached:
+            return cached
+
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -45,9 +67,15 @@ class Translator:
         }
 
         try:
-            response = requests.post(self.api_url, headers=headers, json=data, timeout=20)
+            with endpoint_slot("groq", PRIORITY_NORMAL):
+                response = self.breaker.call(requests.post, self.api_url, headers=headers, json=data,
+                                             timeout=20, is_failure=is_server_error)
             response.raise_for_status()
-            return response.json()['choices'][0]['message']['content'].strip()
+            translated = response.json()['choices'][0]['message']['content'].strip()
+            self.cache.put(key, translated)
+            return translated
+        except CircuitOpenError:
+            return text
         except Exception as e:
             print(f"[ERROR TRADUCCIÓN] No se pudo traducir el texto: {e}")
             return text
@@ -61,8 +89,10 @@ class Translator:
             lang = self.detect_language(user_message.text)
             if lang == "es":
                 return text  # ya está en español
+            if self.rate_limiter and not self.rate_limiter.acquire(user_message.chat.id, "translate")[0]:
+                return text  # se pasó del límite: respondemos sin traducir
             translated = self.translate_text(text, lang)
             return translated
         except Exception as e:
             print(f"[ERROR AUTO TRADUCCIÓN] {e}")
-            return text
\ No newline at end of file
+            return text
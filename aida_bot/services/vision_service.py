@@ -1,16 +1,39 @@
 # aida_bot/services/vision_service.py
 import requests
+import asyncio
 import base64
 import json
 from .. import config
+from .image_preprocessing import ImagePreprocessor
+from .image_cache import ImageAnalysisCache, perceptual_hash
+from .ocr_service import OCRService, PhishingScreener
+from . import async_http
+from ..pipeline import run_cpu
+from ..rate_limit import (BUSY_REPLY, PRIORITY_LOW, PRIORITY_NORMAL, RateLimitExceeded, async_endpoint_slot,
+                          endpoint_slot)
+from ..resilience import CANNED_REPLIES, CircuitOpenError, get_breaker, groq_probe, is_server_error
 
 class VisionService:
     """Procesamiento de imágenes (OCR, reconocimiento, detección, etc.)."""
     
-    def __init__(self, api_key: str, api_url: str):
+    def __init__(self, api_key: str, api_url: str, preprocessor: ImagePreprocessor | None = None,
+                 cache: ImageAnalysisCache | None = None, ocr: OCRService | None = None):
         self.api_key = api_key
         self.api_url = api_url
         self.model = config.VISION_MODEL
+        # Achica y re-codifica la imagen antes de subirla a Groq
+        self.preprocessor = preprocessor or ImagePreprocessor()
+        # Evita re-analizar imágenes repetidas (cadenas, capturas de estafas)
+        self.cache = cache or ImageAnalysisCache()
+        # Pre-filtro local: OCR + heurísticas de phishing antes del modelo multimodal
+        self.text_model = config.OCR_TEXT_MODEL
+        self.ocr = ocr if ocr is not None else (OCRService() if config.OCR_PRESCREEN else None)
+        self.screener = PhishingScreener()
+        # Circuitos por modelo: si Groq no responde, se contesta al instante con un aviso local
+        self.breaker = get_breaker(f"groq:{self.model}", config.BREAKER_SLO_VISION,
+                                   groq_probe(api_url, api_key, self.model))
+        self.text_breaker = get_breaker(f"groq:{self.text_model}", config.BREAKER_SLO_CHAT,
+                                        groq_probe(api_url, api_key, self.text_model))
         print("✅ Servicio de Visión inicializado.")
 
     def _image_to_base64(self, image_bytes: bytes) -> str:
@@ -47,21 +70,125 @@ Usa un tono cálido y paciente.
         else:
             return f"{base_prompt}\n\nDescribe la imagen para el usuario."
 
-    def analyze_image(self, image_bytes: bytes, user_caption: str | None = None) -> str:
+    def _remember(self, image_hash: int | None, user_caption: str | None, description: str,
+                  is_phishing: bool = False):
         """
-        Envía la imagen a Groq y obtiene la descripción.
+        Guarda la descripción en caché. `is_phishing` solo se pasa con una señal
+        estructurada (el puntaje del PhishingScreener), nunca deducida del texto
+        de la respuesta: "no parece phishing" también contiene la palabra.
+        """
+        if image_hash is None:
+            return
+        self.cache.put(image_hash, user_caption, description)
+        # Fraude confirmado: la próxima vez respondemos al instante
+        if is_phishing:
+            self.cache.mark_phishing(image_hash, user_caption, description)
+
+    def _phishing_warning(self, reasons: list[str]) -> str:
+        """Respuesta local para capturas claramente fraudulentas."""
+        motivos = "\n".join(f"• {reason}" for reason in reasons)
+        return (
+            "⚠️ Este mensaje parece ser un intento de fraude o phishing.\n\n"
+            f"Lo que me hace sospechar:\n{motivos}\n\n"
+            "No hagas clic en los enlaces ni ingreses tus datos personales. Si tenés dudas, "
+            "contactá directamente al banco o empresa desde su página oficial."
+        )
+
+    def _text_request(self, extracted_text: str, user_caption: str | None, reasons: list[str]) -> dict:
+        """Payload para responder usando solo el texto extraído por OCR con un modelo de texto."""
+        base_prompt = self._build_prompt(user_caption)
+        hints = f"\nSeñales de alerta detectadas localmente: {'; '.join(reasons)}." if reasons else ""
+        return {
+            "model": self.text_model,
+            "messages": [
+                {"role": "system", "content": base_prompt},
+                {"role": "user", "content": (
+                    "No tenés la imagen: es una captura con texto y este es el texto que se leyó en ella."
+                    f"{hints}\n\nTexto de la imagen:\n\"\"\"{extracted_text}\"\"\""
+                )}
+            ],
+            "max_tokens": 200
+        }
+
+    def _parse_text(self, resp) -> str | None:
+        if resp.status_code == 200:
+            return resp.json()['choices'][0]['message']['content'].strip()
+        print(f"[ERROR Visión-Texto] Código {resp.status_code}: {resp.text}")
+        return None
+
+    def _analyze_text(self, data: dict) -> str | None:
+        """
+        Responde con el modelo de texto (más barato que el multimodal).
+        Devuelve None si falla: entonces se usa el modelo de visión.
+        """
+        try:
+            with endpoint_slot("groq", PRIORITY_NORMAL):
+                resp = self.text_breaker.call(requests.post, self.api_url, headers=self._headers(), json=data,
+                                              timeout=20, is_failure=is_server_error)
+            return self._parse_text(resp)
+        except (requests.exceptions.RequestException, RateLimitExceeded, CircuitOpenError) as e:
+            print(f"[ERROR Visión-Texto] {e}")
+        return None
+
+    async def _analyze_text_async(self, data: dict) -> str | None:
+        """Versión asíncrona de `_analyze_text`."""
+        try:
+            async with async_endpoint_slot("groq", PRIORITY_NORMAL):
+                resp = await self.text_breaker.call_async(async_http.post, self.api_url, headers=self._headers(),
+                                                          json=data, timeout=20, is_failure=is_server_error)
+            return self._parse_text(resp)
+        except (requests.exceptions.RequestException, RateLimitExceeded, CircuitOpenError) as e:
+            print(f"[ERROR Visión-Texto] {e}")
+        return None
+
+    def _prescreen(self, image_bytes: bytes, user_caption: str | None) -> tuple[str | None, dict | None]:
         """
+        Etapa local en CPU: si la imagen es básicamente texto (SMS, avisos del banco),
+        se resuelve sin el modelo multimodal. Devuelve (aviso de phishing, payload
+        para el modelo de texto); ambos None si hay que usar visión.
+        """
+        if not self.ocr or not self.ocr.available:
+            return None, None
+
+        extracted_text, confidence = self.ocr.extract_text(image_bytes)
+        if len(extracted_text) < config.OCR_MIN_CHARS or confidence < config.OCR_MIN_CONFIDENCE:
+            return None, None  # poca letra: es una foto "de verdad"
+
+        score, reasons = self.screener.score(extracted_text)
+        print(f"[Visión] OCR: {len(extracted_text)} caracteres, phishing={score:.2f}")
+
+        if score >= config.PHISHING_DIRECT_THRESHOLD:
+            return self._phishing_warning(reasons), None
+
+        return None, self._text_request(extracted_text, user_caption, reasons)
+
+    def _prepare_image(self, image_bytes: bytes,
+                       user_caption: str | None) -> tuple[str | None, int | None, dict | None, dict | None]:
+        """
+        Etapas locales en CPU (caché, preprocesado, pre-filtro OCR); no llama a Groq.
+        Devuelve (respuesta_directa, hash, payload para el modelo de texto,
+        payload para el modelo de visión).
+        """
+        image_hash = perceptual_hash(image_bytes)
+        if image_hash is not None:
+            cached = self.cache.get(image_hash, user_caption)
+            if cached:
+                print(f"[Visión] Respuesta desde caché (llamadas ahorradas: {self.cache.saved_calls})")
+                return cached, image_hash, None, None
+
+        image_bytes, mime_type = self.preprocessor.process(image_bytes)
+
+        warning, text_data = self._prescreen(image_bytes, user_caption)
+        if warning:
+            self._remember(image_hash, user_caption, warning, is_phishing=True)
+            return warning, image_hash, None, None
+
         image_b64 = self._image_to_base64(image_bytes)
         if not image_b64:
-            return "No pude procesar la imagen."
+            return "No pude procesar la imagen.", image_hash, None, None
 
         system_prompt = self._build_prompt(user_caption)
         
-        headers = {
-            'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/json'
-        }
-        
         data = {
             "model": self.model,
             "messages": [
@@ -79,7 +206,7 @@ Usa un tono cálido y paciente.
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_b64}"
+                                "url": f"data:{mime_type};base64,{image_b64}"
                             }
                         }
                     ]
@@ -87,12 +214,73 @@ Usa un tono cálido y paciente.
             ],
             "max_tokens": 200
         }
-        
+        return None, image_hash, text_data, data
+
+    def _finish_image(self, resp, image_hash: int | None, user_caption: str | None) -> str:
+        if resp.status_code == 200:
+            description = resp.json()['choices'][0]['message']['content'].strip()
+            self._remember(image_hash, user_caption, description)
+            return description
+        elif is_server_error(resp):
+            return CANNED_REPLIES["vision"]
+        else:
+            return f"[Error IA {resp.status_code}] No pude analizar la imagen. {resp.text}"
+
+    def _headers(self) -> dict:
+        return {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+
+    def analyze_image(self, image_bytes: bytes, user_caption: str | None = None) -> str:
+        """
+        Envía la imagen a Groq y obtiene la descripción.
+        Si ya se analizó una imagen casi idéntica, devuelve la descripción guardada.
+        """
+        direct, image_hash, text_data, data = self._prepare_image(image_bytes, user_caption)
+        if direct:
+            return direct
+        if text_data:
+            answer = self._analyze_text(text_data)
+            if answer:
+                self._remember(image_hash, user_caption, answer)
+                return answer
+
+        try:
+            # El modelo multimodal es lo más caro: cede el lugar a intención y chat
+            with endpoint_slot("groq", PRIORITY_LOW):
+                resp = self.breaker.call(requests.post, self.api_url, headers=self._headers(), json=data,
+                                         timeout=30, is_failure=is_server_error)
+            return self._finish_image(resp, image_hash, user_caption)
+        except RateLimitExceeded:
+            return BUSY_REPLY
+        except CircuitOpenError:
+            return CANNED_REPLIES["vision"]
+        except requests.exceptions.RequestException as e:
+            return f" [Error Conexión Groq] No pude contactar al servicio de IA. ({e})"
+
+    async def analyze_image_async(self, image_bytes: bytes, user_caption: str | None = None) -> str:
+        """
+        Versión asíncrona de `analyze_image`. Solo el trabajo de CPU (hash, preprocesado, OCR)
+        corre en el executor de CPU; las llamadas a Groq esperan en el event loop.
+        """
+        direct, image_hash, text_data, data = await run_cpu(self._prepare_image, image_bytes, user_caption)
+        if direct:
+            return direct
+        if text_data:
+            answer = await self._analyze_text_async(text_data)
+            if answer:
+                await asyncio.to_thread(self._remember, image_hash, user_caption, answer)
+                return answer
+
         try:
-            resp = requests.post(self.api_url, headers=headers, json=data, timeout=30)
-            if resp.status_code == 200:
-                return resp.json()['choices'][0]['message']['content'].strip()
-            else:
-                return f"[Error IA {resp.status_code}] No pude analizar la imagen. {resp.text}"
+            async with async_endpoint_slot("groq", PRIORITY_LOW):
+                resp = await self.breaker.call_async(async_http.post, self.api_url, headers=self._headers(),
+                                                     json=data, timeout=30, is_failure=is_server_error)
+            return await asyncio.to_thread(self._finish_image, resp, image_hash, user_caption)
+        except RateLimitExceeded:
+            return BUSY_REPLY
+        except CircuitOpenError:
+            return CANNED_REPLIES["vision"]
         except requests.exceptions.RequestException as e:
-            return f" [Error Conexión Groq] No pude contactar al servicio de IA. ({e})"
\ No newline at end of file
+            return f" [Error Conexión Groq] No pude contactar al servicio de IA. ({e})"
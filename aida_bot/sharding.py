@@ -0,0 +1,167 @@
+# aida_bot/sharding.py
+import multiprocessing
+import queue
+import threading
+import time
+from aida_bot import config
+from aida_bot import metrics
+from aida_bot.pipeline import ChatDispatcher, shard_for, update_chat_id
+from aida_bot.storage.database import prepare_shards
+
+
+def _worker_main(index: int, count: int, updates, factory, threads: int):
+    """
+    Proceso worker: arma su propio bot (con su caché de sesiones y su almacenamiento)
+    y atiende solo los chats de su shard, que le llegan por `updates`.
+    """
+    aida_bot = factory(shard=(index, count))
+    if config.METRICS_PORT:
+        # Cada worker tiene sus propias métricas, en el puerto siguiente al del frontal
+        metrics.start_server(config.METRICS_PORT + 1 + index)
+    # Pocas actualizaciones por hilo dentro del worker: el resto espera en `updates`,
+    # que es la cola que sobrevive si el worker se cae
+    dispatcher = ChatDispatcher(aida_bot.bot.process_new_updates, workers=threads,
+                                queue_size=threads * 4, name=f"aida-shard{index}")
+    aida_bot.dispatcher = dispatcher  # los pedidos postergados vuelven a la cola de su chat
+    dispatcher.start()
+    print(f"✅ Worker {index + 1}/{count} listo.")
+
+    while True:
+        update = updates.get()
+        if update is None:
+            break
+        dispatcher.submit(update, block=True)
+    dispatcher.stop()
+
+
+class ShardSupervisor:
+    """
+    Modo multiproceso: este proceso recibe las actualizaciones (polling o webhook)
+    y las reparte por `chat.id` entre N procesos worker a través de colas locales.
+    Cada worker es dueño exclusivo de sus usuarios. Si un worker se cae, se lo
+    vuelve a levantar (con espera creciente si se cae una y otra vez). Su cola se
+    conserva, pero las actualizaciones que el worker ya había tomado (las que se
+    estaban atendiendo y unas pocas por hilo en espera) se pierden con él.
+
+    Cada worker es un proceso aparte y carga su propio Whisper y modelo de
+    sentimiento, salvo que MODEL_SERVER_SOCKET apunte a un servidor de modelos.
+    """
+
+    def __init__(self, factory, workers: int | None = None, threads: int | None = None,
+                 queue_size: int | None = None):
+        self.factory = factory  # función build_bot(shard=(i, n)) importable desde el worker
+        self.count = workers or config.SHARD_WORKERS
+        self.threads = threads or config.SHARD_THREADS
+        # "spawn": cada worker arranca limpio (sin hilos ni modelos heredados del frontal)
+        self._ctx = multiprocessing.get_context("spawn")
+        queue_size = queue_size or config.SHARD_QUEUE_SIZE
+        self.queues = [self._ctx.Queue(maxsize=queue_size) for _ in range(self.count)]
+        self.processes: list = [None] * self.count
+        self.restarts = [0] * self.count
+        self._started_at = [0.0] * self.count
+        self._stopping = threading.Event()
+        for index, updates in enumerate(self.queues):
+            metrics.watch_queue(f"shard{index}", updates.qsize)
+
+    def _spawn(self, index: int):
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self.count, self.queues[index], self.factory, self.threads),
+            name=f"aida-shard{index}",
+            daemon=True,
+        )
+        process.start()
+        self.processes[index] = process
+        self._started_at[index] = time.monotonic()
+
+    def _monitor(self):
+        """Revisa los workers cada segundo y reinicia los que se cayeron."""
+        retry_at = [0.0] * self.count
+        while not self._stopping.wait(1):
+            for index, process in enumerate(self.processes):
+                if process is None or process.is_alive():
+                    continue
+                now = time.monotonic()
+                if retry_at[index] == 0.0:
+                    # Si vivió poco, se espera más antes de reintentar (hasta 60 s)
+                    uptime = now - self._started_at[index]
+                    self.restarts[index] = 0 if uptime > 60 else self.restarts[index] + 1
+                    delay = min(60, 2 ** self.restarts[index]) if self.restarts[index] else 0
+                    print(f"[ERROR SHARD] Worker {index} terminó (código {process.exitcode}). "
+                          f"Reiniciando en {delay} s...")
+                    retry_at[index] = now + delay
+                if now >= retry_at[index]:
+                    retry_at[index] = 0.0
+                    self._spawn(index)
+
+    def route(self, update):
+        """Envía la actualización al worker dueño de su chat (espera si la cola está llena)."""
+        self.queues[shard_for(update_chat_id(update), self.count)].put(update)
+
+    def process_new_updates(self, updates):
+        # Misma firma que TeleBot, para poder usarlo detrás del WebhookServer
+        for update in updates:
+            self.route(update)
+
+    def start(self):
+        # Con JSON local, los archivos de los workers se arman antes de levantarlos
+        # (si cambió SHARD_WORKERS, se reparten los datos de los archivos anteriores)
+        prepare_shards(self.count)
+        if not config.MODEL_SERVER_SOCKET:
+            print(f"⚠️ Sin MODEL_SERVER_SOCKET cada uno de los {self.count} workers carga su propio "
+                  f"Whisper y modelo de sentimiento (python -m aida_bot.model_server los comparte).")
+        for index in range(self.count):
+            self._spawn(index)
+        threading.Thread(target=self._monitor, daemon=True, name="aida-shard-monitor").start()
+        print(f"✅ {self.count} workers iniciados ({self.threads} hilos cada uno).")
+
+    def stop(self):
+        self._stopping.set()
+        for updates in self.queues:
+            try:
+                updates.put(None, timeout=5)
+            except queue.Full:
+                pass
+        for process in self.processes:
+            if process is not None:
+                process.join(timeout=10)
+                if process.is_alive():
+                    process.terminate()
+
+    def _poll(self, bot):
+        """Long polling en el proceso frontal: solo recibe y reparte."""
+        bot.remove_webhook()
+        offset = None
+        while not self._stopping.is_set():
+            try:
+                updates = bot.get_updates(offset=offset, timeout=20, long_polling_timeout=20)
+            except Exception as e:
+                print(f"[ERROR GENERAL POLLING] {e}")
+                print("Reintentando en 10 segundos...")
+                time.sleep(10)
+                continue
+            for update in updates:
+                self.route(update)
+                offset = update.update_id + 1
+
+    def run(self):
+        import telebot
+        self.start()
+        metrics.start_server()
+        bot = telebot.TeleBot(config.TELEGRAM_TOKEN, threaded=False)
+        try:
+            if config.BOT_MODE == "webhook":
+                from aida_bot.webhook import WebhookServer
+                server = WebhookServer(bot, workers=1, process=self.process_new_updates)
+                server.start()
+                server.register()
+                print("✅ Proceso frontal (webhook) repartiendo actualizaciones...")
+                while True:
+                    time.sleep(60)
+            else:
+                print("✅ Proceso frontal (polling) repartiendo actualizaciones...")
+                self._poll(bot)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
@@ -1,15 +1,135 @@
 # aida_bot/storage/database.py
+import copy
 import json
+import mmap
 import os
+import re
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
 import firebase_admin
 from firebase_admin import credentials, firestore
 from abc import ABC, abstractmethod
 from .. import config
+from ..cache import LRUCache
+from ..metrics import EXTERNAL_SECONDS, STORAGE_COMMITS, watch_cache
+from . import serializers
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Campos de control de la replicación JSON ↔ Firestore (sync_to_firestore.py):
+# se guardan en cada documento de Firestore pero no son datos del usuario.
+META_FIELDS = ("_updatedAt", "_version", "_origin", "_deleted")
+
+# Sección de los archivos de JSONStorage con la hora de cada guardado ("sessions/123" -> epoch):
+# al juntar copias de un mismo registro (JSONStorage.reshard) gana la más reciente.
+UPDATED = "_updated"
+
+
+def _local_copies(stem: str) -> list[str]:
+    """
+    Archivos de datos locales de `stem` en cualquier formato: el principal
+    y los de cada shard, de cualquier cantidad (aida_data.shard1of4.json).
+    """
+    folder, base = os.path.split(stem)
+    pattern = re.compile(rf"{re.escape(base)}(?:\.shard\d+of\d+)?\.(?:json|msgpack|cbor)")
+    return [os.path.join(folder, name) for name in os.listdir(folder or ".") if pattern.fullmatch(name)]
+
+
+@contextmanager
+def file_lock(path: str):
+    """
+    Lock entre procesos sobre `<path>.lock`: el bot y la replicación no
+    reescriben el mismo archivo JSON a la vez.
+    """
+    with open(f"{path}.lock", "a+b") as lock:
+        if fcntl:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        else:
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+            else:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def atomic_write(path: str, payload: bytes, durable: bool | None = None):
+    """
+    Reemplaza `path` por `payload` sin que nadie vea un archivo a medio escribir:
+    se escribe un temporal en la misma carpeta y se renombra encima. Con `durable`
+    (STORAGE_FSYNC) se hace fsync del temporal y de la carpeta, así que tras un
+    corte de luz queda la versión anterior o la nueva, nunca un archivo truncado.
+    """
+    durable = config.STORAGE_FSYNC if durable is None else durable
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(payload)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    if durable and fcntl:  # en Windows no se puede abrir una carpeta para fsync
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def file_stamp(path: str) -> list | None:
+    """[mtime_ns, tamaño] del archivo, o None si no existe."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def user_file(root: str, key: str, extension: str, buckets: int = 256) -> str:
+    """Archivo de un usuario en la disposición por usuario: <root>/<cubeta>/<key><extension>."""
+    return os.path.join(root, f"{zlib.crc32(key.encode('utf-8')) % buckets:02x}", f"{key}{extension}")
+
+
+_INDEX_RECORD = struct.Struct("<q")
+
+
+def append_user_index(root: str, key: str):
+    """Agrega un id numérico al índice de usuarios (<root>/index.bin, enteros de 8 bytes)."""
+    if key.lstrip("-").isdigit():
+        with open(os.path.join(root, "index.bin"), 'ab') as f:
+            f.write(_INDEX_RECORD.pack(int(key)))
+
+
+def strip_meta(data: dict | None) -> dict | None:
+    """Datos de un documento sin los campos de replicación; None si es una baja."""
+    if data is None or data.get("_deleted"):
+        return None
+    return {k: v for k, v in data.items() if k not in META_FIELDS}
+
 
 # --- Interfaz de Almacenamiento ---
 
 class AbstractStorage(ABC):
     """Define los métodos que cualquier sistema de almacenamiento debe tener."""
+
+    # Prefijo de sus cachés en /metrics (el bot en modo multi-tenant, ver Tenant.metrics_prefix)
+    metrics_prefix = ""
     
     @abstractmethod
     def get_session(self, chat_id: int) -> dict:
@@ -27,39 +147,419 @@ class AbstractStorage(ABC):
     def save_profile(self, user_id: int, profile_data: dict):
         pass
 
+    # ---------- TURNOS (historial de conversación, solo se agregan) ----------
+    # Implementación por defecto sobre session["history"]; los backends
+    # concretos la reemplazan por escrituras append-only.
+
+    def append_turn(self, chat_id: int, turn: dict):
+        session = self.get_session(chat_id)
+        session.setdefault("history", []).append(turn)
+        self.save_session(chat_id, session)
+
+    def get_turns(self, chat_id: int, limit: int | None = None) -> list[dict]:
+        history = self.get_session(chat_id).get("history", [])
+        return history[-limit:] if limit else list(history)
+
+    def clear_turns(self, chat_id: int):
+        session = self.get_session(chat_id)
+        session["history"] = []
+        self.save_session(chat_id, session)
+
+# --- Historial en archivos locales (común a JSONStorage y ShardedJSONStorage) ---
+
+class _TurnLogMixin:
+    """Un archivo .jsonl por usuario con sus turnos (<turns_dir>/<chat_id>.jsonl)."""
+
+    turns_dir: str
+
+    def _turns_path(self, chat_id: int) -> str:
+        return os.path.join(self.turns_dir, f"{chat_id}.jsonl")
+
+    def append_turn(self, chat_id: int, turn: dict):
+        # Se agrega una línea al final: no se reescribe el archivo de datos
+        os.makedirs(self.turns_dir, exist_ok=True)
+        with open(self._turns_path(chat_id), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(turn, ensure_ascii=False) + "\n")
+
+    def get_turns(self, chat_id: int, limit: int | None = None) -> list[dict]:
+        path = self._turns_path(chat_id)
+        if not os.path.exists(path):
+            # Datos viejos: el historial todavía está dentro de la sesión
+            return super().get_turns(chat_id, limit)
+        turns = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        turns.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue  # línea cortada por un corte de luz, se ignora
+        return turns[-limit:] if limit else turns
+
+    def clear_turns(self, chat_id: int):
+        path = self._turns_path(chat_id)
+        if os.path.exists(path):
+            os.remove(path)
+        session = self.get_session(chat_id)
+        if session.get("history"):
+            session["history"] = []
+            self.save_session(chat_id, session)
+
 # --- Implementación 1: Almacenamiento en JSON Local ---
 
-class JSONStorage(AbstractStorage):
-    """Implementación de almacenamiento usando un archivo JSON local."""
+class JSONStorage(_TurnLogMixin, AbstractStorage):
+    """
+    Implementación de almacenamiento usando un archivo local. El formato sale de
+    STORAGE_FORMAT (JSON compacto por defecto, o MessagePack/CBOR): con un formato
+    binario, aida_data.json pasa a ser aida_data.msgpack y se migra al abrirlo
+    (el anterior queda como aida_data.json.migrated).
+
+    Cada guardado reescribe el archivo con atomic_write bajo file_lock (el mismo
+    lock que usa la replicación). Los guardados que llegan mientras se escribe
+    se juntan en la escritura siguiente (group commit): un solo fsync para todos,
+    y cada save_* vuelve recién cuando su cambio está en disco.
+    """
     
-    def __init__(self, db_path="aida_data.json"):
-        self.db_path = db_path
+    def __init__(self, db_path="aida_data.json", codec: serializers.DocumentCodec | None = None):
+        self.codec = codec or serializers.get_codec()
+        stem, ext = os.path.splitext(db_path)
+        self.db_path = f"{stem}{self.codec.extension}"
+        # Un archivo .jsonl por usuario con sus turnos (aida_data_turns/<chat_id>.jsonl)
+        self.turns_dir = f"{stem}_turns"
+        self.group_commit_window = config.STORAGE_GROUP_COMMIT_MS / 1000
+        self._mutex = threading.Lock()  # protege data y los cambios pendientes
+        self._committed = threading.Condition(self._mutex)
+        self._pending: dict[tuple[str, str], tuple[dict, float]] = {}  # cambios que faltan escribir (y su hora)
+        self._seq = 0  # último cambio recibido
+        self._durable_seq = 0  # último cambio ya en disco
+        self._committing = False
+        self._adopt_newest(stem)
         self._load_db()
 
+    @classmethod
+    def for_shard(cls, index: int, count: int, db_path="aida_data.json") -> "JSONStorage":
+        """
+        Archivo propio de un worker en modo multiproceso (ej: aida_data.shard0of4.json),
+        para que dos procesos nunca reescriban el mismo archivo. Lo arma `reshard`,
+        que el proceso frontal corre antes de levantar los workers.
+        Los turnos siguen en la carpeta común: cada chat pertenece a un solo worker.
+        """
+        stem, ext = os.path.splitext(db_path)
+        storage = cls(f"{stem}.shard{index}of{count}{ext}")
+        storage.turns_dir = f"{stem}_turns"
+        return storage
+
+    @classmethod
+    def reshard(cls, count: int, db_path="aida_data.json"):
+        """
+        Reparte los datos locales en `count` archivos de shard (0 = el archivo principal)
+        si quedaron archivos de otra cantidad de workers o de otro formato. De cada
+        registro gana la copia guardada más tarde (sección _updated; sin ella, la hora
+        del archivo). Los archivos consumidos quedan como <archivo>.migrated, así no
+        vuelven a competir ni los lee la replicación.
+        """
+        from aida_bot.pipeline import shard_for
+        stem, _ = os.path.splitext(db_path)
+        codec = serializers.get_codec()
+        targets = ([f"{stem}{codec.extension}"] if count == 0 else
+                   [f"{stem}.shard{index}of{count}{codec.extension}" for index in range(count)])
+        copies = _local_copies(stem)
+        stale = [path for path in copies if path not in targets]
+        if not stale:
+            return
+
+        records = {"sessions": {}, "profiles": {}}
+        stamps: dict[str, float] = {}
+        for path in copies:
+            with file_lock(path), open(path, 'rb') as f:
+                file_time = os.fstat(f.fileno()).st_mtime
+                data = serializers.loads(f.read())
+            updated = data.get(UPDATED, {})
+            for section in records:
+                for key, value in data.get(section, {}).items():
+                    name = f"{section}/{key}"
+                    saved_at = updated.get(name, file_time)
+                    if saved_at >= stamps.get(name, float("-inf")):
+                        records[section][key], stamps[name] = value, saved_at
+
+        for index, target in enumerate(targets):
+            part = {section: {key: value for key, value in values.items()
+                              if count == 0 or shard_for(int(key), count) == index}
+                    for section, values in records.items()}
+            part[UPDATED] = {f"{section}/{key}": stamps[f"{section}/{key}"]
+                             for section, values in part.items() for key in values}
+            with file_lock(target):
+                atomic_write(target, codec.dumps(part))
+        for path in stale:
+            with file_lock(path):
+                os.replace(path, f"{path}.migrated")
+        print(f"🔁 Datos locales repartidos en {len(targets)} archivo(s) desde {len(copies)} "
+              f"(apartados: {', '.join(os.path.basename(path) for path in stale)})")
+
+    def _adopt_newest(self, stem: str):
+        """
+        El más nuevo de <stem>.json/.msgpack/.cbor pasa a ser el archivo del formato
+        configurado y los otros quedan como .migrated: cambiar STORAGE_FORMAT (o que
+        falte el paquete de un formato binario y se use JSON) nunca vuelve a una copia
+        vieja. Si el más nuevo no se puede leer sin ese paquete, no se arranca.
+        """
+        variants = [f"{stem}{ext}" for ext in (".json", ".msgpack", ".cbor") if os.path.exists(f"{stem}{ext}")]
+        if not variants or variants == [self.db_path]:
+            return
+        newest = max(variants, key=lambda path: file_stamp(path)[0])
+        with file_lock(self.db_path):
+            if newest != self.db_path:
+                with open(newest, 'rb') as f:
+                    data = serializers.loads(f.read())
+                atomic_write(self.db_path, self.codec.dumps(data))
+                print(f"🔁 {newest} migrado a {self.db_path} ({self.codec})")
+            for path in variants:
+                if path != self.db_path:
+                    os.replace(path, f"{path}.migrated")
+
     def _load_db(self):
         if os.path.exists(self.db_path):
-            with open(self.db_path, 'r', encoding='utf-8') as f:
-                self.data = json.load(f)
+            with open(self.db_path, 'rb') as f:
+                self.data = serializers.loads(f.read())
         else:
             self.data = {"sessions": {}, "profiles": {}}
+        # Lo que todavía no se escribió se mantiene encima de lo leído
+        for (section, key), (value, saved_at) in self._pending.items():
+            self.data.setdefault(section, {})[key] = value
+            self.data.setdefault(UPDATED, {})[f"{section}/{key}"] = saved_at
+        self._stamp = file_stamp(self.db_path)
+
+    def _refresh(self):
+        """Recarga el archivo si lo cambió otro proceso (la replicación desde Firestore)."""
+        with self._mutex:
+            if file_stamp(self.db_path) != self._stamp:
+                try:
+                    self._load_db()
+                except ValueError as e:
+                    print(f"[ERROR STORAGE] No se pudo releer {self.db_path}: {e}")
 
     def _save_db(self):
-        with open(self.db_path, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, indent=4, ensure_ascii=False)
+        # Reescribe el archivo completo: su costo crece con la cantidad de usuarios
+        with EXTERNAL_SECONDS.time(service="json_storage"):
+            atomic_write(self.db_path, self.codec.dumps(self.data))
+        self._stamp = file_stamp(self.db_path)
+
+    def _commit(self):
+        """Escribe todos los cambios pendientes en una sola reescritura del archivo."""
+        with file_lock(self.db_path):
+            with self._mutex:
+                if file_stamp(self.db_path) != self._stamp:
+                    self._load_db()  # otro proceso escribió: se parte de su versión
+                pending, self._pending = self._pending, {}
+                seq = self._seq
+                # Copia de un nivel: los registros de `data` son copias propias (ver _save_record)
+                # que nadie modifica; los guardados siguientes los reemplazan
+                snapshot = {section: dict(records) if isinstance(records, dict) else records
+                            for section, records in self.data.items()}
+            try:
+                with EXTERNAL_SECONDS.time(service="json_storage"):
+                    atomic_write(self.db_path, self.codec.dumps(snapshot))
+            except BaseException:
+                with self._mutex:
+                    self._pending = {**pending, **self._pending}
+                raise
+            with self._mutex:
+                self._stamp = file_stamp(self.db_path)
+                self._durable_seq = seq
+        STORAGE_COMMITS.inc(event="commit")
+        STORAGE_COMMITS.inc(len(pending), event="record")
+
+    def _save_record(self, section: str, key: int, value: dict):
+        # Copia propia: SessionManager y ensure_profile siguen modificando su dict
+        # mientras otro hilo lo serializa en _commit
+        value = copy.deepcopy(value)
+        saved_at = time.time()
+        with self._committed:
+            self.data.setdefault(section, {})[str(key)] = value
+            self.data.setdefault(UPDATED, {})[f"{section}/{key}"] = saved_at
+            self._pending[(section, str(key))] = (value, saved_at)
+            self._seq += 1
+            target = self._seq
+            # Si ya hay una escritura en curso, se espera a la próxima (que incluye este cambio)
+            while self._committing and self._durable_seq < target:
+                self._committed.wait()
+            if self._durable_seq >= target:
+                return
+            self._committing = True
+        try:
+            if self.group_commit_window:
+                time.sleep(self.group_commit_window)
+            self._commit()
+        finally:
+            with self._committed:
+                self._committing = False
+                self._committed.notify_all()
+
+    def _get_record(self, section: str, key: int):
+        """Copia del registro: quien lo recibe puede modificarlo sin tocar lo que se está escribiendo."""
+        self._refresh()
+        with self._mutex:
+            return copy.deepcopy(self.data.get(section, {}).get(str(key)))
 
     def get_session(self, chat_id: int) -> dict:
-        return self.data["sessions"].get(str(chat_id), {})
+        return self._get_record("sessions", chat_id) or {}
 
     def save_session(self, chat_id: int, session_data: dict):
-        self.data["sessions"][str(chat_id)] = session_data
-        self._save_db()
+        self._save_record("sessions", chat_id, session_data)
 
     def get_profile(self, user_id: int) -> dict | None:
-        return self.data["profiles"].get(str(user_id))
+        return self._get_record("profiles", user_id)
 
     def save_profile(self, user_id: int, profile_data: dict):
-        self.data["profiles"][str(user_id)] = profile_data
-        self._save_db()
+        self._save_record("profiles", user_id, profile_data)
+
+
+# --- Implementación 1b: un archivo por usuario ---
+
+class ShardedJSONStorage(_TurnLogMixin, AbstractStorage):
+    """
+    Un archivo por usuario en cubetas por hash (aida_data_users/3f/123456.json), con
+    la sesión y el perfil de ese usuario en el mismo formato que JSONStorage.
+
+    Arrancar no lee nada; cada usuario se carga la primera vez que se lo usa y se
+    desaloja de memoria al pasar STORAGE_IDLE_SECONDS sin uso (o si hay más de
+    STORAGE_ACTIVE_USERS cargados). Cada guardado reescribe solo el archivo de ese
+    usuario, en un temporal que después se renombra: un corte a mitad de camino
+    deja la versión anterior, y un archivo dañado afecta a un solo usuario. El lock
+    entre procesos (con la replicación) es uno por cubeta: aida_data_users/3f.lock.
+
+    Con STORAGE_USER_INDEX, los ids de usuario se agregan a un índice binario
+    (index.bin, enteros de 8 bytes) que se recorre con mmap sin listar carpetas.
+    """
+
+    BUCKETS = 256
+
+    def __init__(self, db_path="aida_data.json", codec: serializers.DocumentCodec | None = None,
+                 max_users: int | None = None, idle_seconds: float | None = None, use_index: bool | None = None,
+                 metrics_prefix: str = ""):
+        self.codec = codec or serializers.get_codec()
+        self.metrics_prefix = metrics_prefix
+        stem, _ = os.path.splitext(db_path)
+        self.root = f"{stem}_users"
+        self.turns_dir = f"{stem}_turns"
+        self.index_path = os.path.join(self.root, "index.bin")
+        self.use_index = config.STORAGE_USER_INDEX if use_index is None else use_index
+        # Copias en memoria de los archivos: siempre se escriben en disco al guardar,
+        # así que desalojarlas no pierde nada
+        self._users = LRUCache(max_size=max_users or config.STORAGE_ACTIVE_USERS,
+                               ttl_seconds=idle_seconds or config.STORAGE_IDLE_SECONDS)
+        watch_cache(f"{metrics_prefix}storage_users", self._users)
+        self._locks = [threading.Lock() for _ in range(64)]
+        self._index_lock = threading.Lock()
+        if not os.path.isdir(self.root):
+            self._migrate(db_path)
+            os.makedirs(self.root, exist_ok=True)
+
+    def _migrate(self, db_path: str):
+        """Única vez: reparte el archivo único (si existe) en un archivo por usuario."""
+        stem, _ = os.path.splitext(db_path)
+        candidates = [f"{stem}{self.codec.extension}", db_path]
+        source = next((path for path in candidates if os.path.exists(path)), None)
+        if source is None:
+            return
+        with open(source, 'rb') as f:
+            data = serializers.loads(f.read())
+        users = set(data.get("sessions", {})) | set(data.get("profiles", {}))
+        for key in users:
+            doc = {section: ({key: data[section][key]} if key in data.get(section, {}) else {})
+                   for section in ("sessions", "profiles")}
+            self._write_user(key, doc)
+        # Se aparta el original para que la replicación no lo siga leyendo como fuente
+        os.replace(source, f"{source}.migrated")
+        print(f"🔁 {source} repartido en {len(users)} archivos por usuario en {self.root} "
+              f"(el original quedó como {source}.migrated)")
+
+    def _user_path(self, key: str) -> str:
+        return user_file(self.root, key, self.codec.extension, self.BUCKETS)
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        return self._locks[hash(key) % len(self._locks)]
+
+    def _load_user(self, key: str) -> dict:
+        """Documento del usuario ({"sessions": {...}, "profiles": {...}}), desde memoria o disco."""
+        path = self._user_path(key)
+        stamp = file_stamp(path)
+        cached = self._users.get(key)
+        if cached is not None and cached[1] == stamp:
+            self._users.put(key, cached)  # renueva el tiempo sin uso
+            return cached[0]
+        doc = {"sessions": {}, "profiles": {}}
+        if stamp is not None:
+            try:
+                with open(path, 'rb') as f:
+                    doc = serializers.loads(f.read())
+            except (OSError, ValueError) as e:
+                print(f"[ERROR STORAGE] No se pudo leer {path}: {e}")
+                if cached is not None:
+                    return cached[0]
+        self._users.put(key, (doc, stamp))
+        return doc
+
+    def _write_user(self, key: str, doc: dict) -> list | None:
+        path = self._user_path(key)
+        is_new = not os.path.exists(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with EXTERNAL_SECONDS.time(service="json_storage"):
+            atomic_write(path, self.codec.dumps(doc))
+        if is_new and self.use_index:
+            with self._index_lock:
+                append_user_index(self.root, key)
+        return file_stamp(path)
+
+    def _save_record(self, section: str, key, value: dict):
+        key = str(key)
+        # Copia propia, como en JSONStorage: quien guarda sigue modificando su dict
+        value = copy.deepcopy(value)
+        with self._lock_for(key), file_lock(os.path.dirname(self._user_path(key))):
+            current = self._load_user(key)
+            doc = {**current, section: {**current.get(section, {}), key: value}}
+            self._users.put(key, (doc, self._write_user(key, doc)))
+
+    def _get_record(self, section: str, key) -> dict | None:
+        """Copia del registro: los cambios sin guardar no llegan a la caché ni al archivo."""
+        key = str(key)
+        with self._lock_for(key):
+            return copy.deepcopy(self._load_user(key).get(section, {}).get(key))
+
+    def get_session(self, chat_id: int) -> dict:
+        return self._get_record("sessions", chat_id) or {}
+
+    def save_session(self, chat_id: int, session_data: dict):
+        self._save_record("sessions", chat_id, session_data)
+
+    def get_profile(self, user_id: int) -> dict | None:
+        return self._get_record("profiles", user_id)
+
+    def save_profile(self, user_id: int, profile_data: dict):
+        self._save_record("profiles", user_id, profile_data)
+
+    def user_count(self) -> int:
+        """Cantidad de usuarios guardados, en O(1) con el índice."""
+        if self.use_index and os.path.exists(self.index_path):
+            return os.path.getsize(self.index_path) // _INDEX_RECORD.size
+        return sum(1 for _ in self.user_ids())
+
+    def user_ids(self):
+        """Ids de todos los usuarios guardados (del índice con mmap, o recorriendo las cubetas)."""
+        if self.use_index and os.path.exists(self.index_path) and os.path.getsize(self.index_path):
+            with open(self.index_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as index:
+                usable = len(index) - len(index) % _INDEX_RECORD.size  # un registro cortado se ignora
+                for (user_id,) in _INDEX_RECORD.iter_unpack(index[:usable]):
+                    yield user_id
+            return
+        for bucket in os.scandir(self.root):
+            if bucket.is_dir():
+                for entry in os.scandir(bucket.path):
+                    if entry.name.endswith(self.codec.extension):
+                        name = entry.name[:-len(self.codec.extension)]
+                        yield int(name) if name.lstrip("-").isdigit() else name
+
 
 # --- Implementación 2: Almacenamiento en Firebase ---
 
@@ -68,44 +568,100 @@ class JSONStorage(AbstractStorage):
 class FirebaseStorage(AbstractStorage):
     """Implementación de almacenamiento usando Google Firebase Firestore con estructura organizada."""
     
-    def __init__(self):
-        cred = credentials.Certificate(config.GOOGLE_CREDENTIALS_PATH)
-        if not firebase_admin._apps:  # evita error si se inicializa dos veces
-            firebase_admin.initialize_app(cred)
-        self.db = firestore.client()
+    def __init__(self, db=None, namespace: str | None = None):
+        # `db`: cliente de Firestore ya armado (emulador o doble en memoria para benchmarks)
+        # `namespace`: raíz de un bot en modo multi-tenant (por defecto ENV:BOT_ID)
+        if db is None:
+            cred = credentials.Certificate(config.GOOGLE_CREDENTIALS_PATH)
+            if not firebase_admin._apps:  # evita error si se inicializa dos veces
+                firebase_admin.initialize_app(cred)
+            db = firestore.client()
+        self.db = db
 
         # Carpeta raíz (podes cambiar el nombre si querés)
-        self.root = self.db.collection("bots").document(f"{config.ENV}:{config.BOT_ID}")
+        self.root = self.db.collection("bots").document(namespace or config.NAMESPACE)
         self.sessions_col = self.root.collection("mensajes")
         self.profiles_col = self.root.collection("perfiles")
 
     # ---------- PERFIL (datos persistentes del usuario) ----------
+    # Cada escritura lleva `_updatedAt` para que la replicación resuelva conflictos
+    # (gana la última); al leer se quitan los campos de control.
     def get_profile(self, user_id: int) -> dict | None:
         doc = self.profiles_col.document(str(user_id)).get()
         if doc.exists:
-            return doc.to_dict()
+            return strip_meta(doc.to_dict())
         return None
 
     def save_profile(self, user_id: int, profile_data: dict):
-        self.profiles_col.document(str(user_id)).set(profile_data)
+        self.profiles_col.document(str(user_id)).set({**profile_data, "_updatedAt": time.time()})
 
     # ---------- MENSAJES (historial de conversación) ----------
     def get_session(self, chat_id: int) -> dict:
         doc = self.sessions_col.document(str(chat_id)).get()
         if doc.exists:
-            return doc.to_dict()
+            return strip_meta(doc.to_dict()) or {}
         return {}
 
     def save_session(self, chat_id: int, session_data: dict):
-        self.sessions_col.document(str(chat_id)).set(session_data)
+        self.sessions_col.document(str(chat_id)).set({**session_data, "_updatedAt": time.time()})
+
+    # ---------- TURNOS (un documento por turno en mensajes/{chat_id}/turnos) ----------
+    def _turns_col(self, chat_id: int):
+        return self.sessions_col.document(str(chat_id)).collection("turnos")
+
+    def append_turn(self, chat_id: int, turn: dict):
+        self._turns_col(chat_id).add(turn)
+
+    def get_turns(self, chat_id: int, limit: int | None = None) -> list[dict]:
+        query = self._turns_col(chat_id).order_by("seq", direction=firestore.Query.DESCENDING)
+        if limit:
+            query = query.limit(limit)
+        turns = [doc.to_dict() for doc in query.stream()]
+        if not turns:
+            # Datos viejos: el historial todavía está dentro de la sesión
+            return super().get_turns(chat_id, limit)
+        turns.reverse()
+        return turns
+
+    def clear_turns(self, chat_id: int):
+        for doc in self._turns_col(chat_id).stream():
+            doc.reference.delete()
+        session = self.get_session(chat_id)
+        if session.get("history"):
+            session["history"] = []
+            self.save_session(chat_id, session)
 
 
 # --- Factory (Fábrica) ---
 
-def get_storage_client() -> AbstractStorage:
+def get_storage_client(shard: tuple[int, int] | None = None, tenant=None) -> AbstractStorage:
+    """
+    `shard=(índice, cantidad)` en los workers del modo multiproceso.
+    `tenant`: bot del modo multi-tenant (aida_bot.tenants.Tenant), con su archivo y su raíz en Firestore.
+    """
+    data_path = tenant.data_path if tenant else "aida_data.json"
+    prefix = tenant.metrics_prefix if tenant else ""
     path = getattr(config, "GOOGLE_CREDENTIALS_PATH", "")
     if not path or not os.path.exists(path):
-        print(f"💾 Usando almacenamiento local (JSON) (no se encontró GOOGLE_CREDENTIALS_PATH='{path}')")
-        return JSONStorage()
-    print(f"☁️ Usando Firebase Cloud Storage (encontrado: {path})")
-    return FirebaseStorage()
+        print(f"💾 Usando almacenamiento local (JSON) en {data_path} (no se encontró GOOGLE_CREDENTIALS_PATH='{path}')")
+        if config.STORAGE_LAYOUT == "per_user":
+            # Cada chat tiene su propio archivo: los workers no necesitan uno por shard
+            return ShardedJSONStorage(data_path, metrics_prefix=prefix)
+        if shard:
+            storage = JSONStorage.for_shard(*shard, db_path=data_path)
+        else:
+            JSONStorage.reshard(0, data_path)  # vuelve al archivo único lo que quedó en shards
+            storage = JSONStorage(data_path)
+    else:
+        print(f"☁️ Usando Firebase Cloud Storage (encontrado: {path})")
+        storage = FirebaseStorage(namespace=tenant.namespace if tenant else None)
+    storage.metrics_prefix = prefix
+    return storage
+
+
+def prepare_shards(count: int, data_path="aida_data.json"):
+    """Proceso frontal del modo multiproceso: arma los archivos de los workers (ver JSONStorage.reshard)."""
+    path = getattr(config, "GOOGLE_CREDENTIALS_PATH", "")
+    if (path and os.path.exists(path)) or config.STORAGE_LAYOUT == "per_user":
+        return
+    JSONStorage.reshard(count, data_path)
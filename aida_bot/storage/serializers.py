@@ -0,0 +1,266 @@
+# aida_bot/storage/serializers.py
+"""
+Formatos del archivo local de sesiones y perfiles (JSONStorage).
+
+  * json         JSON compacto (por defecto).
+  * json-pretty  JSON con sangría, como el formato original (más cómodo de leer a mano).
+  * msgpack      MessagePack, binario (requiere el paquete `msgpack`).
+  * cbor         CBOR, binario (requiere el paquete `cbor2`).
+
+Opciones del esquema 2:
+  * Fechas de los turnos (`ts`) como segundos epoch enteros en lugar de texto ISO.
+  * Historiales de sesión (`history`) comprimidos con zstd (solo en formatos binarios,
+    requiere el paquete `zstandard`).
+
+Los archivos binarios empiezan con b"AIDA" + versión de esquema + formato + opciones.
+Un JSON con esas opciones lleva "_schema" y "_flags" en la raíz; un JSON sin ellos es
+del esquema 1 (el formato original) y se migra al leerlo. Al leer, el formato se
+detecta por el contenido. Al cambiar STORAGE_FORMAT, JSONStorage toma el archivo más
+nuevo de cualquier formato y aparta los otros como .migrated (ver _adopt_newest).
+"""
+import calendar
+import json
+import re
+import time
+from aida_bot import config
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SCHEMA_VERSION = 2
+MAGIC = b"AIDA"
+FLAG_EPOCH_TS = 1
+FLAG_ZSTD_HISTORY = 2
+
+_ISO_TS = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z$")
+
+
+# --- Formatos ---
+
+class Serializer:
+    name = ""
+    format_id = 0
+    extension = ""
+    binary = False
+
+    def encode(self, obj) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, raw: bytes):
+        raise NotImplementedError
+
+
+class JSONSerializer(Serializer):
+    format_id = 1
+    extension = ".json"
+
+    def __init__(self, pretty: bool = False):
+        self.name = "json-pretty" if pretty else "json"
+        self._options = {"indent": 4} if pretty else {"separators": (",", ":")}
+
+    def encode(self, obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, **self._options).encode("utf-8")
+
+    def decode(self, raw: bytes):
+        return json.loads(raw)
+
+
+class MsgPackSerializer(Serializer):
+    name = "msgpack"
+    format_id = 2
+    extension = ".msgpack"
+    binary = True
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImportError("Falta el paquete msgpack (pip install msgpack)")
+
+    def encode(self, obj) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def decode(self, raw: bytes):
+        # strict_map_key=False: las claves de los chats pueden venir como números
+        return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+
+
+class CBORSerializer(Serializer):
+    name = "cbor"
+    format_id = 3
+    extension = ".cbor"
+    binary = True
+
+    def __init__(self):
+        if cbor2 is None:
+            raise ImportError("Falta el paquete cbor2 (pip install cbor2)")
+
+    def encode(self, obj) -> bytes:
+        return cbor2.dumps(obj)
+
+    def decode(self, raw: bytes):
+        return cbor2.loads(raw)
+
+
+_SERIALIZERS = {
+    "json": lambda: JSONSerializer(),
+    "json-pretty": lambda: JSONSerializer(pretty=True),
+    "msgpack": MsgPackSerializer,
+    "cbor": CBORSerializer,
+}
+_BY_FORMAT_ID = {1: "json", 2: "msgpack", 3: "cbor"}
+
+
+# --- Transformaciones del esquema 2 ---
+
+def _iso_to_epoch(value):
+    # Cortes fijos en lugar de strptime: es el camino caliente al guardar historiales largos
+    if isinstance(value, str) and len(value) == 20 and _ISO_TS.match(value):
+        return calendar.timegm((int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                                int(value[11:13]), int(value[14:16]), int(value[17:19])))
+    return value
+
+
+def _epoch_to_iso(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return "%04d-%02d-%02dT%02d:%02d:%02dZ" % time.gmtime(value)[:6]
+    return value
+
+
+def _map_histories(data: dict, fn) -> dict:
+    """Copia de `data` con `fn(history)` aplicada a cada historial de sesión."""
+    sessions = data.get("sessions")
+    if not sessions:
+        return data
+    mapped = {}
+    for chat_id, session in sessions.items():
+        if isinstance(session, dict) and "history" in session:
+            session = {**session, "history": fn(session["history"])}
+        mapped[chat_id] = session
+    return {**data, "sessions": mapped}
+
+
+def _map_turn_ts(history, fn):
+    if not isinstance(history, list):
+        return history
+    return [{**turn, "ts": fn(turn["ts"])} if isinstance(turn, dict) and "ts" in turn else turn
+            for turn in history]
+
+
+# --- Migraciones entre versiones de esquema (versión de origen -> función) ---
+
+def _migrate_v1(data: dict) -> dict:
+    # Esquema 1: JSON con sangría; mismos datos, solo cambia cómo se guardan
+    data.setdefault("sessions", {})
+    data.setdefault("profiles", {})
+    return data
+
+
+_MIGRATIONS = {1: _migrate_v1}
+
+
+class DocumentCodec:
+    """Serializa el documento completo de JSONStorage ({"sessions": ..., "profiles": ...})."""
+
+    def __init__(self, serializer: Serializer, epoch_timestamps: bool = False,
+                 compress_history: bool = False, zstd_level: int = 3):
+        self.serializer = serializer
+        self.epoch_timestamps = epoch_timestamps
+        self.compress_history = compress_history and serializer.binary
+        if self.compress_history and zstandard is None:
+            raise ImportError("Falta el paquete zstandard (pip install zstandard)")
+        self.zstd_level = zstd_level
+
+    @property
+    def extension(self) -> str:
+        return self.serializer.extension
+
+    @property
+    def flags(self) -> int:
+        return (FLAG_EPOCH_TS if self.epoch_timestamps else 0) | (FLAG_ZSTD_HISTORY if self.compress_history else 0)
+
+    def dumps(self, data: dict) -> bytes:
+        flags = self.flags
+        if flags & FLAG_EPOCH_TS:
+            data = _map_histories(data, lambda h: _map_turn_ts(h, _iso_to_epoch))
+        if flags & FLAG_ZSTD_HISTORY:
+            compressor = zstandard.ZstdCompressor(level=self.zstd_level)
+            data = _map_histories(data, lambda h: compressor.compress(self.serializer.encode(h)) if h else h)
+        if self.serializer.binary:
+            header = MAGIC + bytes((SCHEMA_VERSION, self.serializer.format_id, flags))
+            return header + self.serializer.encode(data)
+        if flags:
+            data = {"_schema": SCHEMA_VERSION, "_flags": flags, **data}
+        return self.serializer.encode(data)
+
+    def __repr__(self):
+        extras = [n for n, on in (("epoch", self.epoch_timestamps), ("zstd", self.compress_history)) if on]
+        return f"{self.serializer.name}{'+' + '+'.join(extras) if extras else ''}"
+
+
+def loads(raw: bytes) -> dict:
+    """Lee un documento en cualquier formato y versión de esquema conocidos."""
+    if raw.startswith(MAGIC):
+        schema, format_id, flags = raw[4], raw[5], raw[6]
+        name = _BY_FORMAT_ID.get(format_id)
+        if name is None:
+            raise ValueError(f"Formato de almacenamiento desconocido: {format_id}")
+        serializer = _SERIALIZERS[name]()
+        data = serializer.decode(raw[7:])
+    else:
+        serializer = JSONSerializer()
+        data = serializer.decode(raw) if raw.strip() else {}
+        schema = data.pop("_schema", 1)
+        flags = data.pop("_flags", 0)
+
+    if schema > SCHEMA_VERSION:
+        raise ValueError(f"El archivo usa el esquema {schema}, más nuevo que el soportado ({SCHEMA_VERSION})")
+    if flags & FLAG_ZSTD_HISTORY:
+        if zstandard is None:
+            raise ImportError("El archivo tiene historiales comprimidos: falta el paquete zstandard")
+        decompressor = zstandard.ZstdDecompressor()
+        data = _map_histories(data, lambda h: serializer.decode(decompressor.decompress(h))
+                              if isinstance(h, bytes) else h)
+    if flags & FLAG_EPOCH_TS:
+        data = _map_histories(data, lambda h: _map_turn_ts(h, _epoch_to_iso))
+    while schema < SCHEMA_VERSION:
+        data = _MIGRATIONS.get(schema, lambda d: d)(data)
+        schema += 1
+    return data
+
+
+def get_codec(fmt: str | None = None, epoch_timestamps: bool | None = None,
+              compress_history: bool | None = None) -> DocumentCodec:
+    """Codec configurado (STORAGE_*). Si falta un paquete opcional, se usa JSON compacto."""
+    fmt = fmt or config.STORAGE_FORMAT
+    epoch_timestamps = config.STORAGE_EPOCH_TIMESTAMPS if epoch_timestamps is None else epoch_timestamps
+    compress_history = config.STORAGE_COMPRESS_HISTORY if compress_history is None else compress_history
+    if fmt not in _SERIALIZERS:
+        print(f"⚠️ STORAGE_FORMAT='{fmt}' no existe; se usa json.")
+        fmt = "json"
+    try:
+        return DocumentCodec(_SERIALIZERS[fmt](), epoch_timestamps, compress_history, config.STORAGE_ZSTD_LEVEL)
+    except ImportError as e:
+        print(f"⚠️ {e}; se guarda en JSON compacto.")
+        return DocumentCodec(JSONSerializer(), epoch_timestamps)
+
+
+def codec_for_path(path: str) -> DocumentCodec:
+    """El codec configurado si coincide con la extensión del archivo; si no, el de esa extensión."""
+    codec = get_codec()
+    if path.endswith(codec.extension):
+        return codec
+    for name in ("msgpack", "cbor"):
+        if path.endswith(f".{name}"):
+            return get_codec(name)
+    return get_codec("json-pretty", epoch_timestamps=False, compress_history=False)
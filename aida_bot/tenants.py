@@ -0,0 +1,99 @@
+# aida_bot/tenants.py
+"""
+Varios bots de Telegram en un mismo proceso (multi-tenant).
+
+Cada bot (tenant) tiene su token, su namespace (`ENV:BOT_ID`, la raíz en
+Firestore), su archivo local de datos y su dataset de preguntas frecuentes.
+Los servicios pesados (Whisper, el modelo de sentimiento) se cargan una sola
+vez y los comparten todos.
+
+Se activa con BOT_TENANTS_FILE, un JSON con una lista de bots:
+
+    [
+        {"bot_id": "aida_ar", "token_env": "TELEGRAM_TOKEN_AR"},
+        {"bot_id": "aida_mx", "token_env": "TELEGRAM_TOKEN_MX",
+         "dataset": "datasets/mx.json", "data_path": "datos/aida_mx.json"}
+    ]
+
+Campos: `bot_id` (obligatorio), `token` o `token_env` (variable de entorno con
+el token, para no dejarlo en el archivo), y opcionales `env`, `data_path`,
+`dataset`, `webhook_path` y `webhook_secret`. Sin BOT_TENANTS_FILE hay un solo
+bot, el de TELEGRAM_TOKEN/BOT_ID, y nada cambia.
+"""
+import json
+import os
+from aida_bot import config
+
+
+class Tenant:
+    """Identidad de un bot y dónde guarda sus datos."""
+
+    def __init__(self, bot_id: str, token: str, env: str | None = None, data_path: str | None = None,
+                 dataset_path: str | None = None, webhook_path: str | None = None,
+                 webhook_secret: str | None = None):
+        self.bot_id = bot_id
+        self.token = token
+        self.env = env or config.ENV
+        self.namespace = f"{self.env}:{bot_id}"
+        self.data_path = data_path or self.path_for("aida_data.json")
+        self.dataset_path = dataset_path  # None = el dataset incluido (storage/dataset.json)
+        self.webhook_path = webhook_path or (config.WEBHOOK_PATH if self.is_default
+                                             else f"{config.WEBHOOK_PATH.rstrip('/')}/{bot_id}")
+        self.webhook_secret = webhook_secret
+
+    @property
+    def is_default(self) -> bool:
+        """El bot configurado con BOT_ID/ENV: conserva los nombres de archivo de siempre."""
+        return self.namespace == config.NAMESPACE
+
+    @property
+    def metrics_prefix(self) -> str:
+        """Prefijo de sus cachés en /metrics (aida_ar/response_memory); vacío para el bot por defecto."""
+        return "" if self.is_default else f"{self.bot_id}/"
+
+    def path_for(self, path: str) -> str:
+        """Versión propia de un archivo compartido (aida_data.json -> aida_data_aida_ar.json)."""
+        if not path or self.is_default:
+            return path
+        stem, ext = os.path.splitext(path)
+        return f"{stem}_{self.bot_id}{ext}"
+
+    def __repr__(self):
+        return f"Tenant({self.namespace})"
+
+
+def default_tenant() -> Tenant:
+    return Tenant(config.BOT_ID, config.TELEGRAM_TOKEN, data_path="aida_data.json")
+
+
+def load_tenants(path: str | None = None) -> list[Tenant]:
+    """Bots de BOT_TENANTS_FILE, o solo el configurado con TELEGRAM_TOKEN si no hay archivo."""
+    path = config.BOT_TENANTS_FILE if path is None else path
+    if not path:
+        return [default_tenant()]
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+
+    tenants, seen = [], set()
+    for entry in entries:
+        bot_id = entry.get("bot_id")
+        token = entry.get("token") or os.getenv(entry.get("token_env", ""), "")
+        if not bot_id or not token:
+            raise ValueError(f"❌ Bot sin bot_id o sin token en {path}: {entry.get('bot_id', entry)}")
+        tenant = Tenant(bot_id, token, env=entry.get("env"), data_path=entry.get("data_path"),
+                        dataset_path=entry.get("dataset"), webhook_path=entry.get("webhook_path"),
+                        webhook_secret=entry.get("webhook_secret"))
+        if tenant.namespace in seen:
+            raise ValueError(f"❌ Bot repetido en {path}: {tenant.namespace}")
+        seen.add(tenant.namespace)
+        tenants.append(tenant)
+    if not tenants:
+        raise ValueError(f"❌ {path} no tiene ningún bot")
+    return tenants
+
+
+def find_tenant(bot_id: str) -> Tenant:
+    for tenant in load_tenants():
+        if tenant.bot_id == bot_id:
+            return tenant
+    raise ValueError(f"❌ No hay ningún bot '{bot_id}' en BOT_TENANTS_FILE")
@@ -0,0 +1,161 @@
+# aida_bot/webhook.py
+import hmac
+import secrets
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from telebot import types
+from aida_bot import config
+from aida_bot.pipeline import ChatDispatcher
+from aida_bot import metrics
+from aida_bot.resilience import breaker_stats
+
+MAX_BODY_BYTES = 1024 * 1024  # una actualización de Telegram no se acerca a esto
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    server_version = "AIDAWebhook/1.0"
+
+    def log_message(self, format, *args):
+        pass  # sin una línea de log por cada pedido
+
+    def _reply(self, status: int, body: bytes = b""):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        # El puerto del webhook está expuesto a internet: /metrics y /healthz
+        # se sirven solo en el servidor de métricas (METRICS_HOST:METRICS_PORT)
+        self._reply(404)
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_BODY_BYTES:
+            self.close_connection = True
+            self._reply(413)
+            return
+        # Se lee el cuerpo siempre, así la conexión queda limpia aunque se rechace el pedido
+        body = self.rfile.read(length)
+
+        webhook = self.server.routes.get(self.path)
+        if webhook is None:
+            self._reply(404)
+            return
+
+        token = self.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(token.encode("utf-8"), webhook.secret_token.encode("utf-8")):
+            with webhook._lock:
+                webhook.rejected += 1
+            self._reply(403)
+            return
+
+        try:
+            update = types.Update.de_json(body.decode("utf-8"))
+        except Exception as e:
+            print(f"[ERROR WEBHOOK] Actualización inválida: {e}")
+            self._reply(400)
+            return
+
+        # Se confirma a Telegram apenas la actualización entra en la cola;
+        # si la cola está llena, Telegram la reintenta más tarde.
+        self._reply(200 if webhook.enqueue(update) else 503)
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # Telegram abre varias conexiones a la vez (el valor por defecto es 5)
+
+    def __init__(self, address):
+        super().__init__(address, _WebhookHandler)
+        self.routes: dict[str, "WebhookServer"] = {}  # ruta -> bot (varios bots comparten el puerto)
+
+
+# Un servidor HTTP por (host, puerto), compartido por los bots del modo multi-tenant
+_servers: dict[tuple[str, int], _HTTPServer] = {}
+_servers_lock = threading.Lock()
+
+
+class WebhookServer:
+    """
+    Recibe las actualizaciones de Telegram por HTTP (webhook) en lugar de long polling.
+    Valida el token secreto, encola la actualización y responde enseguida; los hilos
+    de trabajo la procesan después con `bot.process_new_updates`.
+    Cada chat va siempre a la misma cola, así sus mensajes se atienden en orden.
+    Varios bots en el mismo host y puerto comparten el servidor HTTP, cada uno en su ruta.
+    """
+
+    def __init__(self, bot, host: str | None = None, port: int | None = None, path: str | None = None,
+                 secret_token: str | None = None, workers: int | None = None, queue_size: int | None = None,
+                 process=None, name: str = "aida"):
+        self.bot = bot
+        self.name = name
+        self.host = host or config.WEBHOOK_HOST
+        self.port = config.WEBHOOK_PORT if port is None else port
+        self.path = path or config.WEBHOOK_PATH
+        self.secret_token = secret_token or config.WEBHOOK_SECRET or secrets.token_urlsafe(32)
+        self.workers = workers or config.WEBHOOK_WORKERS
+        queue_size = queue_size or config.WEBHOOK_QUEUE_SIZE
+
+        # `process` reemplaza a bot.process_new_updates (ej: el proceso frontal del modo multiproceso)
+        self.dispatcher = ChatDispatcher(process or bot.process_new_updates, workers=self.workers,
+                                         queue_size=queue_size, name=f"{name}-webhook")
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._httpd: _HTTPServer | None = None
+
+    def enqueue(self, update) -> bool:
+        return self.dispatcher.submit(update)
+
+    def stats(self) -> dict:
+        stats = self.dispatcher.stats()
+        with self._lock:
+            stats["rejected"] = self.rejected
+        stats["breakers"] = breaker_stats()
+        return stats
+
+    def start(self):
+        """Levanta los hilos de trabajo y el servidor HTTP (en segundo plano)."""
+        self.dispatcher.start()
+
+        with _servers_lock:
+            httpd = _servers.get((self.host, self.port)) if self.port else None
+            if httpd is None:
+                httpd = _HTTPServer((self.host, self.port))
+                self.port = httpd.server_address[1]  # por si se pidió el puerto 0
+                _servers[(self.host, self.port)] = httpd
+                threading.Thread(target=httpd.serve_forever, daemon=True, name="aida-webhook-http").start()
+            if self.path in httpd.routes:
+                raise ValueError(f"❌ La ruta {self.path} ya la usa el bot {httpd.routes[self.path].name}")
+            httpd.routes[self.path] = self
+            self._httpd = httpd
+        metrics.watch_health(self.name, self.stats)
+        print(f"✅ Webhook escuchando en http://{self.host}:{self.port}{self.path}")
+
+    def register(self, public_url: str | None = None):
+        """Le indica a Telegram la URL pública del webhook (si está configurada)."""
+        public_url = public_url or config.WEBHOOK_URL
+        if not public_url:
+            print("⚠️ WEBHOOK_URL vacío: no se registra el webhook en Telegram (solo pruebas locales).")
+            return
+        self.bot.remove_webhook()
+        self.bot.set_webhook(url=public_url.rstrip("/") + self.path, secret_token=self.secret_token,
+                             max_connections=config.WEBHOOK_MAX_CONNECTIONS)
+
+    def stop(self):
+        metrics.unwatch_health(self.name)
+        if self._httpd:
+            with _servers_lock:
+                self._httpd.routes.pop(self.path, None)
+                last = not self._httpd.routes
+                if last:
+                    _servers.pop((self.host, self.port), None)
+            if last:
+                self._httpd.shutdown()
+                self._httpd.server_close()
+            self._httpd = None
+        self.dispatcher.stop()
@@ -0,0 +1,78 @@
+# benchmarks/bench_langid.py
+"""
+Compara el motor de n-gramas con langdetect en mensajes cortos
+en español, inglés y portugués (precisión, tiempo de carga y por llamada).
+
+Uso:
+    python benchmarks/bench_langid.py [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("TELEGRAM_TOKEN", "benchmark")
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+from aida_bot.services.language_service import LangdetectBackend, NgramLanguageModel  # noqa: E402
+
+# Mensajes cortos y típicos de los usuarios (no están en el corpus de entrenamiento)
+SAMPLES = [
+    ("es", "hola"), ("es", "gracias!"), ("es", "no me anda el wifi"),
+    ("es", "¿cómo mando un audio?"), ("es", "quiero hablar con mi hija"),
+    ("es", "se me trabó la pantalla"), ("es", "buenas tardes aida"),
+    ("es", "no entiendo nada"), ("es", "cómo hago una captura"),
+    ("es", "me llegó un mail del banco"),
+    ("en", "hello"), ("en", "thanks a lot!"), ("en", "my wifi is not working"),
+    ("en", "how do I send a voice note?"), ("en", "I want to call my daughter"),
+    ("en", "the screen froze"), ("en", "good afternoon"),
+    ("en", "I don't understand anything"), ("en", "how do I take a screenshot"),
+    ("en", "I got an email from the bank"),
+    ("pt", "olá"), ("pt", "muito obrigado!"), ("pt", "meu wifi não funciona"),
+    ("pt", "como mando um áudio?"), ("pt", "quero falar com a minha filha"),
+    ("pt", "a tela travou"), ("pt", "boa tarde"),
+    ("pt", "não entendo nada"), ("pt", "como eu tiro um print"),
+    ("pt", "recebi um e-mail do banco"),
+]
+
+
+def run(name, factory, repeat):
+    start = time.perf_counter()
+    engine = factory()
+    load_ms = (time.perf_counter() - start) * 1000
+
+    correct = 0
+    unstable = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for expected, text in SAMPLES:
+            lang, _ = engine.predict(text)
+            correct += lang == expected
+    per_call_us = (time.perf_counter() - start) / (repeat * len(SAMPLES)) * 1e6
+
+    # Estabilidad: el mismo texto debería dar siempre el mismo idioma
+    for _, text in SAMPLES:
+        if len({engine.predict(text)[0] for _ in range(5)}) > 1:
+            unstable += 1
+
+    accuracy = correct / (repeat * len(SAMPLES))
+    print(f"{name:<12} carga={load_ms:8.1f} ms  llamada={per_call_us:8.1f} µs  "
+          f"precisión={accuracy:6.1%}  textos inestables={unstable}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{len(SAMPLES)} mensajes cortos (es/en/pt), {args.repeat} repeticiones\n")
+    run("ngram", NgramLanguageModel, args.repeat)
+    try:
+        run("langdetect", LangdetectBackend, args.repeat)
+    except ImportError:
+        print("langdetect no está instalado: se omite la comparación.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# benchmarks/bench_prompt_format.py
+"""
+Compara el formato anterior (contexto aplanado en un solo mensaje) con el
+formato chat nativo (system fijo + historial como mensajes user/assistant).
+
+Por cada turno de una conversación sintética mide:
+  * tokens del prompt (estimados, o los que informa Groq con --live)
+  * prefijo compartido con el pedido anterior (lo que puede reutilizar
+    la caché de prefijos del proveedor)
+  * latencia de la llamada (solo con --live)
+
+Uso:
+    python benchmarks/bench_prompt_format.py [--turns 30] [--live]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("TELEGRAM_TOKEN", "benchmark")
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+import requests  # noqa: E402
+from aida_bot import config  # noqa: E402
+from aida_bot.memory import estimate_tokens, save_turn  # noqa: E402
+from aida_bot.services.nlu_service import NLUService  # noqa: E402
+from aida_bot.storage.database import JSONStorage  # noqa: E402
+
+USER_ID = 424242
+
+
+def _serialize(messages) -> str:
+    return "".join(f"<{m['role']}>{m['content']}" for m in messages)
+
+
+def _shared_prefix(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def _conversation(turns: int):
+    dataset_path = os.path.join(os.path.dirname(__file__), "..", "aida_bot", "storage", "dataset.json")
+    with open(dataset_path, "r", encoding="utf-8") as f:
+        dataset = json.load(f)
+    return [(dataset[i % len(dataset)]["question"], dataset[i % len(dataset)]["answer"]) for i in range(turns)]
+
+
+def _call(nlu, messages):
+    headers = {"Authorization": f"Bearer {nlu.api_key}", "Content-Type": "application/json"}
+    data = {"model": nlu.model, "messages": messages, "max_tokens": 150}
+    start = time.perf_counter()
+    resp = requests.post(nlu.api_url, headers=headers, json=data, timeout=30)
+    latency = time.perf_counter() - start
+    resp.raise_for_status()
+    usage = resp.json().get("usage", {})
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+    return usage.get("prompt_tokens", 0), cached, latency
+
+
+def run(chat_format: str, conversation, live: bool) -> dict:
+    storage = JSONStorage(os.path.join(tempfile.mkdtemp(), "bench.json"))
+    storage.save_profile(USER_ID, {"displayName": "Ana", "autonomia": "B", "foco": "A", "entorno": "B"})
+    nlu = NLUService(api_key=config.GROQ_API_KEY, api_url=config.GROQ_API_URL, storage=storage)
+    nlu.chat_format = chat_format
+
+    rows = []
+    previous = ""
+    for question, answer in conversation:
+        messages = nlu.build_messages(question, USER_ID)
+        serialized = _serialize(messages)
+        row = {
+            "prompt_tokens": sum(estimate_tokens(m["content"]) for m in messages),
+            "shared_prefix_tokens": _shared_prefix(previous, serialized) // 4,
+        }
+        if live:
+            row["prompt_tokens"], row["cached_tokens"], row["latency_s"] = _call(nlu, messages)
+        rows.append(row)
+        previous = serialized
+        save_turn(USER_ID, "user", question, storage=storage)
+        save_turn(USER_ID, "assistant", answer, storage=storage)
+
+    total = sum(r["prompt_tokens"] for r in rows)
+    shared = sum(r["shared_prefix_tokens"] for r in rows)
+    summary = {
+        "format": chat_format,
+        "avg_prompt_tokens": total / len(rows),
+        "last_prompt_tokens": rows[-1]["prompt_tokens"],
+        "shared_prefix_ratio": shared / total if total else 0.0,
+    }
+    if live:
+        summary["avg_latency_s"] = sum(r["latency_s"] for r in rows) / len(rows)
+        summary["cached_tokens"] = sum(r["cached_tokens"] for r in rows)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--live", action="store_true", help="Llama de verdad a GROQ_API_URL (usa la API key del .env)")
+    args = parser.parse_args()
+
+    conversation = _conversation(args.turns)
+    for chat_format in ("flat", "messages"):
+        print(json.dumps(run(chat_format, conversation, args.live), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# benchmarks/bench_serializers.py
+"""
+Compara los formatos del archivo local (aida_bot/storage/serializers.py) sobre
+datos realistas: perfiles de onboarding y sesiones con historiales de conversación
+(turnos en castellano con fecha ISO, como los arma memory.py).
+
+Para cada formato mide el tamaño del archivo y el tiempo de codificar (lo que paga
+cada save_profile/save_session de JSONStorage) y de decodificar (arranque). La
+referencia es json-pretty, el formato original con indent=4.
+
+Uso:
+    python benchmarks/bench_serializers.py [--users 2000] [--history 0,20,200] [--repeat 5] [--output r.json]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("TELEGRAM_TOKEN", "benchmark")
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+from aida_bot.storage import serializers  # noqa: E402
+from webhook_harness import SAMPLE_TEXTS  # noqa: E402
+
+REPLIES = [
+    "¡Claro! Primero abrí WhatsApp y tocá los tres puntitos arriba a la derecha. Después elegí 'Ajustes'.",
+    "No te preocupes, es normal. Ese mensaje parece una estafa: no toques el enlace ni compartas tu código.",
+    "Para hacer una videollamada, entrá al chat de la persona y tocá el ícono de la cámara arriba.",
+    "Muy bien. Si querés, te lo explico paso a paso con calma. ¿Qué celular tenés?",
+]
+
+VARIANTS = [
+    ("json-pretty", False, False),
+    ("json", False, False),
+    ("json", True, False),
+    ("msgpack", False, False),
+    ("msgpack", True, False),
+    ("msgpack", False, True),
+    ("msgpack", True, True),
+    ("cbor", False, False),
+    ("cbor", True, True),
+]
+
+
+def make_data(users: int, history: int, seed: int) -> dict:
+    rnd = random.Random(seed)
+    start = 1735689600  # 2025-01-01
+    profiles, sessions = {}, {}
+    for uid in range(users):
+        chat_id = str(100000000 + uid * 7919)
+        profiles[chat_id] = {"displayName": f"Usuario {uid}", "autonomia": rnd.choice("ABC"),
+                             "foco": rnd.choice("ABCD"), "entorno": rnd.choice("AB"), "idioma": "es",
+                             "contacto_emergencia": f"familia{uid}@example.com"}
+        turns, ts = [], start + rnd.randint(0, 86400 * 30)
+        for seq in range(history):
+            ts += rnd.randint(5, 600)
+            role = "user" if seq % 2 == 0 else "assistant"
+            text = rnd.choice(SAMPLE_TEXTS if role == "user" else REPLIES)
+            turns.append({"role": role, "text": text,
+                          "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(ts)), "seq": seq})
+        sessions[chat_id] = {"responder_con_audio": uid % 3 == 0, "tts_voice": "es-AR-ElenaNeural",
+                             "history": turns}
+    return {"sessions": sessions, "profiles": profiles}
+
+
+def _timed(fn, repeat: int) -> tuple[float, object]:
+    samples, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - t0)
+    return 1000 * statistics.median(samples), result
+
+
+def run_case(users: int, history: int, args) -> list[dict]:
+    data = make_data(users, history, args.seed)
+    rows, baseline = [], None
+    for fmt, epoch, zstd in VARIANTS:
+        try:
+            codec = serializers.DocumentCodec(serializers._SERIALIZERS[fmt](), epoch, zstd)
+        except ImportError as e:
+            print(f"  (se omite {fmt}: {e})")
+            continue
+        encode_ms, raw = _timed(lambda: codec.dumps(data), args.repeat)
+        decode_ms, decoded = _timed(lambda: serializers.loads(raw), args.repeat)
+        if decoded != data:
+            raise AssertionError(f"{codec}: los datos no vuelven iguales")
+        row = {"codec": repr(codec), "bytes": len(raw), "encode_ms": round(encode_ms, 2),
+               "decode_ms": round(decode_ms, 2)}
+        baseline = baseline or row
+        row["size_vs_pretty"] = round(row["bytes"] / baseline["bytes"], 3)
+        row["encode_vs_pretty"] = round(row["encode_ms"] / baseline["encode_ms"], 3)
+        row["decode_vs_pretty"] = round(row["decode_ms"] / baseline["decode_ms"], 3)
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--history", default="0,20,200", help="turnos por sesión (historial dentro de la sesión)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="guardar los resultados en JSON")
+    args = parser.parse_args()
+
+    cases = []
+    for history in (int(h) for h in args.history.split(",")):
+        print(f"\nusuarios={args.users} historial={history}")
+        rows = run_case(args.users, history, args)
+        for r in rows:
+            print(f"  {r['codec']:<20} {r['bytes'] / 1e6:>8.2f} MB ({r['size_vs_pretty']:>5.0%})  "
+                  f"codificar {r['encode_ms']:>8.1f} ms ({r['encode_vs_pretty']:>5.0%})  "
+                  f"decodificar {r['decode_ms']:>8.1f} ms ({r['decode_vs_pretty']:>5.0%})")
+        cases.append({"users": args.users, "history": history, "results": rows})
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "cases": cases}, f, indent=2, ensure_ascii=False)
+        print(f"\n✅ Resultado guardado en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+# benchmarks/bench_storage.py
+"""
+Micro-benchmarks de los backends de almacenamiento y de los helpers de memory.py.
+
+Para cada backend, cantidad de usuarios y largo de historial mide la latencia
+(p50/p95) y las operaciones por segundo de:
+  * get/save_profile, get/save_session, append_turn, get_turns(12)
+  * memory.ensure_profile, memory.save_turn, memory.build_llm_context
+  * carga en frío del historial de un usuario (TurnStore nuevo)
+y, para JSON, el tamaño de los archivos, el costo de reescribirlos con y sin fsync
+y los guardados por segundo con --threads hilos a la vez (group commit).
+El backend "sharded" (un archivo por usuario) mide además cuánto tarda en abrirse.
+
+Firestore se reemplaza por un doble en memoria (benchmarks/fake_firestore.py);
+--firestore-rtt-ms agrega una ida y vuelta simulada por operación, y --emulator
+usa el emulador oficial (FIRESTORE_EMULATOR_HOST) con google-cloud-firestore.
+
+Uso:
+    python benchmarks/bench_storage.py [--users 10,1000,10000,100000] [--history 0,12,200]
+        [--backends json,sharded,firestore] [--ops 100] [--firestore-rtt-ms 0] [--output resultado.json]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("TELEGRAM_TOKEN", "benchmark")
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+from aida_bot import memory  # noqa: E402
+from aida_bot.storage.database import FirebaseStorage, JSONStorage, ShardedJSONStorage  # noqa: E402
+from fake_firestore import FakeFirestore  # noqa: E402
+
+SAMPLE_USERS = 64  # usuarios sobre los que se mide (el resto solo ocupa lugar)
+
+
+def _profile(uid: int) -> dict:
+    return {"displayName": f"Usuario {uid}", "autonomia": "media", "foco": "whatsapp",
+            "entorno": "con familia", "idioma": "es", "contacto_emergencia": f"familia{uid}@example.com"}
+
+
+def _session(uid: int) -> dict:
+    return {"responder_con_audio": uid % 2 == 0, "tts_voice": "es-AR-ElenaNeural"}
+
+
+def _turn(seq: int) -> dict:
+    role = "user" if seq % 2 == 0 else "assistant"
+    return {"role": role, "text": f"Mensaje de prueba número {seq} sobre cómo usar el celular.",
+            "ts": "2025-01-01T12:00:00Z", "seq": seq}
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def make_backend(name: str, users: int, tmpdir: str, args):
+    """Crea el backend con `users` usuarios ya cargados (sin medir la carga)."""
+    if name == "json":
+        storage = JSONStorage(db_path=os.path.join(tmpdir, f"aida_{users}.json"))
+        storage.data["profiles"] = {str(uid): _profile(uid) for uid in range(users)}
+        storage.data["sessions"] = {str(uid): _session(uid) for uid in range(users)}
+        storage._save_db()
+        return storage
+
+    if name == "sharded":
+        # Se arma el archivo único y se reparte con la migración, como en una instalación existente
+        make_backend("json", users, tmpdir, args)
+        return ShardedJSONStorage(db_path=os.path.join(tmpdir, f"aida_{users}.json"))
+
+    if args.emulator:
+        from google.cloud import firestore as gcf  # usa FIRESTORE_EMULATOR_HOST
+        db = gcf.Client(project="aida-benchmark")
+    else:
+        db = FakeFirestore(rtt_ms=0)
+    storage = FirebaseStorage(db=db)
+    for uid in range(users):
+        storage.save_profile(uid, _profile(uid))
+        storage.save_session(uid, _session(uid))
+    if not args.emulator:
+        db.rtt = args.firestore_rtt_ms / 1000  # la carga inicial no paga la red simulada
+    return storage
+
+
+def _measure(fn, uids: list[int], ops: int, max_seconds: float) -> dict:
+    samples = []
+    start = time.perf_counter()
+    for i in range(ops):
+        uid = uids[i % len(uids)]
+        t0 = time.perf_counter()
+        fn(uid)
+        samples.append(time.perf_counter() - t0)
+        if time.perf_counter() - start > max_seconds:
+            break
+    elapsed = time.perf_counter() - start
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        "ops": len(ms),
+        "p50_ms": round(statistics.median(ms), 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(0.95 * len(ms)))], 3),
+        "ops_per_s": round(len(ms) / elapsed, 1) if elapsed else None,
+    }
+
+
+def _fsync_cost(storage: JSONStorage, tmpdir: str) -> dict:
+    """Reescribe el archivo principal como lo hace _save_db, sin y con fsync."""
+    path = os.path.join(tmpdir, "fsync_probe.json")
+    result = {}
+    for label, sync in (("write_ms", False), ("write_fsync_ms", True)):
+        samples = []
+        for _ in range(5):
+            t0 = time.perf_counter()
+            with open(path, "wb") as f:
+                f.write(storage.codec.dumps(storage.data))
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            samples.append(time.perf_counter() - t0)
+        result[label] = round(1000 * statistics.median(samples), 3)
+    os.remove(path)
+    return result
+
+
+def _concurrent_saves(storage: JSONStorage, uids: list[int], threads: int, seconds: float = 1.0) -> dict:
+    """Varios hilos guardando sesiones a la vez: con group commit comparten las escrituras."""
+    done = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def _worker(slot: int):
+        while time.perf_counter() < deadline:
+            uid = uids[(slot + done[slot] * threads) % len(uids)]
+            storage.save_session(uid, _session(uid))
+            done[slot] += 1
+
+    workers = [threading.Thread(target=_worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return {"threads": threads, "saves_per_s": round(sum(done) / (time.perf_counter() - start), 1)}
+
+
+def run_case(backend: str, users: int, history: int, args) -> dict:
+    rnd = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(prefix="aida_bench_storage_") as tmpdir:
+        storage = make_backend(backend, users, tmpdir, args)
+        uids = rnd.sample(range(users), min(users, SAMPLE_USERS))
+
+        # Historial previo de los usuarios medidos (append-only, como en producción)
+        fake = getattr(storage, "db", None)
+        saved_rtt = getattr(fake, "rtt", None)
+        if isinstance(fake, FakeFirestore):
+            fake.rtt = 0
+        for uid in uids:
+            for seq in range(history):
+                storage.append_turn(uid, _turn(seq))
+        if isinstance(fake, FakeFirestore):
+            fake.rtt = saved_rtt
+
+        counter = iter(range(history, 10 ** 9))
+        operations = {
+            "get_profile": lambda uid: storage.get_profile(uid),
+            "save_profile": lambda uid: storage.save_profile(uid, _profile(uid)),
+            "get_session": lambda uid: storage.get_session(uid),
+            "save_session": lambda uid: storage.save_session(uid, _session(uid)),
+            "append_turn": lambda uid: storage.append_turn(uid, _turn(next(counter))),
+            "get_turns(12)": lambda uid: storage.get_turns(uid, limit=12),
+            "history_cold_load": lambda uid: memory.TurnStore(storage).recent(uid),
+            "memory.ensure_profile": lambda uid: memory.ensure_profile(uid, display_name=f"Usuario {uid}",
+                                                                       storage=storage),
+            "memory.save_turn": lambda uid: memory.save_turn(uid, "user", "¿Cómo hago una videollamada?",
+                                                             storage=storage),
+            "memory.build_llm_context": lambda uid: memory.build_llm_context(uid, storage=storage),
+        }
+        results = {name: _measure(fn, uids, args.ops, args.max_seconds) for name, fn in operations.items()}
+
+        case = {"backend": backend, "users": users, "history": history, "operations": results}
+        if backend == "json":
+            case["db_bytes"] = os.path.getsize(storage.db_path)
+            case["turns_bytes"] = _dir_size(storage.turns_dir)
+            case.update(_fsync_cost(storage, tmpdir))
+            case["concurrent"] = _concurrent_saves(storage, uids, args.threads)
+        elif backend == "sharded":
+            t0 = time.perf_counter()
+            ShardedJSONStorage(db_path=os.path.join(tmpdir, f"aida_{users}.json"))
+            case["open_ms"] = round(1000 * (time.perf_counter() - t0), 3)
+            case["db_bytes"] = _dir_size(storage.root)
+            case["turns_bytes"] = _dir_size(storage.turns_dir)
+        elif isinstance(fake, FakeFirestore):
+            case["documents"] = fake.document_count()
+        return case
+
+
+def _print_case(case: dict):
+    extra = ""
+    if case["backend"] == "json":
+        extra = (f"  archivo={case['db_bytes'] / 1e6:.2f} MB turnos={case['turns_bytes'] / 1e6:.2f} MB "
+                 f"reescritura={case['write_ms']:.1f} ms (+fsync {case['write_fsync_ms']:.1f} ms) "
+                 f"{case['concurrent']['threads']} hilos={case['concurrent']['saves_per_s']:.0f} guardados/s")
+    elif case["backend"] == "sharded":
+        extra = (f"  archivos={case['db_bytes'] / 1e6:.2f} MB turnos={case['turns_bytes'] / 1e6:.2f} MB "
+                 f"apertura={case['open_ms']:.2f} ms")
+    print(f"\n[{case['backend']}] usuarios={case['users']} historial={case['history']}{extra}")
+    for name, stats in case["operations"].items():
+        print(f"  {name:<26} p50={stats['p50_ms']:>10.3f} ms  p95={stats['p95_ms']:>10.3f} ms  "
+              f"{stats['ops_per_s'] or 0:>10.1f} ops/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="10,1000,10000,100000")
+    parser.add_argument("--history", default="0,12,200", help="turnos previos por usuario medido")
+    parser.add_argument("--backends", default="json,sharded,firestore")
+    parser.add_argument("--ops", type=int, default=100, help="operaciones por medición")
+    parser.add_argument("--max-seconds", type=float, default=10, help="tope de tiempo por medición")
+    parser.add_argument("--firestore-rtt-ms", type=float, default=0, help="ida y vuelta simulada por operación")
+    parser.add_argument("--threads", type=int, default=8, help="hilos guardando a la vez (JSON)")
+    parser.add_argument("--emulator", action="store_true", help="usar el emulador de Firestore en lugar del doble")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="guardar los resultados en JSON")
+    args = parser.parse_args()
+
+    cases = []
+    for backend in args.backends.split(","):
+        for users in (int(n) for n in args.users.split(",")):
+            for history in (int(n) for n in args.history.split(",")):
+                case = run_case(backend, users, history, args)
+                _print_case(case)
+                cases.append(case)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "cases": cases}, f, indent=2, ensure_ascii=False)
+        print(f"\n✅ Resultado guardado en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
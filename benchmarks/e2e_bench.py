@@ -0,0 +1,448 @@
+# benchmarks/e2e_bench.py
+"""
+Benchmark de punta a punta de ModularBot, sin red ni modelos reales.
+
+Arma el bot con sus servicios de verdad (NLU, visión, traductor, sesiones,
+almacenamiento JSON) y reemplaza solo lo externo:
+  * Telegram: un TeleBot falso que responde al instante (o con --telegram-ms)
+  * Groq: un servidor HTTP local con la misma API de chat completions y latencia configurable
+  * edge-tts / pydub: stubs que tardan --tts-ms y escriben un archivo chico
+  * Whisper y sentimiento: un cliente falso del servidor de modelos (--whisper-ms)
+
+Envía actualizaciones sintéticas de texto, voz y foto a N chats con la concurrencia
+pedida (mismo reparto por chat que el modo webhook) y reporta rendimiento,
+latencias p50/p95/p99 por handler y por etapa, y memoria máxima (RSS).
+"handlers" mide desde que llega la actualización (incluye la espera en la cola
+de su chat) y "handlers_service" solo el procesamiento.
+El resultado se guarda en JSON para comparar entre commits.
+
+Uso:
+    python benchmarks/e2e_bench.py [--updates 300] [--chats 30] [--concurrency 8]
+        [--mix text=70,voice=15,photo=15] [--groq-ms 300] [--whisper-ms 400] [--tts-ms 150]
+        [--output resultado.json] [--compare benchmarks/results/anterior.json]
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("TELEGRAM_TOKEN", "123:benchmark")
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+# Sin límites por usuario, sin cachés en disco, sin servidor de métricas ni de modelos
+for _key, _value in {"RATE_LIMITS_ENABLED": "false", "RESPONSE_CACHE_PATH": "", "TRANSLATION_CACHE_PATH": "",
+                     "METRICS_PORT": "0", "MODEL_SERVER_SOCKET": "",
+                     "GOOGLE_CREDENTIALS_PATH": "", "MAKE_WEBHOOK_URL": ""}.items():
+    os.environ[_key] = _value
+
+from webhook_harness import SAMPLE_TEXTS, make_text_update, _percentile  # noqa: E402
+
+TEXTS = SAMPLE_TEXTS + [
+    "Estoy frustrado, no me anda el WhatsApp",
+    "¿Cómo mando una foto a mi nieta?",
+    "No entiendo cómo se usa la cámara",
+]
+
+
+# --- Stubs de TTS (se instalan antes de importar el bot) ---
+
+class _FakeCommunicate:
+    delay = 0.15
+
+    def __init__(self, text, voice):
+        self.text = text
+
+    async def save(self, path):
+        await asyncio.sleep(self.delay)
+        with open(path, "wb") as f:
+            f.write(b"ID3" + b"\0" * 2048)
+
+
+class _FakeAudioSegment:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    @classmethod
+    def from_mp3(cls, path):
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    def export(self, path, format=None, codec=None):
+        with open(path, "wb") as f:
+            f.write(b"OggS" + self.data[:1024])
+
+
+sys.modules["edge_tts"] = types.SimpleNamespace(Communicate=_FakeCommunicate)
+sys.modules["pydub"] = types.SimpleNamespace(AudioSegment=_FakeAudioSegment)
+
+import telebot  # noqa: E402
+from PIL import Image  # noqa: E402
+from telebot import types as tg  # noqa: E402
+from aida_bot import metrics  # noqa: E402
+from aida_bot.bot import ModularBot, SessionManager  # noqa: E402
+from aida_bot.pipeline import ChatDispatcher, StageTimings  # noqa: E402
+from aida_bot.services.email_service import EmailService  # noqa: E402
+from aida_bot.services.nlu_service import NLUService  # noqa: E402
+from aida_bot.services.sentiment_service import SentimentAnalyzer  # noqa: E402
+from aida_bot.services.speech_service import SpeechService  # noqa: E402
+from aida_bot.services.translator_service import Translator  # noqa: E402
+from aida_bot.services.vision_service import VisionService  # noqa: E402
+from aida_bot.storage.database import JSONStorage  # noqa: E402
+
+
+# --- Groq falso ---
+
+class _GroqHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        # Prueba de los circuitos: /openai/v1/models/<modelo>
+        self._json(200, {"id": self.path.rsplit("/", 1)[-1], "object": "model"})
+
+    def do_POST(self):
+        server = self.server
+        data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", "0"))))
+        messages = data.get("messages", [])
+        last = messages[-1]["content"] if messages else ""
+
+        if data.get("response_format"):
+            kind = "intent"
+            content = json.dumps({
+                "has_chat_intent": True,
+                "chat_content": last,
+                "configuration": {"set_audio": None, "set_voice": None},
+                "analysis_required": {"sentiment": "frustrad" in last.lower()},
+            }, ensure_ascii=False)
+        elif isinstance(last, list):
+            kind = "vision"
+            content = "Es una foto de un paisaje con árboles y un cielo celeste. No veo nada sospechoso."
+        else:
+            kind = "chat"
+            content = ("Te explico paso a paso: 1) Abrí la aplicación. 2) Tocá el botón de abajo. "
+                       "3) Elegí la opción que necesitás. ¡Vas muy bien!")
+
+        with server.lock:
+            server.requests[kind] += 1
+        time.sleep(max(0.0, server.latency * random.uniform(1 - server.jitter, 1 + server.jitter)))
+        self._json(200, {"choices": [{"message": {"role": "assistant", "content": content}}],
+                         "usage": {"prompt_tokens": 100, "completion_tokens": 40}})
+
+
+def start_fake_groq(latency_ms: float, jitter: float) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _GroqHandler)
+    server.daemon_threads = True
+    server.request_queue_size = 128
+    server.latency = latency_ms / 1000
+    server.jitter = jitter
+    server.requests = defaultdict(int)
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True, name="bench-groq").start()
+    return server
+
+
+# --- Telegram y modelos falsos ---
+
+class _FakeTeleBot(telebot.TeleBot):
+    """TeleBot sin red: las llamadas a la API tardan `api_ms` y se cuentan."""
+
+    def __init__(self, api_ms: float, files: dict):
+        super().__init__("123:benchmark", threaded=False)
+        self.api_delay = api_ms / 1000
+        self.files = files
+        self.api_calls = defaultdict(int)
+        self._calls_lock = threading.Lock()
+
+    def _api(self, method: str):
+        with self._calls_lock:
+            self.api_calls[method] += 1
+        if self.api_delay:
+            time.sleep(self.api_delay)
+
+    def reply_to(self, message, text, **kwargs):
+        self._api("sendMessage")
+
+    def send_message(self, chat_id, text, **kwargs):
+        self._api("sendMessage")
+
+    def send_voice(self, chat_id, voice, **kwargs):
+        voice.read()
+        self._api("sendVoice")
+
+    def send_chat_action(self, chat_id, action, **kwargs):
+        self._api("sendChatAction")
+
+    def get_file(self, file_id):
+        self._api("getFile")
+        return types.SimpleNamespace(file_id=file_id, file_path=file_id)
+
+    def download_file(self, file_path):
+        self._api("downloadFile")
+        return self.files[file_path]
+
+    def answer_callback_query(self, *args, **kwargs):
+        self._api("answerCallbackQuery")
+
+    def edit_message_reply_markup(self, *args, **kwargs):
+        self._api("editMessageReplyMarkup")
+
+
+class _FakeModelClient:
+    """Cliente del servidor de modelos que simula Whisper y el modelo de sentimiento."""
+    socket_path = "(benchmark)"
+
+    def __init__(self, whisper_ms: float, sentiment_ms: float):
+        self.whisper = whisper_ms / 1000
+        self.sentiment_delay = sentiment_ms / 1000
+
+    def transcribe(self, audio_bytes: bytes, language: str = "es") -> str:
+        time.sleep(self.whisper)
+        return TEXTS[len(audio_bytes) % len(TEXTS)]
+
+    def sentiment(self, text: str) -> dict:
+        time.sleep(self.sentiment_delay)
+        return {"label": "NEG" if "frustrad" in text.lower() else "NEU", "score": 0.9}
+
+
+# --- Actualizaciones sintéticas ---
+
+def _message(update_id: int, chat_id: int, **content) -> dict:
+    update = make_text_update(update_id, chat_id, "")
+    del update["message"]["text"]
+    update["message"].update(content)
+    return update
+
+
+def _make_photo(seed: int) -> bytes:
+    rnd = random.Random(seed)
+    image = Image.frombytes("RGB", (320, 240), bytes(rnd.getrandbits(8) for _ in range(320 * 240 * 3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue()
+
+
+def build_updates(args, mix: dict[str, int]) -> tuple[list[tuple[str, dict]], dict]:
+    rnd = random.Random(args.seed)
+    files = {f"photo-{i}": _make_photo(i) for i in range(args.distinct_photos)}
+    kinds = [kind for kind, weight in mix.items() for _ in range(weight)]
+    updates = []
+    for i in range(args.updates):
+        chat_id = 1000 + i % args.chats
+        kind = rnd.choice(kinds)
+        if kind == "text":
+            text = rnd.choice(TEXTS)
+            if not args.repeat:
+                text = f"{text} (consulta {i})"  # evita la caché de respuestas
+            update = make_text_update(i, chat_id, text)
+        elif kind == "voice":
+            file_id = f"voice-{i}"
+            files[file_id] = b"OggS" + bytes(rnd.getrandbits(8) for _ in range(rnd.randint(2000, 8000)))
+            update = _message(i, chat_id, voice={"file_id": file_id, "file_unique_id": file_id, "duration": 4})
+        else:
+            file_id = f"photo-{i % args.distinct_photos}"
+            update = _message(i, chat_id, caption=rnd.choice([None, "¿Esto es una estafa?"]), photo=[
+                {"file_id": file_id, "file_unique_id": file_id, "width": 320, "height": 240},
+            ])
+        updates.append((kind, update))
+    return updates, files
+
+
+def build_bot(args, groq_url: str, files: dict, tmpdir: str) -> ModularBot:
+    storage = JSONStorage(db_path=os.path.join(tmpdir, "aida_bench.json"))
+    for chat_id in range(1000, 1000 + args.chats):
+        storage.data["profiles"][str(chat_id)] = {
+            "display_name": f"Prueba{chat_id}", "autonomia": "media", "foco": "whatsapp", "entorno": "solo",
+        }
+    storage._save_db()
+
+    model_client = _FakeModelClient(args.whisper_ms, args.sentiment_ms)
+    return ModularBot(
+        bot_instance=_FakeTeleBot(args.telegram_ms, files),
+        nlu=NLUService(api_key="benchmark", api_url=groq_url, storage=storage),
+        speech=SpeechService(client=model_client),
+        vision=VisionService(api_key="benchmark", api_url=groq_url),
+        sentiment=SentimentAnalyzer(client=model_client),
+        sessions=SessionManager(storage),
+        storage_client=storage,
+        translator=Translator(api_key="benchmark", api_url=groq_url),
+        email_service=EmailService(),
+    )
+
+
+# --- Medición ---
+
+def _summary(samples: list[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    ms = [s * 1000 for s in samples]
+    return {
+        "count": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 2),
+        "p50_ms": round(statistics.median(ms), 2),
+        "p95_ms": round(_percentile(ms, 0.95), 2),
+        "p99_ms": round(_percentile(ms, 0.99), 2),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(args) -> dict:
+    mix = {kind: int(weight) for kind, weight in (part.split("=") for part in args.mix.split(","))}
+    _FakeCommunicate.delay = args.tts_ms / 1000
+
+    # Cada etapa registrada por StageTimings se guarda también cruda, para los percentiles
+    stage_samples: dict[str, list[float]] = defaultdict(list)
+    stage_lock = threading.Lock()
+    original_record = StageTimings.record
+
+    def _record(self, name, start, end):
+        original_record(self, name, start, end)
+        with stage_lock:
+            stage_samples[name].append(end - start)
+    StageTimings.record = _record
+
+    groq = start_fake_groq(args.groq_ms, args.jitter)
+    groq_url = f"http://127.0.0.1:{groq.server_address[1]}/openai/v1/chat/completions"
+    updates, files = build_updates(args, mix)
+
+    with tempfile.TemporaryDirectory(prefix="aida_bench_") as tmpdir:
+        aida = build_bot(args, groq_url, files, tmpdir)
+        kind_of = {update["update_id"]: kind for kind, update in updates}
+        submitted: dict[int, float] = {}
+        latencies: dict[str, list[float]] = defaultdict(list)
+        service: dict[str, list[float]] = defaultdict(list)
+        lock = threading.Lock()
+
+        def _process(batch):
+            for update in batch:
+                start = time.perf_counter()
+                try:
+                    aida.bot.process_new_updates([update])
+                finally:
+                    end = time.perf_counter()
+                    kind = kind_of[update.update_id]
+                    with lock:
+                        service[kind].append(end - start)
+                        latencies[kind].append(end - submitted[update.update_id])
+
+        dispatcher = ChatDispatcher(_process, workers=args.concurrency, queue_size=max(args.updates, 64) * 2,
+                                    name="bench")
+        dispatcher.start()
+
+        parsed = [tg.Update.de_json(json.dumps(update)) for _, update in updates]
+        start = time.perf_counter()
+        for update in parsed:
+            submitted[update.update_id] = time.perf_counter()
+            dispatcher.submit(update, block=True)
+        while dispatcher.stats()["processed"] < len(parsed):
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        dispatcher.stop()
+        aida.executor.shutdown(wait=True)
+
+    StageTimings.record = original_record
+    groq.shutdown()
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "args": vars(args),
+        "updates": len(parsed),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(len(parsed) / elapsed, 2),
+        "handlers": {kind: _summary(latencies[kind]) for kind in sorted(latencies)},
+        "handlers_service": {kind: _summary(service[kind]) for kind in sorted(service)},
+        "stages": {name: _summary(stage_samples[name]) for name in sorted(stage_samples)},
+        "groq_requests": dict(groq.requests),
+        "telegram_calls": dict(aida.bot.api_calls),
+        "answers": {k[0]: v for k, v in metrics.ANSWERS._values.items()},
+        "errors": {k[0]: v for k, v in metrics.ERRORS._values.items()},
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def compare(current: dict, previous: dict):
+    """Imprime las diferencias de rendimiento y p50/p95 por handler y etapa."""
+    def _delta(new, old):
+        if new is None or old in (None, 0):
+            return "   n/d"
+        return f"{100 * (new - old) / old:+6.1f}%"
+
+    print(f"\nComparación con {previous.get('commit')} ({previous.get('timestamp')}):")
+    print(f"  rendimiento   {previous['throughput_per_s']:>9} -> {current['throughput_per_s']:>9} /s  "
+          f"{_delta(current['throughput_per_s'], previous['throughput_per_s'])}")
+    print(f"  RSS máximo    {previous['peak_rss_mb']:>9} -> {current['peak_rss_mb']:>9} MB "
+          f"{_delta(current['peak_rss_mb'], previous['peak_rss_mb'])}")
+    for section in ("handlers", "stages"):
+        for name, stats in current[section].items():
+            old = previous.get(section, {}).get(name, {})
+            for q in ("p50_ms", "p95_ms"):
+                print(f"  {section[:-1]}:{name:<12} {q}  {old.get(q, '-'):>9} -> {stats.get(q, '-'):>9}  "
+                      f"{_delta(stats.get(q), old.get(q))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=300)
+    parser.add_argument("--chats", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=8, help="hilos que atienden chats (como WEBHOOK_WORKERS)")
+    parser.add_argument("--mix", default="text=70,voice=15,photo=15", help="proporción de cada tipo de mensaje")
+    parser.add_argument("--groq-ms", type=float, default=300, help="latencia simulada de Groq")
+    parser.add_argument("--jitter", type=float, default=0.3, help="variación relativa de la latencia de Groq")
+    parser.add_argument("--whisper-ms", type=float, default=400)
+    parser.add_argument("--sentiment-ms", type=float, default=30)
+    parser.add_argument("--tts-ms", type=float, default=150)
+    parser.add_argument("--telegram-ms", type=float, default=0, help="latencia simulada de cada llamada a Telegram")
+    parser.add_argument("--distinct-photos", type=int, default=8, help="fotos distintas (el resto repite)")
+    parser.add_argument("--repeat", action="store_true", help="repetir textos idénticos (aprovecha la caché)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="archivo JSON (por defecto benchmarks/results/)")
+    parser.add_argument("--compare", default=None, help="JSON de una corrida anterior")
+    args = parser.parse_args()
+
+    report = run(args)
+    output = args.output or os.path.join(
+        ROOT, "benchmarks", "results", f"e2e_{report['commit'] or 'local'}_{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(json.dumps({k: report[k] for k in ("updates", "elapsed_s", "throughput_per_s", "handlers", "stages",
+                                             "peak_rss_mb")}, indent=2, ensure_ascii=False))
+    print(f"\n✅ Resultado guardado en {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# benchmarks/fake_firestore.py
+"""
+Doble en memoria del cliente de Firestore, con lo que usa FirebaseStorage:
+collection / document / get / set / update / delete / add / order_by / where / limit / stream
+y lotes de escritura (batch).
+
+Sirve para medir el costo propio del código (serialización, armado de consultas)
+sin red. Con `rtt_ms` cada operación espera ese tiempo, como una ida y vuelta a la nube.
+"""
+import copy
+import itertools
+import threading
+import time
+
+DESCENDING = "DESCENDING"
+ASCENDING = "ASCENDING"
+
+_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+}
+
+
+class FakeSnapshot:
+    def __init__(self, reference: "FakeDocument", data: dict | None):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> dict | None:
+        return copy.deepcopy(self._data)
+
+    def get(self, field: str):
+        return (self._data or {}).get(field)
+
+
+class FakeDocument:
+    def __init__(self, client: "FakeFirestore", collection_path: str, doc_id: str):
+        self._client = client
+        self._collection_path = collection_path
+        self.id = doc_id
+        self.path = f"{collection_path}/{doc_id}"
+
+    def collection(self, name: str) -> "FakeCollection":
+        return FakeCollection(self._client, f"{self.path}/{name}")
+
+    def get(self) -> FakeSnapshot:
+        self._client._rpc()
+        with self._client._lock:
+            data = self._client._collections.get(self._collection_path, {}).get(self.id)
+            return FakeSnapshot(self, copy.deepcopy(data))
+
+    def set(self, data: dict, merge: bool = False):
+        self._client._rpc()
+        with self._client._lock:
+            docs = self._client._collections.setdefault(self._collection_path, {})
+            if merge and self.id in docs:
+                docs[self.id].update(copy.deepcopy(data))
+            else:
+                docs[self.id] = copy.deepcopy(data)
+
+    def update(self, data: dict):
+        self._client._rpc()
+        with self._client._lock:
+            docs = self._client._collections.get(self._collection_path, {})
+            if self.id not in docs:
+                raise KeyError(f"No existe el documento {self.path}")
+            docs[self.id].update(copy.deepcopy(data))
+
+    def delete(self):
+        self._client._rpc()
+        with self._client._lock:
+            self._client._collections.get(self._collection_path, {}).pop(self.id, None)
+
+
+class FakeQuery:
+    def __init__(self, collection: "FakeCollection", filters=(), order=None, limit_to=None):
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._order = order
+        self._limit = limit_to
+
+    def where(self, field: str, op: str, value) -> "FakeQuery":
+        return FakeQuery(self._collection, self._filters + ((field, _OPERATORS[op], value),), self._order, self._limit)
+
+    def order_by(self, field: str, direction: str = ASCENDING) -> "FakeQuery":
+        return FakeQuery(self._collection, self._filters, (field, direction), self._limit)
+
+    def limit(self, count: int) -> "FakeQuery":
+        return FakeQuery(self._collection, self._filters, self._order, count)
+
+    def stream(self):
+        client = self._collection._client
+        client._rpc()
+        with client._lock:
+            items = list(client._collections.get(self._collection.path, {}).items())
+        docs = [(doc_id, data) for doc_id, data in items
+                if all(test(data.get(field), value) for field, test, value in self._filters)]
+        if self._order:
+            field, direction = self._order
+            docs.sort(key=lambda item: (item[1].get(field) is None, item[1].get(field)),
+                      reverse=str(direction).upper().endswith(DESCENDING))
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        for doc_id, data in docs:
+            yield FakeSnapshot(self._collection.document(doc_id), copy.deepcopy(data))
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, client: "FakeFirestore", path: str):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+        super().__init__(self)
+
+    def document(self, doc_id: str | None = None) -> FakeDocument:
+        return FakeDocument(self._client, self.path, doc_id or f"auto{next(self._client._ids):012d}")
+
+    def add(self, data: dict):
+        doc = self.document()
+        doc.set(data)
+        return time.time(), doc
+
+
+class FakeWriteBatch:
+    """Lote de escrituras: todas se aplican juntas en `commit()`, con una sola ida y vuelta."""
+
+    def __init__(self, client: "FakeFirestore"):
+        self._client = client
+        self._ops = []
+
+    def set(self, reference: FakeDocument, data: dict, merge: bool = False):
+        self._ops.append(("set", reference, copy.deepcopy(data), merge))
+
+    def delete(self, reference: FakeDocument):
+        self._ops.append(("delete", reference, None, False))
+
+    def commit(self):
+        self._client._rpc()
+        with self._client._lock:
+            for kind, ref, data, merge in self._ops:
+                docs = self._client._collections.setdefault(ref._collection_path, {})
+                if kind == "delete":
+                    docs.pop(ref.id, None)
+                elif merge and ref.id in docs:
+                    docs[ref.id].update(data)
+                else:
+                    docs[ref.id] = data
+        self._ops = []
+
+
+class FakeFirestore:
+    """Cliente falso: `FirebaseStorage(db=FakeFirestore())`."""
+
+    def __init__(self, rtt_ms: float = 0.0):
+        self.rtt = rtt_ms / 1000
+        self.calls = 0
+        self._collections: dict[str, dict[str, dict]] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def _rpc(self):
+        self.calls += 1
+        if self.rtt:
+            time.sleep(self.rtt)
+
+    def collection(self, path: str) -> FakeCollection:
+        return FakeCollection(self, path)
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def document_count(self) -> int:
+        with self._lock:
+            return sum(len(docs) for docs in self._collections.values())
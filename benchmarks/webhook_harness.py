@@ -0,0 +1,156 @@
+# benchmarks/webhook_harness.py
+"""
+Envía actualizaciones sintéticas de Telegram a un webhook local.
+
+Sirve para probar el modo webhook sin Telegram y como prueba de carga offline:
+mide el tiempo de confirmación (ACK) de cada POST y cuántas actualizaciones
+se procesaron por segundo.
+
+Uso:
+    # contra el bot corriendo con BOT_MODE=webhook
+    python benchmarks/webhook_harness.py --url http://127.0.0.1:8443/telegram --secret <WEBHOOK_SECRET>
+
+    # autocontenido: levanta un WebhookServer con un bot falso que tarda --work-ms por mensaje
+    python benchmarks/webhook_harness.py --self-test [--updates 500] [--chats 50] [--concurrency 16]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("TELEGRAM_TOKEN", "benchmark")
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+SAMPLE_TEXTS = [
+    "Hola, ¿cómo estás?",
+    "¿Cómo hago una videollamada por WhatsApp?",
+    "Me llegó un mensaje que dice que gané un premio",
+    "¿Cómo subo el volumen del celular?",
+    "Gracias por la ayuda",
+]
+
+
+def make_text_update(update_id: int, chat_id: int, text: str) -> dict:
+    """Actualización mínima de Telegram con un mensaje de texto."""
+    user = {"id": chat_id, "is_bot": False, "first_name": f"Prueba{chat_id}"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": user["first_name"]},
+            "from": user,
+            "text": text,
+        },
+    }
+
+
+def post_update(url: str, secret: str, update: dict, timeout: float = 10) -> tuple[int, float]:
+    body = json.dumps(update).encode("utf-8")
+    request = urllib.request.Request(url, data=body, method="POST", headers={
+        "Content-Type": "application/json",
+        "X-Telegram-Bot-Api-Secret-Token": secret,
+    })
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as resp:
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - start
+
+
+class _FakeBot:
+    """Bot falso: simula el tiempo de procesamiento y verifica el orden por chat."""
+
+    def __init__(self, work_ms: float):
+        self.work = work_ms / 1000
+        self.last_seen: dict[int, int] = {}
+        self.out_of_order = 0
+        self.processed = 0
+        self._lock = threading.Lock()
+
+    def process_new_updates(self, updates):
+        for update in updates:
+            time.sleep(self.work)
+            chat_id = update.message.chat.id
+            with self._lock:
+                if update.update_id < self.last_seen.get(chat_id, -1):
+                    self.out_of_order += 1
+                self.last_seen[chat_id] = update.update_id
+                self.processed += 1
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    parser.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET", ""))
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--self-test", action="store_true", help="levanta un webhook local con un bot falso")
+    parser.add_argument("--work-ms", type=float, default=50, help="tiempo simulado por mensaje (--self-test)")
+    args = parser.parse_args()
+
+    server = fake_bot = None
+    if args.self_test:
+        from aida_bot.webhook import WebhookServer
+        fake_bot = _FakeBot(args.work_ms)
+        server = WebhookServer(fake_bot, host="127.0.0.1", port=0, secret_token=args.secret or None)
+        server.start()
+        args.url = f"http://127.0.0.1:{server.port}{server.path}"
+        args.secret = server.secret_token
+
+    updates = [
+        make_text_update(i, 1000 + i % args.chats, SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)])
+        for i in range(args.updates)
+    ]
+
+    # Un POST con token incorrecto debe rechazarse
+    bad_status, _ = post_update(args.url, "token-incorrecto", updates[0])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda u: post_update(args.url, args.secret, u), updates))
+    sent_elapsed = time.perf_counter() - start
+
+    acks = [latency * 1000 for status, latency in results if status == 200]
+    report = {
+        "updates": args.updates,
+        "accepted": len(acks),
+        "bad_token_status": bad_status,
+        "ack_ms": {
+            "p50": round(statistics.median(acks), 2) if acks else None,
+            "p95": round(_percentile(acks, 0.95), 2) if acks else None,
+            "p99": round(_percentile(acks, 0.99), 2) if acks else None,
+        },
+        "post_rate_per_s": round(len(results) / sent_elapsed, 1),
+    }
+
+    if server is not None:
+        while fake_bot.processed < len(acks):
+            time.sleep(0.01)
+        total = time.perf_counter() - start
+        report["processed"] = fake_bot.processed
+        report["process_rate_per_s"] = round(fake_bot.processed / total, 1)
+        report["out_of_order"] = fake_bot.out_of_order
+        report["server"] = server.stats()
+        server.stop()
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
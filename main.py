@@ -1,4 +1,6 @@
     # main.py
+import os
+import threading
 import telebot
 from aida_bot import config
 from aida_bot.storage.database import get_storage_client
@@ -10,40 +12,84 @@ from aida_bot.services.email_service import EmailService
 from aida_bot.services.translator_service import Translator
 from aida_bot.bot import ModularBot, SessionManager
 from aida_bot.features.user_profiles import ProfileOnboarding
+from aida_bot.tenants import load_tenants
 
 
-def main():
-    print("--- INICIALIZANDO AIDA BOT ---")
-    
-    # 1. Instancia del bot de Telegram
-    bot = telebot.TeleBot(config.TELEGRAM_TOKEN)
+def build_shared_services() -> dict:
+    """Servicios pesados (Whisper, modelo de sentimiento): una sola copia para todos los bots del proceso."""
+    return {
+        "speech": SpeechService(model_size="base"),
+        "sentiment": SentimentAnalyzer(),
+    }
+
+
+def worker_path(path: str, shard: tuple[int, int] | None) -> str:
+    """
+    Versión de un archivo de caché propia de cada worker del modo multiproceso
+    (responses.json -> responses.shard0of4.json): dos procesos nunca lo reescriben a la vez.
+    """
+    if not path or shard is None:
+        return path
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.shard{shard[0]}of{shard[1]}{ext}"
+
+
+def build_bot(shard: tuple[int, int] | None = None, tenant=None, shared: dict | None = None):
+    """
+    Arma el bot con todos sus servicios.
+    `shard=(índice, cantidad)` se usa en los workers del modo multiproceso:
+    ahí las actualizaciones llegan desde el proceso frontal, no de Telegram.
+    `tenant` y `shared` se usan en el modo multi-tenant: la identidad del bot
+    (token, namespace, archivos) y los servicios pesados que comparten todos.
+    """
+    token = tenant.token if tenant else config.TELEGRAM_TOKEN
+    # 1. Instancia del bot de Telegram (síncrona o asyncio según BOT_MODE)
+    if config.BOT_MODE == "async":
+        from telebot.async_telebot import AsyncTeleBot
+        from aida_bot.async_bot import AsyncModularBot
+        bot = AsyncTeleBot(token)
+        bot_class = AsyncModularBot
+    elif config.BOT_MODE == "webhook" or shard is not None:
+        # Los handlers corren en los hilos que reparten las actualizaciones (una cola por grupo de chats)
+        bot = telebot.TeleBot(token, threaded=False)
+        bot_class = ModularBot
+    else:
+        bot = telebot.TeleBot(token)
+        bot_class = ModularBot
     
     # 2. Cliente de Almacenamiento (Firebase o JSON)
-    storage = get_storage_client()
-    
+    storage = get_storage_client(shard=shard, tenant=tenant)
+
     # 3. Manejador de Sesiones (Persistentes)
     sessions = SessionManager(storage)
 
     # 4. Servicios Modulares
-    nlu = NLUService(api_key=config.GROQ_API_KEY, api_url=config.GROQ_API_URL, storage=storage)
+    nlu = NLUService(api_key=config.GROQ_API_KEY, api_url=config.GROQ_API_URL, storage=storage,
+                     dataset_path=tenant.dataset_path if tenant else None,
+                     response_cache_path=worker_path(tenant.path_for(config.RESPONSE_CACHE_PATH) if tenant
+                                                     else config.RESPONSE_CACHE_PATH, shard),
+                     metrics_prefix=tenant.metrics_prefix if tenant else "")
 
-    
-    speech = SpeechService(model_size="base")
+    shared = shared or build_shared_services()
+    speech = shared["speech"]
     
     vision = VisionService(
         api_key=config.GROQ_API_KEY,
         api_url=config.GROQ_API_URL
     )
     
-    sentiment = SentimentAnalyzer()
+    sentiment = shared["sentiment"]
 
     email_service = EmailService()
 
-    translator = Translator(api_key=config.GROQ_API_KEY)
+    translator = Translator(api_key=config.GROQ_API_KEY,
+                            cache_path=worker_path(tenant.path_for(config.TRANSLATION_CACHE_PATH) if tenant
+                                                   else config.TRANSLATION_CACHE_PATH, shard),
+                            metrics_prefix=tenant.metrics_prefix if tenant else "")
 
     # El onboarding se maneja desde ModularBot para evitar handlers duplicados
     # 5. Instancia principal del Bot
-    aida_bot = ModularBot(
+    aida_bot = bot_class(
         bot_instance=bot,
         nlu=nlu,
         speech=speech,
@@ -52,11 +98,55 @@ def main():
         email_service=email_service,
         translator=translator,
         sessions=sessions,
-        storage_client=storage
+        storage_client=storage,
+        tenant=tenant
     )
+    return aida_bot
+
+
+def run_tenants(tenants: list):
+    """Varios bots en este proceso, con Whisper y el modelo de sentimiento cargados una sola vez."""
+    shared = build_shared_services()
+    bots = []
+    for tenant in tenants:
+        print(f"--- BOT {tenant.namespace} ---")
+        bots.append(build_bot(tenant=tenant, shared=shared))
+
+    if config.BOT_MODE == "async":
+        from aida_bot.async_bot import run_many
+        run_many(bots)
+        return
+
+    # Polling o webhook: cada bot en su hilo (en webhook comparten el servidor HTTP)
+    threads = [threading.Thread(target=b.run, daemon=True, name=f"aida-{t.bot_id}") for b, t in zip(bots, tenants)]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    print("--- INICIALIZANDO AIDA BOT ---")
+
+    if config.BOT_TENANTS_FILE:
+        if config.SHARD_WORKERS > 0:
+            print("⚠️ SHARD_WORKERS no se usa con BOT_TENANTS_FILE: todos los bots corren en este proceso.")
+        run_tenants(load_tenants())
+        return
+
+    if config.SHARD_WORKERS > 0 and config.BOT_MODE == "async":
+        print("⚠️ SHARD_WORKERS no se usa con BOT_MODE=async: el bot corre en un solo proceso.")
+
+    # Modo multiproceso: este proceso solo recibe y reparte; los workers arman su propio bot
+    if config.SHARD_WORKERS > 0 and config.BOT_MODE != "async":
+        from aida_bot.sharding import ShardSupervisor
+        ShardSupervisor(build_bot).run()
+        return
 
-    # 6. Ejecutar el bot
-    aida_bot.run()
+    build_bot().run()
 
 
 if __name__ == "__main__":
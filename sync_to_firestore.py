@@ -1,56 +1,649 @@
 # aida_bot/sync_to_firestore.py
+"""
+Replicación incremental JSON local ↔ Firestore.
+
+Cada worker puede trabajar sobre su JSON local (rápido) y este proceso lo
+replica contra Firestore (durable y compartido entre instancias):
+
+  * Subida: cada archivo de datos (el principal, los de cada shard,
+    aida_data.shard0of4.json..., y los de cada usuario con STORAGE_LAYOUT=per_user)
+    se vuelve a leer solo si cambió su mtime o su tamaño. De cada sesión y perfil
+    se guarda un hash; se sube lo que cambió.
+  * Bajada: se traen los documentos de Firestore modificados desde la última
+    pasada (consulta por `_updatedAt` o, con SYNC_PULL_MODE=listen, listeners de
+    snapshots) y se escriben en el JSON local.
+  * Conflictos (el mismo registro cambió de los dos lados): se compara campo a
+    campo contra la última versión en común; si solo un lado cambió un campo,
+    gana ese lado, y si cambiaron los dos gana el más reciente (`_updatedAt`).
+    Los historiales (`history`) no se pisan: se unen y se ordenan por `ts`.
+  * Historiales append-only (<json>_turns/<chat_id>.jsonl): se sube solo lo
+    agregado desde el último byte sincronizado, con ids únicos por instancia.
+
+Cada documento replicado lleva `_updatedAt`, `_version` (sube en cada escritura)
+y `_origin`; las bajas se marcan con `_deleted` para que las otras instancias
+se enteren. Las escrituras van en lotes de Firestore (SYNC_BATCH_SIZE por lote,
+SYNC_MAX_PARALLEL a la vez) y lo sincronizado se guarda en <json>.sync_state.json:
+al reiniciar se sigue desde ahí.
+
+Si está instalado `watchdog`, los cambios locales se detectan por eventos del
+sistema de archivos (inotify en Linux); si no, se revisan los mtime cada SYNC_INTERVAL.
+
+Uso:
+    python sync_to_firestore.py [--json aida_data.json] [--mode both|push] [--once]
+"""
+import argparse
+import glob
+import hashlib
 import json
-import time
 import os
-from aida_bot.storage.database import FirebaseStorage
-
-JSON_PATH = "aida_data_FF.json"  # ⚠️ Ruta del JSON real desde la raíz
-SYNC_INTERVAL = 5  # segundos entre chequeos
-
-def load_local_data():
-    """Lee el contenido actual del JSON local."""
-    if not os.path.exists(JSON_PATH):
-        print("❌ No se encontró el archivo", JSON_PATH)
-        return {"sessions": {}, "profiles": {}}
-    with open(JSON_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def sync_once(local_data, firebase):
-    """Sube los cambios locales a Firestore."""
-    sessions = local_data.get("sessions", {})
-    profiles = local_data.get("profiles", {})
-
-    # 🔹 Subir sesiones
-    for chat_id, session_data in sessions.items():
-        firebase.save_session(chat_id, session_data)
-        print(f"☁️ Sincronizada sesión {chat_id}")
-
-    # 🔹 Subir perfiles
-    for user_id, profile_data in profiles.items():
-        firebase.save_profile(user_id, profile_data)
-        print(f"☁️ Sincronizado perfil {user_id}")
-
-def run_sync_loop():
-    """Sincroniza cada pocos segundos automáticamente."""
-    firebase = FirebaseStorage()
-    last_snapshot = None
-
-    print("🔄 Iniciando sincronización automática JSON ↔ Firestore...")
+import re
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from aida_bot import config
+from aida_bot.pipeline import shard_for
+from aida_bot.storage import serializers
+from aida_bot.storage.database import (UPDATED, FirebaseStorage, append_user_index, atomic_write, file_lock,
+                                       file_stamp, strip_meta, user_file)
+
+JSON_PATH = config.SYNC_JSON_PATH  # ⚠️ Ruta del JSON real desde la raíz
+SYNC_INTERVAL = config.SYNC_INTERVAL  # segundos entre chequeos
+SECTIONS = {"sessions": "sessions_col", "profiles": "profiles_col"}
+STATE_VERSION = 2
+_MISSING = object()
+
+
+def _record_hash(data) -> str | None:
+    if data is None:
+        return None
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def _read_json(path: str) -> dict | None:
+    """
+    Contenido de un archivo de datos en cualquier formato de STORAGE_FORMAT.
+    None si no existe o está a medio escribir (se reintenta en el próximo chequeo).
+    """
+    try:
+        with open(path, "rb") as f:
+            return serializers.loads(f.read())
+    except (OSError, ValueError) as e:
+        print(f"⚠️ No se pudo leer {path}: {e}")
+        return None
+
+
+# --- Resolución de conflictos ---
+
+def _turn_key(turn) -> str:
+    return json.dumps(turn, sort_keys=True, ensure_ascii=False) if isinstance(turn, dict) else str(turn)
+
+
+def merge_history(local: list, remote: list) -> list:
+    """Unión de dos historiales sin repetidos, ordenada por `ts` (y `seq` a igual hora)."""
+    seen, merged = set(), []
+    for turn in list(local) + list(remote):
+        key = _turn_key(turn)
+        if key not in seen:
+            seen.add(key)
+            merged.append(turn)
+    return sorted(merged, key=lambda t: (str(t.get("ts", "")), t.get("seq", 0)) if isinstance(t, dict) else ("", 0))
+
+
+def merge_records(base: dict | None, local: dict | None, remote: dict | None,
+                  local_ts: float, remote_ts: float) -> dict | None:
+    """
+    Fusión de tres vías de un registro que cambió en los dos lados.
+    `None` es una baja: si compite con una modificación, gana la más reciente.
+    """
+    if local is None or remote is None:
+        return local if local_ts >= remote_ts else remote
+    base = base or {}
+    merged = {}
+    for field in list(local) + [f for f in remote if f not in local]:
+        mine, theirs, common = local.get(field, _MISSING), remote.get(field, _MISSING), base.get(field, _MISSING)
+        if mine == theirs or theirs == common:
+            value = mine
+        elif mine == common:
+            value = theirs
+        elif field == "history" and isinstance(mine, list) and isinstance(theirs, list):
+            value = merge_history(mine, theirs)
+        else:
+            value = mine if local_ts >= remote_ts else theirs
+        if value is not _MISSING:
+            merged[field] = value
+    return merged
+
+
+class SyncState:
+    """Lo último que quedó igual en los dos lados, persistido en un archivo JSON de estado."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files: dict[str, dict] = {}  # archivo -> {"stat": [mtime_ns, tamaño], "records": {clave: hash}}
+        # "sessions/123" -> {"hash", "version", "updatedAt", "base": contenido en común}
+        self.replica: dict[str, dict] = {}
+        self.turns: dict[str, dict] = {}  # chat_id -> {"offset": bytes subidos, "inode": n}
+        self.pulled: dict[str, float] = {}  # sección -> mayor `_updatedAt` ya traído
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Estado de sincronización ilegible ({e}); se compara todo de nuevo.")
+            return
+        self.turns = data.get("turns", {})  # los offsets de los historiales siguen valiendo
+        if data.get("version") != STATE_VERSION:
+            return
+        self.files = data.get("files", {})
+        self.replica = data.get("replica", {})
+        self.pulled = data.get("pulled", {})
+
+    def save(self):
+        # Escritura atómica: un corte a mitad de camino deja el estado anterior intacto
+        state = {"version": STATE_VERSION, "files": self.files, "replica": self.replica,
+                 "turns": self.turns, "pulled": self.pulled}
+        atomic_write(self.path, json.dumps(state, ensure_ascii=False).encode("utf-8"))
+
+
+class _RemoteFeed:
+    """Documentos de Firestore que cambiaron: por consulta periódica o por listeners."""
+
+    def __init__(self, syncer: "IncrementalSync", mode: str):
+        self._syncer = syncer
+        self._lock = threading.Lock()
+        self._pending: dict[str, object] = {}
+        self._watches = []
+        self.mode = "poll"
+        if mode == "listen":
+            cols = [getattr(syncer.firebase, attr) for attr in SECTIONS.values()]
+            if all(hasattr(col, "on_snapshot") for col in cols):
+                for section, col in zip(SECTIONS, cols):
+                    self._watches.append(col.on_snapshot(self._on_snapshot(section)))
+                self.mode = "listen"
+            else:
+                print("⚠️ El cliente de Firestore no tiene listeners; se consulta periódicamente.")
+
+    def _on_snapshot(self, section: str):
+        def _callback(_docs, changes, _read_time):
+            with self._lock:
+                for change in changes:
+                    removed = getattr(change.type, "name", str(change.type)) == "REMOVED"
+                    self._pending[f"{section}/{change.document.id}"] = None if removed else change.document
+        return _callback
+
+    def changes(self) -> dict[str, dict | None]:
+        """Clave -> documento crudo (con campos de control) o None si se borró."""
+        if self.mode == "listen":
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            return {key: (doc.to_dict() if doc is not None else None) for key, doc in pending.items()}
+
+        state = self._syncer.state
+        found = {}
+        for section, attr in SECTIONS.items():
+            col = getattr(self._syncer.firebase, attr)
+            since = state.pulled.get(section)
+            # El margen cubre relojes desparejos entre instancias; lo repetido se descarta por hash
+            query = col if since is None else col.where("_updatedAt", ">", since - config.SYNC_PULL_OVERLAP)
+            newest = since or 0
+            for doc in query.stream():
+                data = doc.to_dict()
+                found[f"{section}/{doc.id}"] = data
+                newest = max(newest, data.get("_updatedAt") or 0)
+            state.pulled[section] = newest
+        return found
+
+    def stop(self):
+        for watch in self._watches:
+            watch.unsubscribe()
+
+
+class IncrementalSync:
+    """Una pasada de `sync()` replica en los dos sentidos solo lo que cambió desde la anterior."""
+
+    def __init__(self, firebase: FirebaseStorage, json_path: str = JSON_PATH, state_path: str | None = None,
+                 batch_size: int | None = None, max_parallel: int | None = None,
+                 mode: str | None = None, pull_mode: str | None = None, origin: str | None = None):
+        self.firebase = firebase
+        stem, _ = os.path.splitext(os.path.abspath(json_path))
+        ext = serializers.get_codec().extension  # el mismo archivo que usa JSONStorage
+        self.json_path = f"{stem}{ext}"
+        self._stem, self._ext = stem, ext
+        self.shard_pattern = f"{glob.escape(stem)}.shard*of*{ext}"
+        self.turns_dir = f"{stem}_turns"
+        self.users_root = f"{stem}_users"
+        self.user_pattern = os.path.join(glob.escape(self.users_root), "*", f"*{ext}")
+        self.state = SyncState(state_path or config.SYNC_STATE_PATH or f"{stem}.sync_state.json")
+        self.batch_size = max(1, min(batch_size or config.SYNC_BATCH_SIZE, 500))  # tope de Firestore
+        self.max_parallel = max(1, max_parallel or config.SYNC_MAX_PARALLEL)
+        self.pull = (mode or config.SYNC_MODE) == "both"
+        self.origin = origin or config.SYNC_ORIGIN or (
+            f"{socket.gethostname()}-{hashlib.blake2b(os.path.abspath(json_path).encode(), digest_size=3).hexdigest()}")
+        self.remote = _RemoteFeed(self, pull_mode or config.SYNC_PULL_MODE) if self.pull else None
+        self._lock = threading.Lock()
+        self._local_writes: dict[str, dict | None] = {}
+        self._sources: dict[str, str] = {}
+        self._pending = True  # al arrancar se compara todo contra lo ya replicado
+
+    # --- Archivos de datos (sesiones y perfiles) ---
+
+    def data_files(self) -> list[str]:
+        """
+        El archivo principal primero, después los de cada shard y al final los de
+        cada usuario: si un registro aparece en varios, gana el último.
+        """
+        files = [self.json_path] if os.path.exists(self.json_path) else []
+        return files + sorted(glob.glob(self.shard_pattern)) + sorted(glob.glob(self.user_pattern))
+
+    def _precedence(self, path: str) -> tuple:
+        if path == self.json_path:
+            return (0, path)
+        return (2 if path.startswith(self.users_root + os.sep) else 1, path)
+
+    def _known_files(self, candidates: set[str]) -> list[str]:
+        """Archivos ya indexados más los que avisó watchdog, sin listar carpetas."""
+        paths = set(self.state.files) | {path for path in candidates if os.path.exists(path)}
+        return sorted(paths, key=self._precedence)
+
+    def _refresh_files(self, files: list[str], candidates: set[str] | None = None) -> dict[str, dict]:
+        """
+        Recalcula los hashes de los archivos que cambiaron; devuelve su contenido.
+        `candidates`: los únicos archivos a revisar (los que avisó watchdog).
+        """
+        loaded = {}
+        for path in (files if candidates is None else candidates):
+            stat = file_stamp(path)
+            known = self.state.files.get(path)
+            if known and known["stat"] == stat:
+                continue
+            data = _read_json(path)
+            if data is None:
+                continue
+            loaded[path] = data
+            self._index_file(path, data, stat)
+        for path in list(self.state.files if candidates is None else candidates & set(self.state.files)):
+            if path not in files or not os.path.exists(path):
+                del self.state.files[path]
+                loaded[path] = None
+        return loaded
+
+    def _index_file(self, path: str, data: dict, stat):
+        self.state.files[path] = {
+            "stat": stat,
+            "records": {f"{section}/{key}": _record_hash(value)
+                        for section in SECTIONS for key, value in data.get(section, {}).items()},
+        }
+
+    def _owner_file(self, key: str, sources: dict[str, str]) -> str:
+        """Archivo local donde vive (o debe vivir) un registro."""
+        if key in sources:
+            return sources[key]
+        doc_id = key.split("/", 1)[1]
+        if os.path.isdir(self.users_root):
+            return user_file(self.users_root, doc_id, self._ext)
+        shards = sorted(glob.glob(self.shard_pattern))
+        match = re.search(r"\.shard\d+of(\d+)", shards[0]) if shards else None
+        if match and doc_id.lstrip("-").isdigit():
+            count = int(match.group(1))
+            return f"{self._stem}.shard{shard_for(int(doc_id), count)}of{count}{self._ext}"
+        return self.json_path
+
+    def _reconcile(self, files: list[str], loaded: dict[str, dict],
+                   remote: dict[str, dict | None]) -> list[tuple[list, list]]:
+        sources: dict[str, str] = {}  # clave -> archivo de origen
+        hashes: dict[str, str] = {}
+        for path in files:
+            for key, digest in self.state.files.get(path, {}).get("records", {}).items():
+                sources[key], hashes[key] = path, digest
+
+        def local_value(key):
+            path = sources.get(key)
+            if path is None:
+                return None
+            if loaded.get(path) is None:
+                loaded[path] = _read_json(path)  # el origen no cambió, pero hace falta su contenido
+            section, doc_id = key.split("/", 1)
+            return (loaded[path] or {}).get(section, {}).get(doc_id)
+
+        def local_time(key):
+            stat = self.state.files.get(sources.get(key), {}).get("stat")
+            return stat[0] / 1e9 if stat else time.time()
+
+        groups = []
+        keys = set(hashes) | set(self.state.replica) | set(remote)
+        for key in keys:
+            known = self.state.replica.get(key, {})
+            local_changed = hashes.get(key) != known.get("hash")
+            raw = remote.get(key, _MISSING)
+            remote_data = strip_meta(raw) if raw is not _MISSING else _MISSING
+            remote_changed = raw is not _MISSING and _record_hash(remote_data) != known.get("hash")
+            if not local_changed and not remote_changed:
+                continue
+
+            if local_changed and not remote_changed:
+                result, write_remote, write_local = local_value(key), True, False
+                if result is None and key in hashes:
+                    continue  # archivo ilegible por ahora
+            elif remote_changed and not local_changed:
+                result, write_remote, write_local = remote_data, False, True
+            else:
+                remote_ts = (raw or {}).get("_updatedAt") or 0
+                result = merge_records(known.get("base"), local_value(key), remote_data, local_time(key), remote_ts)
+                write_remote = _record_hash(result) != _record_hash(remote_data)
+                write_local = _record_hash(result) != hashes.get(key)
+
+            version = max(known.get("version", 0), (raw or {}).get("_version", 0) if raw is not _MISSING else 0)
+            updated_at = (raw or {}).get("_updatedAt") if raw is not _MISSING else known.get("updatedAt")
+            ops = []
+            if write_remote:
+                version += 1
+                # Hora de subida (no la del archivo): las consultas de las otras instancias
+                # avanzan por `_updatedAt` y no deben saltearse este cambio
+                updated_at = time.time()
+                meta = {"_updatedAt": updated_at, "_version": version, "_origin": self.origin}
+                section, doc_id = key.split("/", 1)
+                doc = {**result, **meta} if result is not None else {"_deleted": True, **meta}
+                ops.append(("set", self._doc(section, doc_id), doc))
+            entry = None if result is None and not write_remote else {
+                "hash": _record_hash(result), "version": version, "updatedAt": updated_at, "base": result}
+            marks = [("record", key, entry)]
+            if write_local:
+                marks.append(("local", key, result))
+            groups.append((ops, marks))
+
+        self._sources = sources
+        return groups
+
+    def _doc(self, section: str, doc_id: str):
+        return getattr(self.firebase, SECTIONS[section]).document(doc_id)
+
+    def _apply_local(self, writes: dict[str, dict | None]):
+        """Escribe en el JSON local lo que llegó de Firestore (una reescritura por archivo)."""
+        by_file: dict[str, dict] = {}
+        for key, value in writes.items():
+            by_file.setdefault(self._owner_file(key, self._sources), {})[key] = value
+        for path, items in by_file.items():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Los archivos por usuario comparten un lock por cubeta (ver ShardedJSONStorage)
+            in_users = path.startswith(self.users_root + os.sep)
+            with file_lock(os.path.dirname(path) if in_users else path):
+                known = self.state.files.get(path, {}).get("stat")
+                before = file_stamp(path)
+                data = _read_json(path) if before else {"sessions": {}, "profiles": {}}
+                if data is None:
+                    self._pending = True
+                    continue
+                for key, value in items.items():
+                    section, doc_id = key.split("/", 1)
+                    if value is None:
+                        data.setdefault(section, {}).pop(doc_id, None)
+                    else:
+                        data.setdefault(section, {})[doc_id] = value
+                    if not in_users:
+                        data.setdefault(UPDATED, {})[key] = time.time()  # ver JSONStorage.reshard
+                atomic_write(path, serializers.codec_for_path(path).dumps(data))
+                if in_users and before is None and config.STORAGE_USER_INDEX:
+                    append_user_index(self.users_root, os.path.splitext(os.path.basename(path))[0])
+                self._index_file(path, data, file_stamp(path))
+            if before != known:
+                self._pending = True  # el bot también escribió: se compara de nuevo en la próxima pasada
+        if writes:
+            print(f"⬇️ {len(writes)} registros traídos de Firestore al JSON local")
+
+    # --- Historiales (un .jsonl por chat, solo se agregan líneas) ---
+
+    def _turn_groups(self, chats: set[str] | None) -> list[tuple[list, list]]:
+        """Líneas nuevas de cada historial. `chats=None` revisa todos los archivos."""
+        if chats is None:
+            chats = set(self.state.turns)
+            if os.path.isdir(self.turns_dir):
+                chats.update(os.path.splitext(name)[0] for name in os.listdir(self.turns_dir)
+                             if name.endswith(".jsonl"))
+        groups = []
+        for chat_id in chats:
+            path = os.path.join(self.turns_dir, f"{chat_id}.jsonl")
+            known = self.state.turns.get(chat_id, {"offset": 0, "inode": None})
+            try:
+                st = os.stat(path)
+            except OSError:
+                if chat_id in self.state.turns:  # clear_turns borró el historial
+                    groups.append((self._clear_turns_ops(chat_id), [("turns", chat_id, None)]))
+                continue
+            ops, offset = [], known["offset"]
+            if known["inode"] is not None and (st.st_ino != known["inode"] or st.st_size < offset):
+                ops.extend(self._clear_turns_ops(chat_id))  # se borró y se volvió a empezar
+                offset = 0
+            if st.st_size == offset and not ops:
+                continue
+            with open(path, "rb") as f:
+                f.seek(offset)
+                chunk = f.read(st.st_size - offset)
+            end = chunk.rfind(b"\n") + 1  # una línea sin "\n" todavía se está escribiendo
+            position = offset
+            for raw in chunk[:end].split(b"\n")[:-1]:
+                line_offset, position = position, position + len(raw) + 1
+                try:
+                    turn = json.loads(raw)
+                except json.JSONDecodeError:
+                    continue
+                # El id sale de la instancia y la posición en el archivo: reintentar no duplica
+                # turnos y dos instancias que escriben el mismo chat no se pisan
+                doc_id = f"{self.origin}-{line_offset:012d}"
+                ops.append(("set", self.firebase._turns_col(chat_id).document(doc_id), turn))
+            groups.append((ops, [("turns", chat_id, {"offset": offset + end, "inode": st.st_ino})]))
+        return groups
+
+    def _clear_turns_ops(self, chat_id: str) -> list[tuple]:
+        return [("delete", doc.reference, None) for doc in self.firebase._turns_col(chat_id).stream()]
+
+    # --- Envío en lotes ---
+
+    def _run_task(self, groups: list[tuple[list, list]]) -> int:
+        """
+        Sube los grupos en lotes, en orden, y recién al final marca su avance en el estado:
+        si un lote falla, nada de la tarea queda marcado y se reintenta completa.
+        """
+        ops = [op for group_ops, _ in groups for op in group_ops]
+        for start in range(0, len(ops), self.batch_size):
+            batch = self.firebase.db.batch()
+            for kind, ref, value in ops[start:start + self.batch_size]:
+                if kind == "set":
+                    batch.set(ref, value)
+                else:
+                    batch.delete(ref)
+            batch.commit()
+        with self._lock:
+            for _, marks in groups:
+                for scope, key, value in marks:
+                    if scope == "local":
+                        self._local_writes[key] = value
+                        continue
+                    target = self.state.replica if scope == "record" else self.state.turns
+                    if value is None:
+                        target.pop(key, None)
+                    else:
+                        target[key] = value
+        return len(ops)
+
+    def _send(self, groups: list[tuple[list, list]]) -> tuple[int, int]:
+        """Devuelve (escrituras hechas, tareas fallidas)."""
+        # Se juntan grupos chicos hasta llenar un lote; un grupo nunca se reparte entre tareas
+        tasks, current, size = [], [], 0
+        for group in groups:
+            if current and size + len(group[0]) > self.batch_size:
+                tasks.append(current)
+                current, size = [], 0
+            current.append(group)
+            size += len(group[0])
+        if current:
+            tasks.append(current)
+
+        written = failed = 0
+        with ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix="aida-sync") as pool:
+            for future in [pool.submit(self._run_task, task) for task in tasks]:
+                try:
+                    written += future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"⚠️ Falló un lote de sincronización: {e}")
+        return written, failed
+
+    def sync(self, changed_turns: set[str] | None = None, data_changed: bool | set[str] = True) -> int:
+        """
+        Una pasada de replicación. Con `watchdog`, `changed_turns` trae los chats cuyo
+        historial cambió y `data_changed` los archivos de datos tocados; sin él se revisa todo.
+        """
+        start = time.perf_counter()
+        pending, self._pending = self._pending, False
+        groups = []
+        if pending or data_changed is True:
+            files = self.data_files()
+            loaded = self._refresh_files(files)
+        elif data_changed:
+            files = self._known_files(data_changed)
+            loaded = self._refresh_files(files, data_changed)
+        else:
+            files, loaded = self._known_files(set()), {}
+        remote = self.remote.changes() if self.remote else {}
+        if loaded or remote or pending:
+            groups.extend(self._reconcile(files, loaded, remote))
+        groups.extend(self._turn_groups(None if pending else changed_turns))
+
+        written, failed = self._send(groups) if groups else (0, 0)
+        if self._local_writes:
+            writes, self._local_writes = self._local_writes, {}
+            self._apply_local(writes)
+        # Si falló una tarea, en la próxima pasada se vuelve a comparar todo contra lo replicado
+        if failed:
+            self._pending = True
+        if groups or remote:
+            self.state.save()
+        if written:
+            print(f"☁️ Sincronizados {written} documentos en {time.perf_counter() - start:.2f} s"
+                  + (f" ({failed} tareas fallidas, se reintentan)" if failed else ""))
+        return written
+
+    def close(self):
+        if self.remote:
+            self.remote.stop()
+
+
+class _ChangeWatcher:
+    """Junta los cambios que avisa watchdog entre una pasada y la siguiente."""
+
+    def __init__(self, syncer: IncrementalSync):
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        self._syncer = syncer
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._turns: set[str] = set()
+        self._data_paths: set[str] = set()
+        watcher = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                for path in (event.src_path, getattr(event, "dest_path", "")):
+                    if path:
+                        watcher._touch(os.path.abspath(path))
+
+        self._observer = Observer()
+        data_dir = os.path.dirname(os.path.abspath(syncer.json_path))
+        self._observer.schedule(_Handler(), data_dir, recursive=False)
+        os.makedirs(syncer.turns_dir, exist_ok=True)
+        self._observer.schedule(_Handler(), os.path.abspath(syncer.turns_dir), recursive=False)
+        if config.STORAGE_LAYOUT == "per_user" or os.path.isdir(syncer.users_root):
+            os.makedirs(syncer.users_root, exist_ok=True)
+            self._observer.schedule(_Handler(), syncer.users_root, recursive=True)
+        self._observer.start()
+
+    def _touch(self, path: str):
+        turns_dir = os.path.abspath(self._syncer.turns_dir)
+        with self._lock:
+            if os.path.dirname(path) == turns_dir and path.endswith(".jsonl"):
+                self._turns.add(os.path.splitext(os.path.basename(path))[0])
+            elif path.endswith(self._syncer._ext) and not path.endswith(".sync_state.json"):
+                self._data_paths.add(path)
+            else:
+                return
+        self._event.set()
+
+    def wait(self, timeout: float) -> tuple[set[str], set[str]]:
+        self._event.wait(timeout)
+        time.sleep(0.2)  # agrupa las ráfagas de escrituras del bot
+        with self._lock:
+            self._event.clear()
+            turns, self._turns = self._turns, set()
+            data_paths, self._data_paths = self._data_paths, set()
+        return turns, data_paths
+
+    def stop(self):
+        self._observer.stop()
+
+
+def run_sync_loop(json_path: str = JSON_PATH, mode: str | None = None, once: bool = False,
+                  namespace: str | None = None):
+    """
+    Replica automáticamente cada vez que cambian los archivos locales o Firestore.
+    `namespace`: raíz en Firestore de un bot del modo multi-tenant (por defecto ENV:BOT_ID).
+    """
+    firebase = FirebaseStorage(namespace=namespace)
+    syncer = IncrementalSync(firebase, json_path, mode=mode)
+    if once:
+        syncer.sync()
+        syncer.close()
+        return
+    try:
+        watcher = _ChangeWatcher(syncer)
+        print("👀 Detectando cambios locales por eventos del sistema de archivos (watchdog).")
+    except ImportError:
+        watcher = None
+        print(f"⏱️ watchdog no está instalado: se revisan los archivos cada {SYNC_INTERVAL} s.")
+
+    direction = "↔" if syncer.pull else "→"
+    print(f"🔄 Iniciando sincronización automática {json_path} {direction} Firestore (origen {syncer.origin})...")
+    changed_turns, data_changed = None, True
     while True:
         try:
-            current = load_local_data()
-            # Detectar cambios comparando texto JSON
-            current_snapshot = json.dumps(current, sort_keys=True)
-            if current_snapshot != last_snapshot:
-                sync_once(current, firebase)
-                last_snapshot = current_snapshot
-            time.sleep(SYNC_INTERVAL)
+            syncer.sync(changed_turns, data_changed)
+            if watcher:
+                # Sin bajada, el tope de espera solo cubre eventos perdidos y reintentos
+                changed_turns, data_changed = watcher.wait(timeout=SYNC_INTERVAL if syncer.pull
+                                                           else max(SYNC_INTERVAL, 60))
+            else:
+                time.sleep(SYNC_INTERVAL)
         except KeyboardInterrupt:
             print("\n🛑 Sincronización detenida manualmente.")
             break
         except Exception as e:
             print(f"⚠️ Error: {e}")
+            syncer._pending = True
+            changed_turns, data_changed = None, True
             time.sleep(5)
+    if watcher:
+        watcher.stop()
+    syncer.close()
+
 
 if __name__ == "__main__":
-    run_sync_loop()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--json", default=JSON_PATH, help="archivo JSON local (también sus shards e historiales)")
+    parser.add_argument("--mode", choices=("both", "push"), default=None, help="both = en los dos sentidos")
+    parser.add_argument("--once", action="store_true", help="una sola pasada y salir")
+    parser.add_argument("--tenant", default=None,
+                        help="bot de BOT_TENANTS_FILE: usa su archivo local y su raíz en Firestore")
+    args = parser.parse_args()
+    if args.tenant:
+        from aida_bot.tenants import find_tenant
+        tenant = find_tenant(args.tenant)
+        json_path = args.json if args.json != JSON_PATH else tenant.data_path
+        run_sync_loop(json_path, args.mode, args.once, namespace=tenant.namespace)
+    else:
+        run_sync_loop(args.json, args.mode, args.once)